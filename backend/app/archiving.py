@@ -0,0 +1,171 @@
+"""Archival of closed academic years.
+
+Once an AcademicYear is closed, its resolved complaints, and the viewed
+notifications sent before it closed, move out of the live tables into
+ArchivedComplaint and ArchivedNotification with the ids they had. The live
+tables and their indexes then hold the current years only, so the lists
+and the seen and viewed updates over them stop scanning past years. Lists
+read the archive too with ?archived=include, or only it with
+?archived=only.
+
+archive() moves the rows ARCHIVE_BATCH_SIZE at a time. Each batch is its
+own short transaction that locks only its own rows, and ARCHIVE_BATCH_PAUSE
+seconds between batches let queued live writes through. Archived
+complaints keep counting in the analytics rollup and the student
+statistics, and leave the search index.
+
+PostgreSQL partitions were not used: complaints are split over a parent
+and two child tables, and a partition key would have to be part of every
+one of their primary keys. Archive tables work the same on both databases."""
+import time
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (
+    AcademicYear, ArchivedComplaint, ArchivedNotification, CommonComplaintIssue, MissingMarksComplaint,
+    Notification, RegistrationComplaint,
+)
+from . import search
+
+MODES = ("include", "only")
+
+
+def archived_mode(value):
+    """The ?archived= value of a list, None for the live rows only. Raises
+    ValueError for anything else."""
+    if not value:
+        return None
+    if value not in MODES:
+        raise ValueError(f"archived must be one of {', '.join(MODES)}")
+    return value
+
+
+def close_year(year):
+    year.closed = timezone.now()
+    year.save(update_fields=["closed"])
+
+
+def complaints_to_archive(closing=()):
+    """Resolved complaints of the closed years, and of the years in closing
+    as if they were closed now."""
+    closed = list(AcademicYear.objects.filter(closed__isnull=False).values_list("id", flat=True))
+    return CommonComplaintIssue.objects.filter(academic_year__in=closed + [year.id for year in closing], status="resolved")
+
+
+def notifications_to_archive(closing=()):
+    # notifications belong to no year, the ones sent before the latest
+    # closing are the closed years' ones
+    until = timezone.now() if closing else AcademicYear.objects.aggregate(until=Max("closed"))["until"]
+    if until is None:
+        return Notification.objects.none()
+    return Notification.objects.filter(is_viewed=True, sent__lte=until)
+
+
+def batches(queryset, size):
+    """Lists of at most size ids of queryset, walked by id so each batch
+    starts where the one before stopped."""
+    last = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last).order_by("id").values_list("id", flat=True)[:size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def chunks(ids, using):
+    """ids in lists that fit the bound parameters of one statement, with one
+    to spare for its other conditions. SQLite binds 999 at most, so a batch
+    of ARCHIVE_BATCH_SIZE ids can take more than one statement."""
+    size = connections[using].features.max_query_params
+    size = size - 1 if size else max(len(ids), 1)
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
+
+
+def archived_complaint(complaint):
+    marks = isinstance(complaint, MissingMarksComplaint)
+    return ArchivedComplaint(
+        id=complaint.id,
+        kind=ArchivedComplaint.MISSING_MARKS if marks else ArchivedComplaint.REGISTRATION,
+        created=complaint.created, updated=complaint.updated, student_id=complaint.student_id,
+        year_of_study=complaint.year_of_study, seen=complaint.seen,
+        academic_year_id=complaint.academic_year_id, status=complaint.status, resolved_at=complaint.resolved_at,
+        course_id=complaint.course_id if marks else None,
+        category=complaint.category if marks else "",
+        subject="" if marks else complaint.subject,
+        details="" if marks else complaint.details,
+    )
+
+
+def archive_complaints(ids):
+    """Move the complaints of ids that are still resolved. Returns how many moved."""
+    using = router.db_for_write(CommonComplaintIssue)
+    with transaction.atomic(using):
+        # locked as read, a status change in the meantime keeps a complaint live
+        complaints = [
+            complaint
+            for model in (MissingMarksComplaint, RegistrationComplaint)
+            for chunk in chunks(ids, using)
+            for complaint in model.objects.using(using).select_for_update().filter(id__in=chunk, status="resolved")
+        ]
+        moved = [complaint.id for complaint in complaints]
+        ArchivedComplaint.objects.using(using).bulk_create([archived_complaint(complaint) for complaint in complaints])
+        # plain DELETEs, a queryset delete() would send the delete signals,
+        # which take the complaints out of the rollup and the student
+        # statistics where they keep counting; children before their parent
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            for chunk in chunks(moved, using):
+                placeholders = ", ".join(["%s"] * len(chunk))
+                for model in (MissingMarksComplaint, RegistrationComplaint, CommonComplaintIssue):
+                    table, column = (connection.ops.quote_name(name) for name in (model._meta.db_table, model._meta.pk.column))
+                    cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", chunk)
+        search.remove(moved)
+    return len(moved)
+
+
+def archive_notifications(ids):
+    """Move the notifications of ids that are still viewed. Returns how many moved."""
+    using = router.db_for_write(Notification)
+    with transaction.atomic(using):
+        notifications = [
+            notification
+            for chunk in chunks(ids, using)
+            for notification in Notification.objects.using(using).select_for_update().filter(id__in=chunk, is_viewed=True)
+        ]
+        ArchivedNotification.objects.using(using).bulk_create([
+            ArchivedNotification(
+                id=notification.id, severity=notification.severity, body=notification.body,
+                sent=notification.sent, reciever_id=notification.reciever_id, is_viewed=notification.is_viewed,
+            )
+            for notification in notifications
+        ])
+        for chunk in chunks([notification.id for notification in notifications], using):
+            Notification.objects.using(using).filter(id__in=chunk).delete()
+    return len(notifications)
+
+
+def archive(batch_size=None, pause=None, on_batch=None):
+    """Move everything closed years left behind, a batch at a time.
+    on_batch is called with the table, the rows moved and the seconds the
+    batch took. Returns the rows moved per table."""
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    pause = settings.ARCHIVE_BATCH_PAUSE if pause is None else pause
+    moved = {"complaints": 0, "notifications": 0}
+
+    for table, queryset, move in (
+        ("complaints", complaints_to_archive(), archive_complaints),
+        ("notifications", notifications_to_archive(), archive_notifications),
+    ):
+        for ids in batches(queryset, batch_size):
+            started = time.perf_counter()
+            count = move(ids)
+            moved[table] += count
+            if on_batch:
+                on_batch(table, count, time.perf_counter() - started)
+            if pause:
+                time.sleep(pause)
+    return moved
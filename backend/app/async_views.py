@@ -0,0 +1,188 @@
+"""Natively async versions of login and the busiest read endpoints, served
+instead of the DRF views in app/views.py when ASYNC_VIEWS is on under an
+ASGI server, and the notification stream, which only exists as an async
+view. A sync view under ASGI holds a thread for the whole request, these
+only leave the event loop for the queries themselves."""
+import asyncio
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, PermissionDenied
+from rest_framework.renderers import JSONRenderer
+
+from . import views
+from .authentication import CachedStatelessJWTAuthentication
+from .broker import get_broker
+from .counters import aget_student_statistics
+from .hashing import acheck_password
+from .models import AcademicYear, Notification, Programme, User
+from .pagination import apaginate
+from .reference_cache import cached_reference
+from .serializers import ComplaintFeedSerializer, NotificationsSerializer, ProgrammeSerializer, YearsSerializer
+
+_authenticator = CachedStatelessJWTAuthentication()
+
+
+def json_response(data, status = status.HTTP_200_OK, headers = None):
+    # rendered like DRF renders the sync views, so both give the same bytes
+    response = HttpResponse(JSONRenderer().render(data), content_type = "application/json", status = status, headers = headers)
+    if not response.content:
+        del response["Content-Type"]
+    return response
+
+
+def exception_response(exc, headers = None):
+    # the body DRF's exception handler gives the sync views
+    data = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+    return json_response(data, status = exc.status_code, headers = headers)
+
+
+def async_read_view(sync_view):
+    """GETs go to the decorated coroutine, every other method to sync_view,
+    the DRF view of the same route. A token that DRF would reject gets the
+    same 401 here."""
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != "GET":
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+            try:
+                await _authenticator.aauthenticate(request)
+            except APIException as exc:
+                return unauthenticated_response(request, exc)
+            try:
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return exception_response(exc)
+
+        return wrapper
+
+    return decorator
+
+
+def unauthenticated_response(request, exc):
+    return exception_response(exc, headers = {"WWW-Authenticate": _authenticator.authenticate_header(request)})
+
+
+@csrf_exempt
+async def login_async(request):
+    """Same contract as login. Password hashing runs on a thread pool so a
+    login storm doesn't stall the event loop, or every other sync view
+    queued behind it on the shared sync thread."""
+    if request.method != "POST":
+        return json_response({"error": "Method not allowed"}, status = status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    try:
+        data = json.loads(request.body) if request.content_type == "application/json" else request.POST
+        email = data.get("email")
+        password = data.get("password")
+    except ValueError:
+        return json_response({"error": "Invalid request body"}, status = status.HTTP_400_BAD_REQUEST)
+
+    if not email or not password:
+        return json_response({"error": "Email and password are required"}, status = status.HTTP_400_BAD_REQUEST)
+
+    try:
+        user = await User.objects.aget(email = email)
+    except User.DoesNotExist:
+        return json_response({"error": "Invalid email or password"}, status = status.HTTP_401_UNAUTHORIZED)
+
+    if not await acheck_password(user, password):
+        return json_response({"error": "Invalid email or password"}, status = status.HTTP_401_UNAUTHORIZED)
+
+    return json_response(views.login_response(user))
+
+
+@async_read_view(views.programmes)
+@cached_reference("programmes")
+async def programmes(request):
+    programmes = Programme.objects.all()
+    return json_response(await apaginate(request, programmes, ProgrammeSerializer, ordering = ("name",)))
+
+
+@async_read_view(views.academic_years)
+@cached_reference("academic_years")
+async def academic_years(request):
+    academic_years = AcademicYear.objects.all().order_by('-created')
+    return json_response(await apaginate(request, academic_years, YearsSerializer))
+
+
+@async_read_view(views.student_statistics)
+async def student_statistics(request, pk):
+    return json_response(await aget_student_statistics(pk))
+
+
+@async_read_view(views.notifications)
+async def notifications(request, pk):
+    try:
+        exists = await User.objects.filter(id = pk).aexists()
+    except ValueError:
+        exists = False
+
+    if not exists:
+        return json_response(None, status = status.HTTP_403_FORBIDDEN)
+
+    notifications = Notification.objects.filter(reciever = pk)
+    return json_response(await apaginate(
+        request, notifications, NotificationsSerializer, ordering = ("-sent", "-id"),
+        archived = views.archived_notifications(pk)
+    ))
+
+
+@async_read_view(views.sent_complaints)
+async def sent_complaints(request, pk):
+    complaints = views.sent_complaints_queryset(pk, request.GET)
+    return json_response(await apaginate(
+        request, complaints, ComplaintFeedSerializer,
+        archived = views.archived_sent_complaints(pk, request.GET)
+    ))
+
+
+async def notifications_stream(request, pk):
+    """Server-sent events stream of the user's new notifications, for the
+    user of the request's token only. Needs the ASGI app, an idle stream is
+    just a parked coroutine and a queue."""
+    if not isinstance(request, ASGIRequest):
+        # WSGI would buffer the endless stream, clients should poll notifications_sync instead
+        return HttpResponse(status = status.HTTP_501_NOT_IMPLEMENTED)
+
+    try:
+        authenticated = await _authenticator.aauthenticate(request)
+        if authenticated is None:
+            raise NotAuthenticated()
+    except APIException as exc:
+        return unauthenticated_response(request, exc)
+    # TokenUser ids come from the token's claims, compared as strings like the route's pk
+    if str(authenticated[0].id) != str(pk):
+        return exception_response(PermissionDenied())
+
+    broker = get_broker()
+
+    async def events():
+        queue = broker.subscribe(pk)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), settings.NOTIFICATION_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # keeps proxies from closing the idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: notification\ndata: {json.dumps(message)}\n\n"
+        finally:
+            broker.unsubscribe(pk, queue)
+
+    response = StreamingHttpResponse(events(), content_type = "text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
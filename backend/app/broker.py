@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class InMemoryBroker:
+    """Fan-out of messages to the streams subscribed to a channel (a user id),
+    in the current process only, enough for a single ASGI worker.
+
+    publish() is called from sync views running in worker threads, subscribe()
+    and unsubscribe() from async stream views on the event loop."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[str(channel)].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(str(channel), set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(str(channel), None)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(channel), ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                # the subscriber's loop has shut down, it will unsubscribe itself
+                pass
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def _offer(queue, message):
+    # a stream that stopped reading loses messages instead of growing without
+    # bound, it can catch up through notifications_sync
+    if not queue.full():
+        queue.put_nowait(message)
+
+
+_broker = InMemoryBroker()
+
+
+def get_broker():
+    return _broker
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .metrics import record_cache_lookup
+from .models import ArchivedComplaint, CommonComplaintIssue, User
+
+REGISTRAR_KEY = "registrar_id"
+
+
+def student_statistics_key(student_id):
+    return f"student_statistics_{student_id}"
+
+
+def student_complaint_counters():
+    # one query over the parent table, the LEFT JOINs to both children tell the
+    # complaint types apart and skip parents whose child table was dropped
+    missing_marks = Q(missingmarkscomplaint__isnull=False)
+    registration = Q(registrationcomplaint__isnull=False)
+    typed = missing_marks | registration
+
+    return {
+        "total": Count("id", filter=typed),
+        "pending": Count("id", filter=typed & Q(status="pending")),
+        "resolved": Count("id", filter=typed & Q(status="resolved")),
+        "missing_marks": Count("id", filter=missing_marks),
+        "registration": Count("id", filter=registration),
+    }
+
+
+def archived_complaint_counters():
+    missing_marks = Q(kind=ArchivedComplaint.MISSING_MARKS)
+    return {
+        "total": Count("id"),
+        "pending": Count("id", filter=Q(status="pending")),
+        "resolved": Count("id", filter=Q(status="resolved")),
+        "missing_marks": Count("id", filter=missing_marks),
+        "registration": Count("id", filter=~missing_marks),
+    }
+
+
+def with_archived(counts, archived):
+    # a student's archived complaints still count on their dashboard
+    return {name: count + archived[name] for name, count in counts.items()}
+
+
+def count_student_complaints(student_id):
+    return with_archived(
+        CommonComplaintIssue.objects.filter(student=student_id).aggregate(**student_complaint_counters()),
+        ArchivedComplaint.objects.filter(student=student_id).aggregate(**archived_complaint_counters()),
+    )
+
+
+async def acount_student_complaints(student_id):
+    return with_archived(
+        await CommonComplaintIssue.objects.filter(student=student_id).aaggregate(**student_complaint_counters()),
+        await ArchivedComplaint.objects.filter(student=student_id).aaggregate(**archived_complaint_counters()),
+    )
+
+
+def get_student_statistics(student_id):
+    """Complaint counters for the student dashboard, served from the cache in
+    steady state. Complaint writes call invalidate_student_statistics() so the
+    next read recounts."""
+    timeout = settings.STUDENT_STATISTICS_CACHE_TIMEOUT
+    if not timeout:
+        return count_student_complaints(student_id)
+
+    key = student_statistics_key(student_id)
+    counts = cache.get(key)
+    record_cache_lookup(counts is not None)
+    if counts is None:
+        counts = count_student_complaints(student_id)
+        cache.set(key, counts, timeout)
+    return counts
+
+
+async def aget_student_statistics(student_id):
+    """get_student_statistics() for async views."""
+    timeout = settings.STUDENT_STATISTICS_CACHE_TIMEOUT
+    if not timeout:
+        return await acount_student_complaints(student_id)
+
+    key = student_statistics_key(student_id)
+    counts = await cache.aget(key)
+    record_cache_lookup(counts is not None)
+    if counts is None:
+        counts = await acount_student_complaints(student_id)
+        await cache.aset(key, counts, timeout)
+    return counts
+
+
+def invalidate_student_statistics(*student_ids):
+    cache.delete_many([student_statistics_key(student_id) for student_id in student_ids])
+
+
+def get_registrar_id():
+    """Id of the registrar, who receives every registration complaint. Kept in
+    the cache, User saves and deletes clear it."""
+    registrar_id = cache.get(REGISTRAR_KEY)
+    record_cache_lookup(registrar_id is not None)
+    if registrar_id is None:
+        registrar_id = User.objects.values_list("id", flat=True).get(role="registrar")
+        cache.set(REGISTRAR_KEY, registrar_id, None)
+    return registrar_id
+
+
+def invalidate_registrar(user):
+    # only when someone became registrar, or the cached registrar changed role or left
+    if user.role == "registrar" or cache.get(REGISTRAR_KEY) == user.id:
+        cache.delete(REGISTRAR_KEY)
@@ -0,0 +1,198 @@
+"""Streaming CSV and JSON export of missing marks and registration
+complaints for registrar reporting.
+
+Rows are read with values_list().iterator(), EXPORT_CHUNK_SIZE at a time
+from one cursor, and rendered into text chunks as they arrive, so memory
+stays the same whether the export is a hundred rows or a million.
+?archived=include adds the archived complaints after the live ones of each
+kind, ?archived=only exports the archived ones alone."""
+import csv
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, NotAuthenticated
+
+from .archiving import archived_mode
+from .authentication import CachedStatelessJWTAuthentication
+from .models import ArchivedComplaint, CommonComplaintIssue, MissingMarksComplaint, RegistrationComplaint
+
+COLUMNS = [
+    "id", "type", "status", "created", "updated", "seen", "year_of_study", "academic_year",
+    "email", "registration_number", "student_number", "programme",
+    "course_code", "course_name", "semester", "category", "subject", "details",
+]
+
+# (field, column) pairs both kinds read, then what each one adds
+_COMMON = [
+    ("id", "id"), ("status", "status"), ("created", "created"), ("updated", "updated"), ("seen", "seen"),
+    ("year_of_study", "year_of_study"), ("academic_year__title", "academic_year"),
+    ("student__email", "email"), ("student__registration_number", "registration_number"),
+    ("student__student_number", "student_number"), ("student__programme__name", "programme"),
+]
+KINDS = {
+    "missing_marks": (MissingMarksComplaint, "missing marks complaint", [
+        ("course__code", "course_code"), ("course__name", "course_name"),
+        ("course__semester", "semester"), ("category", "category"),
+    ]),
+    "registration": (RegistrationComplaint, "registration issues", [
+        ("subject", "subject"), ("details", "details"),
+    ]),
+}
+FORMATS = {"csv": "text/csv", "json": "application/json"}
+
+_authenticator = CachedStatelessJWTAuthentication()
+
+
+def complaint_filters(params):
+    """Queryset filters from the programme, academic_year, status, from and
+    to (YYYY-MM-DD, inclusive) parameters. Raises ValueError for bad ones."""
+    filters = {}
+    # checked here, a bad id would only fail in the stream, after the 200
+    for param, lookup in (("programme", "student__programme"), ("academic_year", "academic_year")):
+        if params.get(param):
+            try:
+                filters[lookup] = int(params[param])
+            except ValueError:
+                raise ValueError(f"{param} must be a number")
+    if params.get("status"):
+        filters["status"] = params["status"]
+
+    for param, lookup, days in (("from", "created__gte", 0), ("to", "created__lt", 1)):
+        if params.get(param):
+            try:
+                day = parse_date(params[param])
+            except ValueError:
+                day = None
+            if day is None:
+                raise ValueError(f"{param} must be a YYYY-MM-DD date")
+            # a range on the column itself, created__date would not use its index
+            filters[lookup] = timezone.make_aware(datetime.combine(day + timedelta(days=days), time.min))
+    return filters
+
+
+def complaint_kinds(value):
+    if not value:
+        return list(KINDS)
+    if value not in KINDS:
+        raise ValueError(f"type must be one of {', '.join(KINDS)}")
+    return [value]
+
+
+def export_rows(kinds, filters, using=None, archived=None):
+    """Yield one dict per complaint with every column of COLUMNS, kind by
+    kind, the columns of the other kind left empty. archived is None, or
+    "include" or "only" for the archived complaints."""
+    for kind in kinds:
+        model, label, own = KINDS[kind]
+        fields, columns = zip(*(_COMMON + own))
+        # the archive has the same field names, both kinds in one table
+        querysets = []
+        if archived != "only":
+            querysets.append(model.objects.using(using).filter(**filters))
+        if archived:
+            querysets.append(ArchivedComplaint.objects.using(using).filter(kind=kind, **filters))
+
+        for queryset in querysets:
+            queryset = queryset.order_by("-created", "-id").values_list(*fields)
+            for values in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+                row = dict.fromkeys(COLUMNS)
+                row.update(zip(columns, values))
+                row["type"] = label
+                yield row
+
+
+class _Echo:
+    # csv.writer wants a file, this one hands back what it was given
+    def write(self, value):
+        return value
+
+
+def render(rows, format):
+    """Text chunks of rows as CSV or a JSON array, a chunk per
+    EXPORT_CHUNK_SIZE rows so the response isn't written a row at a time."""
+    chunk, size = [], settings.EXPORT_CHUNK_SIZE
+
+    if format == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(COLUMNS)
+        for row in rows:
+            chunk.append(writer.writerow([
+                value.isoformat() if isinstance(value, datetime) else value for value in row.values()
+            ]))
+            if len(chunk) >= size:
+                yield "".join(chunk)
+                chunk = []
+        yield "".join(chunk)
+        return
+
+    encoder = DjangoJSONEncoder()
+    separator = "[\n"
+    for row in rows:
+        chunk.append(separator + encoder.encode(row))
+        separator = ",\n"
+        if len(chunk) >= size:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk) + ("]\n" if separator != "[\n" else "[]\n")
+
+
+async def aiterate(iterator):
+    """Async iterator over a sync one, each step on the request's sync thread.
+    Under ASGI Django would otherwise read a sync streaming body into a list
+    before sending any of it."""
+    done = object()
+    step = sync_to_async(next)
+    while (chunk := await step(iterator, done)) is not done:
+        yield chunk
+
+
+def authentication_error(request):
+    """The 401 DRF would give a request without a valid access token, None
+    for an authenticated one."""
+    try:
+        if _authenticator.authenticate(request) is not None:
+            return None
+        raise NotAuthenticated()
+    except APIException as exc:
+        response = JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        response["WWW-Authenticate"] = _authenticator.authenticate_header(request)
+        return response
+
+
+# a plain Django view, DRF would take ?format= for its own content negotiation,
+# so the token is checked here, before the stream starts
+@require_GET
+def export_complaints(request):
+    """GET export_complaints/?format=csv|json&type=&programme=&academic_year=&status=&from=&to=&archived=include|only"""
+    error = authentication_error(request)
+    if error is not None:
+        return error
+
+    format = request.GET.get("format", "csv")
+    try:
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        kinds = complaint_kinds(request.GET.get("type"))
+        filters = complaint_filters(request.GET)
+        archived = archived_mode(request.GET.get("archived"))
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    # the rows are read after the view returns, outside the request the
+    # replica router would send them to the primary, so pick the database now
+    using = router.db_for_read(CommonComplaintIssue)
+    content = render(export_rows(kinds, filters, using, archived), format)
+    if isinstance(request, ASGIRequest):
+        content = aiterate(content)
+
+    response = StreamingHttpResponse(content, content_type=f"{FORMATS[format]}; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="complaints-{timezone.localdate():%Y%m%d}.{format}"'
+    return response
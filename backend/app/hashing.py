@@ -0,0 +1,25 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+# the hashers used here (hashlib's pbkdf2/scrypt, argon2-cffi) release the GIL,
+# so plain threads hash in parallel without blocking the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix="password-hashing"
+)
+
+
+async def acheck_password(user, raw_password):
+    """Async counterpart of user.check_password() that hashes on the pool
+    instead of the event loop. Like check_password() it transparently
+    rehashes with the preferred hasher when the stored hash is outdated."""
+    loop = asyncio.get_running_loop()
+    is_correct, must_update = await loop.run_in_executor(_executor, verify_password, raw_password, user.password)
+
+    if is_correct and must_update:
+        user.password = await loop.run_in_executor(_executor, make_password, raw_password)
+        await user.asave(update_fields=["password"])
+    return is_correct
+
@@ -0,0 +1,304 @@
+"""Bulk import of students and courses from CSV or Excel files.
+
+Rows are read one at a time and handled in chunks of IMPORT_CHUNK_SIZE:
+each chunk is validated together, its programme, lecturer and uniqueness
+lookups are a handful of IN queries, its passwords are hashed on a process
+pool and it is written with bulk_create in one transaction. Only the chunk
+being handled is held in memory, and errors are handed to a callback as
+they are found, so files of any size import in bounded memory.
+
+Students: email, first_name, last_name, username, registration_number,
+student_number, programme (name), password. Only email is required, the
+role follows the email domain like sign_up, and students imported without
+a password set one through forgot-password.
+
+Courses: name, code, semester, programme (name), lecturer (email), all
+required."""
+import csv
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, reset_queries, transaction
+
+from .models import Course, Programme, User
+from . import reference_cache
+
+ROLES = {"students.mak.ac.ug": "student", "cit.mak.ac.ug": "lecturer"}
+
+
+def read_rows(file, name):
+    """Yield (line number, row dict) from an open binary file, an .xlsx
+    workbook when name says so and CSV otherwise. Headers are matched
+    case-insensitively and values are stripped."""
+    if name.lower().endswith(".xlsx"):
+        rows = _xlsx_rows(file)
+    else:
+        reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+        rows = ((reader.line_num, values) for values in reader)
+
+    header = None
+    for line, values in rows:
+        values = ["" if value is None else str(value).strip() for value in values]
+        if header is None:
+            header = [value.lower() for value in values]
+        elif any(values):
+            yield line, dict(zip(header, values))
+
+
+def _xlsx_rows(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("reading .xlsx files needs openpyxl, pip install openpyxl or export the sheet to CSV")
+    # read only mode streams the sheet instead of loading it whole
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for line, values in enumerate(workbook.active.iter_rows(values_only=True), start=1):
+            yield line, values
+    finally:
+        workbook.close()
+
+
+def _setup_worker():
+    # spawned workers start without Django, forked ones already have it
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    django.setup()
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+class BulkImport:
+    """Validates, resolves and writes rows a chunk at a time. Subclasses say
+    which columns are unique and how a chunk of rows becomes model instances."""
+
+    model = None
+    # model fields that must not repeat, within the file or with existing rows
+    unique = ()
+
+    def __init__(self, chunk_size=None, workers=None, on_error=None, on_progress=None):
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.workers = workers or settings.PASSWORD_HASHING_WORKERS
+        self.on_error = on_error or (lambda line, message: None)
+        self.on_progress = on_progress or (lambda result: None)
+        self._pool = None
+        self._programmes = {}
+
+    def run(self, rows):
+        result = ImportResult()
+        started = time.perf_counter()
+        rows = iter(rows)
+        try:
+            while chunk := list(islice(rows, self.chunk_size)):
+                result.rows += len(chunk)
+                valid = self.validate(chunk, result)
+                if valid:
+                    result.created += self.write(valid, result)
+                # with DEBUG on every query is logged, its IN lists would pile up
+                reset_queries()
+                result.elapsed = time.perf_counter() - started
+                self.on_progress(result)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+        if result.created:
+            # bulk_create skips the post_save signals that keep these cached lists fresh
+            reference_cache.bump(self.model.__name__)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def fail(self, result, line, message):
+        result.failed += 1
+        self.on_error(line, message)
+
+    def validate(self, chunk, result):
+        """[(line, instance)] for the rows of chunk that can be written, the
+        others are reported through on_error."""
+        candidates = []
+        for line, row in chunk:
+            try:
+                candidates.append((line, self.clean(row)))
+            except ValidationError as error:
+                self.fail(result, line, "; ".join(error.messages))
+
+        self.resolve([row for _, row in candidates])
+
+        # one query per unique field for the whole chunk
+        taken = {
+            field: set(self.model.objects.filter(
+                **{f"{field}__in": [row[field] for _, row in candidates if row.get(field)]}
+            ).values_list(field, flat=True))
+            for field in self.unique
+        }
+        valid = []
+        for line, row in candidates:
+            try:
+                for field in self.unique:
+                    value = row.get(field)
+                    if value and value in taken[field]:
+                        raise ValidationError(f"{field} {value} already exists")
+                instance = self.build(row)
+            except ValidationError as error:
+                self.fail(result, line, "; ".join(error.messages))
+                continue
+            for field in self.unique:
+                if row.get(field):
+                    taken[field].add(row[field])
+            valid.append((line, instance))
+        return valid
+
+    def write(self, valid, result):
+        instances = [instance for _, instance in valid]
+        self.prepare(instances)
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create(instances)
+            return len(instances)
+        except IntegrityError:
+            # something raced the import, find the rows at fault one by one
+            created = 0
+            for line, instance in valid:
+                try:
+                    with transaction.atomic():
+                        instance.save(force_insert=True)
+                    created += 1
+                except IntegrityError as error:
+                    self.fail(result, line, str(error))
+            return created
+
+    def resolve_programmes(self, names):
+        # a few hundred programmes at most, remembered for the whole import
+        missing = {name for name in names if name and name not in self._programmes}
+        if missing:
+            self._programmes.update(Programme.objects.filter(name__in=missing).values_list("name", "id"))
+
+    def programme_id(self, name):
+        if not name:
+            return None
+        if name not in self._programmes:
+            raise ValidationError(f"unknown programme {name}")
+        return self._programmes[name]
+
+    def hash_passwords(self, passwords):
+        # PBKDF2 is deliberately slow, a pool of processes hashes a chunk on every core
+        if self.workers <= 1 or len(passwords) <= 1:
+            return [make_password(password) for password in passwords]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_setup_worker)
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._pool.map(make_password, passwords, chunksize=chunksize))
+
+    def prepare(self, instances):
+        pass
+
+    def clean(self, row):
+        raise NotImplementedError
+
+    def resolve(self, rows):
+        raise NotImplementedError
+
+    def build(self, row):
+        raise NotImplementedError
+
+
+class StudentImport(BulkImport):
+    model = User
+    unique = ("email", "username", "registration_number", "student_number")
+
+    def clean(self, row):
+        email = row.get("email", "")
+        validate_email(email)
+        role = ROLES.get(email.rpartition("@")[2])
+        if role is None:
+            raise ValidationError(f"{email} is not a students.mak.ac.ug or cit.mak.ac.ug address")
+
+        password = row.get("password") or None
+        if password:
+            validate_password(password, User(email=email, first_name=row.get("first_name", ""), last_name=row.get("last_name", "")))
+        return {**row, "role": role, "password": password}
+
+    def resolve(self, rows):
+        self.resolve_programmes(row.get("programme") for row in rows)
+
+    def build(self, row):
+        return User(
+            email=row["email"],
+            username=row.get("username") or None,
+            first_name=row.get("first_name", ""),
+            last_name=row.get("last_name", ""),
+            registration_number=row.get("registration_number") or None,
+            student_number=row.get("student_number") or None,
+            programme_id=self.programme_id(row.get("programme")),
+            role=row["role"],
+            # hashed in prepare(), once the row is known to be valid
+            password=row["password"],
+        )
+
+    def prepare(self, instances):
+        with_password = [user for user in instances if user.password]
+        for user, hashed in zip(with_password, self.hash_passwords([user.password for user in with_password])):
+            user.password = hashed
+        for user in instances:
+            if not user.password:
+                # unusable until it is set through forgot-password
+                user.password = make_password(None)
+
+
+class CourseImport(BulkImport):
+    model = Course
+    unique = ("name", "code")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lecturers = {}
+
+    def clean(self, row):
+        missing = [column for column in ("name", "code", "semester", "programme", "lecturer") if not row.get(column)]
+        if missing:
+            raise ValidationError(f"missing {', '.join(missing)}")
+        if len(row["semester"]) > 2:
+            raise ValidationError(f"semester {row['semester']} is longer than 2 characters")
+        return row
+
+    def resolve(self, rows):
+        self.resolve_programmes(row["programme"] for row in rows)
+        missing = {row["lecturer"] for row in rows} - self._lecturers.keys()
+        if missing:
+            self._lecturers.update(
+                User.objects.filter(role="lecturer", email__in=missing).values_list("email", "id")
+            )
+
+    def build(self, row):
+        if row["lecturer"] not in self._lecturers:
+            raise ValidationError(f"unknown lecturer {row['lecturer']}")
+        return Course(
+            name=row["name"],
+            code=row["code"],
+            semester=row["semester"],
+            programme_id=self.programme_id(row["programme"]),
+            lecturer_id=self._lecturers[row["lecturer"]],
+        )
+
+
+IMPORTS = {"students": StudentImport, "courses": CourseImport}
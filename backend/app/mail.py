@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+def queue_mail(subject, body, recipients, from_email=None):
+    """Store an email in the outbox, the request path never talks to SMTP.
+    send_queued_mail delivers it."""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        recipients=list(recipients),
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def claim_batch(batch_size, now):
+    """Lease up to batch_size due emails to this worker until now +
+    OUTBOX_LEASE, in one short transaction, and count the attempt. Mail left
+    sending by a worker that died is due again once its lease runs out, or
+    dead when that was its last attempt. Returns the batch and its lease."""
+    lease = now + timedelta(seconds=settings.OUTBOX_LEASE)
+    with transaction.atomic():
+        # the next attempt of sending mail is when its lease runs out
+        due = OutboundEmail.objects.filter(
+            status__in=[OutboundEmail.PENDING, OutboundEmail.SENDING], next_attempt_at__lte=now
+        )
+        if db_connection.features.has_select_for_update_skip_locked:
+            # lets several workers drain the outbox without sending twice
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+
+        spent = [email.id for email in batch if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS]
+        if spent:
+            OutboundEmail.objects.filter(id__in=spent).update(
+                status=OutboundEmail.DEAD, last_error="the lease ran out during the last attempt"
+            )
+        batch = [email for email in batch if email.id not in spent]
+        if batch:
+            OutboundEmail.objects.filter(id__in=[email.id for email in batch]).update(
+                status=OutboundEmail.SENDING, attempts=F("attempts") + 1, next_attempt_at=lease,
+            )
+        for email in batch:
+            email.status, email.attempts, email.next_attempt_at = OutboundEmail.SENDING, email.attempts + 1, lease
+    return batch, lease
+
+
+def send_queued_batch(batch_size=None):
+    """Send up to batch_size due emails over a single SMTP connection.
+    The emails are claimed, sent and recorded in three steps, no transaction
+    (and on SQLite no write lock) is held while SMTP is talked to. Failures
+    are retried with exponential backoff and end up "dead" after
+    OUTBOX_MAX_ATTEMPTS. Returns (sent, failed)."""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    now = timezone.now()
+    sent = failed = 0
+
+    batch, lease = claim_batch(batch_size, now)
+    if not batch:
+        return sent, failed
+
+    mail_connection = get_connection(fail_silently=False)
+    try:
+        mail_connection.open()
+    except Exception as e:
+        # the server is unreachable, the whole batch backs off
+        for email in batch:
+            _record_failure(email, e, now)
+        failed = len(batch)
+    else:
+        for email in batch:
+            if timezone.now() >= lease:
+                # another worker may have claimed the rest by now, they go
+                # back to pending without counting the attempt
+                email.status, email.attempts, email.next_attempt_at = OutboundEmail.PENDING, email.attempts - 1, now
+                continue
+            try:
+                EmailMessage(
+                    email.subject, email.body, email.from_email, email.recipients,
+                    connection=mail_connection
+                ).send()
+            except Exception as e:
+                _record_failure(email, e, now)
+                failed += 1
+            else:
+                email.status = OutboundEmail.SENT
+                email.sent_at = timezone.now()
+                email.last_error = ""
+                sent += 1
+        mail_connection.close()
+
+    with transaction.atomic():
+        for email in batch:
+            # only while the lease is still this worker's, once it ran out the
+            # email may be sending again elsewhere
+            OutboundEmail.objects.filter(id=email.id, status=OutboundEmail.SENDING, next_attempt_at=lease).update(
+                status=email.status, attempts=email.attempts, last_error=email.last_error,
+                next_attempt_at=email.next_attempt_at, sent_at=email.sent_at,
+            )
+
+    return sent, failed
+
+
+def _record_failure(email, error, now):
+    # the attempt was counted when the email was claimed
+    email.last_error = str(error)
+    if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        email.status = OutboundEmail.DEAD
+    else:
+        email.status = OutboundEmail.PENDING
+        backoff = settings.OUTBOX_RETRY_BACKOFF * 2 ** (email.attempts - 1)
+        email.next_attempt_at = now + timedelta(seconds=backoff)
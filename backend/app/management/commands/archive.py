@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import archiving
+from app.models import AcademicYear
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the resolved complaints and viewed notifications of closed academic years to the archive tables, "
+        "in batches that each hold their locks briefly"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--close", action="append", default=[], metavar="YEAR",
+                            help="close this academic year (title, like 2023/2024) first, can be repeated")
+        parser.add_argument("--batch-size", type=int, help="rows moved per transaction, ARCHIVE_BATCH_SIZE by default")
+        parser.add_argument("--pause", type=float, help="seconds between batches, ARCHIVE_BATCH_PAUSE by default")
+        parser.add_argument("--dry-run", action="store_true", help="only count what would move")
+        parser.add_argument("--quiet", action="store_true", help="no progress line per batch")
+
+    def handle(self, *args, **options):
+        years = []
+        for title in options["close"]:
+            try:
+                years.append(AcademicYear.objects.get(title=title))
+            except (AcademicYear.DoesNotExist, AcademicYear.MultipleObjectsReturned):
+                raise CommandError(f"no single academic year titled {title}")
+
+        if options["dry_run"]:
+            self.stdout.write(f"{archiving.complaints_to_archive(years).count()} complaints to archive")
+            self.stdout.write(f"{archiving.notifications_to_archive(years).count()} notifications to archive")
+            return
+
+        for year in years:
+            archiving.close_year(year)
+            self.stdout.write(f"closed {year.title}")
+
+        def on_batch(table, count, seconds):
+            if not options["quiet"]:
+                self.stdout.write(f"{count} {table} archived in {seconds * 1000:.0f} ms")
+
+        started = time.perf_counter()
+        moved = archiving.archive(options["batch_size"], options["pause"], on_batch)
+        self.stdout.write(
+            f"{moved['complaints']} complaints and {moved['notifications']} notifications archived "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,64 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.importing import IMPORTS, read_rows
+
+
+class ErrorReport:
+    """CSV of the rows that failed, opened on the first failure so a clean
+    import leaves no file behind."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __call__(self, line, message):
+        if self._file is None:
+            self._file = open(self.path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["line", "error"])
+        self._writer.writerow([line, message])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class Command(BaseCommand):
+    help = "Import students or courses from a CSV or .xlsx file, in chunks and with a per-row error report"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=IMPORTS)
+        parser.add_argument("file")
+        parser.add_argument("--chunk-size", type=int, help="rows validated and written together, IMPORT_CHUNK_SIZE by default")
+        parser.add_argument("--workers", type=int, help="password hashing processes, PASSWORD_HASHING_WORKERS by default")
+        parser.add_argument("--errors", help="where to write the rows that failed, FILE.errors.csv by default")
+        parser.add_argument("--quiet", action="store_true", help="no progress line per chunk")
+
+    def handle(self, *args, **options):
+        report = ErrorReport(options["errors"] or f"{options['file']}.errors.csv")
+        importer = IMPORTS[options["kind"]](
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            on_error=report,
+            on_progress=None if options["quiet"] else lambda result: self.stdout.write(summary(result)),
+        )
+        try:
+            with open(options["file"], "rb") as file:
+                result = importer.run(read_rows(file, options["file"]))
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        finally:
+            report.close()
+
+        self.stdout.write(summary(result))
+        if result.failed:
+            self.stdout.write(f"{result.failed} rows failed, see {report.path}")
+
+
+def summary(result):
+    return (
+        f"{result.rows} rows, {result.created} created, {result.failed} failed "
+        f"in {result.elapsed:.1f}s, {result.rows_per_second:.0f} rows/s"
+    )
@@ -0,0 +1,95 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from app.seeding import seed
+
+
+class Rollback(Exception):
+    pass
+
+
+def endpoint_urls(objects):
+    """GET routes from app/urls.py with ids taken from the seeded objects."""
+    student = objects["student"].id
+    return {
+        "courses": f"/courses/{objects['lecturer'].id}",
+        "all_courses": f"/all_courses/{objects['programme'].id}",
+        "programmes": "/programmes/",
+        "lecturers": "/lecturers/",
+        "student_statistics": f"/student_statistics/{student}",
+        "notifications": f"/notifications/{student}",
+        "academic_years": "/academic_years/",
+        "registration_issues": f"/registration_issues/{student}",
+        "missing_marks": f"/missing_marks/{student}",
+        "sent_complaints": f"/sent_complaints/{student}",
+        "reg_complaints": f"/reg_complaints/{objects['programme'].id}",
+        "marks_complaints": f"/marks_complaints/{objects['course'].id}",
+    }
+
+
+def full_scans(sql):
+    """Run EXPLAIN for one captured query and return the tables it reads
+    without an index."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+            # "SCAN app_x USING INDEX ..." walks an index, plain "SCAN app_x" doesn't;
+            # SQLite before 3.36 writes "SCAN TABLE app_x"
+            scans = [(re.match(r"SCAN (?:TABLE )?(\w+)", line), line) for line in plan]
+            return [scan.group(1) for scan, line in scans if scan and "INDEX" not in line]
+        if connection.vendor == "postgresql":
+            cursor.execute("EXPLAIN " + sql)
+            plan = [row[0] for row in cursor.fetchall()]
+            return re.findall(r"Seq Scan on (\w+)", "\n".join(plan))
+    raise CommandError(f"EXPLAIN isn't supported for {connection.vendor}")
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway dataset, run every list endpoint and EXPLAIN its queries to catch full table scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=2000)
+        parser.add_argument("--fail-on-scan", action="store_true", help="exit with an error when a filtered query scans a table")
+
+    def handle(self, *args, **options):
+        client = Client()
+        regressions = []
+
+        # everything runs in a transaction that is rolled back, so the seeded
+        # rows never reach the real database
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=["testserver"]):
+                objects = seed(students=options["students"])
+                connection.cursor().execute("ANALYZE")
+
+                for name, url in endpoint_urls(objects).items():
+                    with CaptureQueriesContext(connection) as queries:
+                        client.get(url)
+
+                    for query in queries.captured_queries:
+                        sql = query["sql"]
+                        if not sql.startswith("SELECT"):
+                            continue
+                        tables = full_scans(sql)
+                        if not tables:
+                            continue
+                        # unfiltered reads like programmes/ are expected to scan
+                        filtered = " WHERE " in sql
+                        line = f"{name}: full scan of {', '.join(tables)}{'' if filtered else ' (unfiltered)'}"
+                        self.stdout.write(self.style.WARNING(line) if filtered else line)
+                        self.stdout.write(f"    {sql[:300]}")
+                        if filtered:
+                            regressions.append(line)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("No filtered query does a full table scan"))
+        elif options["fail_on_scan"]:
+            raise CommandError(f"{len(regressions)} queries do full table scans")
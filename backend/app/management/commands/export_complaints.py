@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.archiving import MODES
+from app.exports import FORMATS, KINDS, complaint_filters, complaint_kinds, export_rows, render
+
+
+class Command(BaseCommand):
+    help = "Stream missing marks and registration complaints to a CSV or JSON file, in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--type", choices=KINDS, help="one kind of complaint, both by default")
+        parser.add_argument("--programme", help="programme id")
+        parser.add_argument("--academic-year", help="academic year id")
+        parser.add_argument("--status")
+        parser.add_argument("--from", dest="from", help="first day, YYYY-MM-DD")
+        parser.add_argument("--to", help="last day, YYYY-MM-DD")
+        parser.add_argument("--archived", choices=MODES, help="add the archived complaints, or export only them")
+        parser.add_argument("--output", "-o", default="-", help="file to write, stdout by default")
+
+    def handle(self, *args, **options):
+        try:
+            kinds = complaint_kinds(options["type"])
+            filters = complaint_filters(options)
+        except ValueError as error:
+            raise CommandError(error)
+
+        rows = render(export_rows(kinds, filters, archived=options["archived"]), options["format"])
+        if options["output"] == "-":
+            for chunk in rows:
+                self.stdout.write(chunk, ending="")
+            return
+
+        with open(options["output"], "w", newline="", encoding="utf-8") as output:
+            for chunk in rows:
+                output.write(chunk)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app import rollups
+
+
+class Command(BaseCommand):
+    help = "Recount the complaint analytics rollup from the complaint tables, fixing any drift in its incremental counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="only report the groups that drifted")
+
+    def handle(self, *args, **options):
+        drifted = rollups.drift()
+        for key in drifted:
+            self.stdout.write(f"drifted: {key}")
+        if options["check"]:
+            self.stdout.write(f"{len(drifted)} groups drifted")
+            return
+        groups = rollups.rebuild()
+        self.stdout.write(f"{groups} groups rebuilt, {len(drifted)} had drifted")
@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app import search
+
+
+class Command(BaseCommand):
+    help = "Index every complaint for search again, after migrating or to repair the index"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = search.rebuild()
+        self.stdout.write(f"{count} complaints indexed in {time.perf_counter() - started:.1f}s")
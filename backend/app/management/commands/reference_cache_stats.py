@@ -0,0 +1,21 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from app.reference_cache import stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Hit/miss counts and hit ratio of the cached reference data endpoints. "
+        "The counts live in the default cache, which has to be shared with the server (REDIS_URL)"
+    )
+
+    def handle(self, *args, **options):
+        if isinstance(caches["default"], LocMemCache):
+            # this process's own empty memory, not the server's counts
+            raise CommandError("the default cache is local to each process, set REDIS_URL to share it with the server")
+        for namespace, counts in stats().items():
+            total = counts["hits"] + counts["misses"]
+            ratio = counts["hits"] / total if total else 0
+            self.stdout.write(f"{namespace:15} hits {counts['hits']:8}  misses {counts['misses']:8}  ratio {ratio:.1%}")
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.mail import send_queued_batch
+
+
+class Command(BaseCommand):
+    help = "Deliver emails from the outbox, in batches over one SMTP connection each"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="drain what is due and exit instead of polling")
+        parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=5, help="seconds to sleep when the outbox is empty")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_batch(options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"sent {sent}, failed {failed}")
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
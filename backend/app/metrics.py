@@ -0,0 +1,218 @@
+"""Per-endpoint request metrics: wall time, database queries and their time,
+cache hits and misses and response bytes, aggregated per URL pattern of
+app/urls.py and exposed in the Prometheus text format on metrics/.
+
+Counters live in the process, every worker serves its own, so scrape each
+worker or run a single one per container. Recording a request costs a few
+dict updates under a lock, and each query one clock read."""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger("app.performance")
+
+# request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time", "cache_hits", "cache_misses", "sql")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # (duration, sql) of every query, for the slow request log
+        self.sql = []
+
+
+class EndpointMetrics:
+    __slots__ = ("requests", "duration", "buckets", "queries", "query_time", "cache_hits", "cache_misses", "bytes")
+
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.duration = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes = 0
+
+
+class Registry:
+    def __init__(self):
+        self._endpoints = defaultdict(EndpointMetrics)
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status_code, duration, stats, size):
+        with self._lock:
+            endpoint = self._endpoints[(route, method)]
+            endpoint.requests[status_code] += 1
+            endpoint.duration += duration
+            bucket = bisect_left(BUCKETS, duration)
+            if bucket < len(BUCKETS):
+                endpoint.buckets[bucket] += 1
+            endpoint.queries += stats.queries
+            endpoint.query_time += stats.query_time
+            endpoint.cache_hits += stats.cache_hits
+            endpoint.cache_misses += stats.cache_misses
+            endpoint.bytes += size
+
+    def render(self):
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+
+            lines = []
+            write = lines.append
+            for name, kind, text in (
+                ("cms_http_requests_total", "counter", "Requests by URL pattern, method and status."),
+                ("cms_http_request_duration_seconds", "histogram", "Wall time from the first middleware to the response."),
+                ("cms_db_queries_total", "counter", "Database queries run while handling requests."),
+                ("cms_db_query_duration_seconds_total", "counter", "Time spent in database queries."),
+                ("cms_cache_hits_total", "counter", "Cache lookups answered from the cache."),
+                ("cms_cache_misses_total", "counter", "Cache lookups that had to be computed."),
+                ("cms_http_response_bytes_total", "counter", "Response body bytes, streamed responses excluded."),
+            ):
+                write(f"# HELP {name} {text}")
+                write(f"# TYPE {name} {kind}")
+
+                for (route, method), endpoint in endpoints:
+                    labels = f'route="{route}",method="{method}"'
+                    if name == "cms_http_requests_total":
+                        for status_code, count in sorted(endpoint.requests.items()):
+                            write(f'{name}{{{labels},status="{status_code}"}} {count}')
+                    elif name == "cms_http_request_duration_seconds":
+                        cumulative = 0
+                        for bound, count in zip(BUCKETS, endpoint.buckets):
+                            cumulative += count
+                            write(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                        total = sum(endpoint.requests.values())
+                        write(f'{name}_bucket{{{labels},le="+Inf"}} {total}')
+                        write(f"{name}_sum{{{labels}}} {endpoint.duration:.6f}")
+                        write(f"{name}_count{{{labels}}} {total}")
+                    else:
+                        value = {
+                            "cms_db_queries_total": endpoint.queries,
+                            "cms_db_query_duration_seconds_total": round(endpoint.query_time, 6),
+                            "cms_cache_hits_total": endpoint.cache_hits,
+                            "cms_cache_misses_total": endpoint.cache_misses,
+                            "cms_http_response_bytes_total": endpoint.bytes,
+                        }[name]
+                        write(f"{name}{{{labels}}} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+registry = Registry()
+
+
+def record_cache_lookup(hit):
+    """Count a lookup in one of the app's caches against the current request."""
+    stats = _current.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        stats.queries += 1
+        stats.query_time += duration
+        stats.sql.append((duration, sql))
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    # connections are per thread and reused across requests, so the wrapper
+    # is installed once per connection and looks up the request it runs for
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_instrument_connection)
+
+
+class MetricsMiddleware:
+    """Outermost middleware, times each request and attributes its queries
+    and cache lookups to the URL pattern it resolved to. Requests slower than
+    SLOW_REQUEST_THRESHOLD_MS are logged with their slowest queries."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def observe(self, request, response, duration, stats):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else "unmatched"
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(route, request.method, response.status_code, duration, stats, size)
+
+        if duration * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            slowest = sorted(stats.sql, key=lambda query: query[0], reverse=True)[:settings.SLOW_REQUEST_QUERIES]
+            logger.warning(
+                "slow request %s %s (%s) %.0fms, %d queries in %.0fms%s",
+                request.method, request.get_full_path(), route, duration * 1000,
+                stats.queries, stats.query_time * 1000,
+                "".join(f"\n    {query_time * 1000:.1f}ms {sql}" for query_time, sql in slowest),
+            )
+
+
+def metrics(request):
+    # scraped from the host or its private network, never exposed publicly
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
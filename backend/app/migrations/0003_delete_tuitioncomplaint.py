@@ -0,0 +1,16 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_passwordresettoken'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='TuitionComplaint',
+        ),
+    ]
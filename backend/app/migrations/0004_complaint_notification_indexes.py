@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_delete_tuitioncomplaint'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commoncomplaintissue',
+            index=models.Index(fields=['student', 'status'], name='complaint_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commoncomplaintissue',
+            index=models.Index(fields=['student', '-created'], name='complaint_student_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commoncomplaintissue',
+            index=models.Index(fields=['-created', '-id'], name='complaint_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commoncomplaintissue',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['student'], name='complaint_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['programme', '-created'], name='course_programme_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['lecturer', '-created'], name='course_lecturer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['reciever', 'is_viewed', '-sent'], name='notification_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_viewed', False)), fields=['reciever', '-sent'], name='notification_unviewed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role'], name='user_role_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:44
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_outboundemail'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(models.F('role'), django.db.models.functions.text.Lower('email'), name='user_role_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(models.F('role'), django.db.models.functions.text.Lower('first_name'), name='user_role_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(models.F('role'), django.db.models.functions.text.Lower('last_name'), name='user_role_last_name_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# the FTS5 table keeps its own copy of the text, rowid is the complaint id
+SQLITE = """
+CREATE VIRTUAL TABLE app_complaintsearch USING fts5(
+    kind UNINDEXED, title, body, prefix = '3', tokenize = 'unicode61'
+)
+"""
+
+POSTGRES = """
+CREATE TABLE app_complaintsearch (
+    complaint_id integer PRIMARY KEY REFERENCES app_commoncomplaintissue (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    kind varchar(20) NOT NULL,
+    title text NOT NULL,
+    body text NOT NULL,
+    document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+    ) STORED
+);
+CREATE INDEX app_complaintsearch_document_idx ON app_complaintsearch USING gin (document);
+"""
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(SQLITE)
+    elif vendor == "postgresql":
+        schema_editor.execute(POSTGRES)
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute("DROP TABLE IF EXISTS app_complaintsearch")
+
+
+class Migration(migrations.Migration):
+    """The complaint search index of app.search, fill it for complaints
+    that already exist with manage.py rebuild_search_index."""
+
+    dependencies = [
+        ('app', '0007_complaintrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_complaint_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='academicyear',
+            name='closed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedComplaint',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=20)),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('year_of_study', models.CharField(max_length=100)),
+                ('seen', models.BooleanField(default=False)),
+                ('status', models.CharField(max_length=100)),
+                ('category', models.CharField(blank=True, default='', max_length=100)),
+                ('subject', models.CharField(blank=True, default='', max_length=100)),
+                ('details', models.TextField(blank=True, default='')),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+                ('academic_year', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.academicyear')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='app.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+                'indexes': [models.Index(fields=['student', '-created'], name='archived_student_idx'), models.Index(fields=['course', '-created'], name='archived_course_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('severity', models.CharField(max_length=100)),
+                ('body', models.TextField()),
+                ('sent', models.DateTimeField()),
+                ('is_viewed', models.BooleanField(default=True)),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+                ('reciever', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-sent'],
+                'indexes': [models.Index(fields=['reciever', '-sent'], name='archived_notification_idx')],
+            },
+        ),
+    ]
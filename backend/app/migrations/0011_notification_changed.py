@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+def changed_when_sent(apps, schema_editor):
+    # existing rows last changed when they were sent, as far as anyone knows
+    Notification = apps.get_model('app', 'Notification')
+    Notification.objects.update(changed=models.F('sent'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_outbox_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='changed',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(changed_when_sent, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['reciever', 'changed', 'id'], name='notification_changed_idx'),
+        ),
+    ]
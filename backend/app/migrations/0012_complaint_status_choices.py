@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_notification_changed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='commoncomplaintissue',
+            name='status',
+            field=models.CharField(choices=[('pending', 'pending'), ('in progress', 'in progress'), ('goto_office', 'goto_office'), ('resolved', 'resolved'), ('rejected', 'rejected')], default='pending', max_length=100),
+        ),
+    ]
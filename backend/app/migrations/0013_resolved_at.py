@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_resolved_at(apps, schema_editor):
+    # the last write is the best guess there is for complaints resolved before
+    for name in ('CommonComplaintIssue', 'ArchivedComplaint'):
+        apps.get_model('app', name).objects.filter(status='resolved').update(resolved_at=F('updated'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_complaint_status_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedcomplaint',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='commoncomplaintissue',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_resolved_at, migrations.RunPython.noop),
+    ]
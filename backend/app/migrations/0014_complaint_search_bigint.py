@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def widen_complaint_id(apps, schema_editor):
+    # complaint ids are bigint, 0008 first created the column as integer
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE app_complaintsearch ALTER COLUMN complaint_id TYPE bigint")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_resolved_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(widen_complaint_id, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,47 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 
+class SearchedFields:
+    """Keeps the values of SEARCHED_FIELDS as loaded, app.search refreshes
+    the complaint search index only after a save that changed one of them."""
+    SEARCHED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_search = instance.searched_values()
+        return instance
+
+    def searched_values(self):
+        return tuple(self.__dict__.get(field) for field in self.SEARCHED_FIELDS)
+
+
+class GroupedFields:
+    """Keeps the values of GROUPED_FIELDS as loaded, app.rollups moves a
+    complaint to another ComplaintRollup group after a save that changed
+    one of them."""
+    GROUPED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_group = instance.grouped_values()
+        return instance
+
+    def grouped_values(self):
+        return {field: self.__dict__.get(field) for field in self.GROUPED_FIELDS}
+
+
 class AcademicYear(models.Model):
     title = models.CharField(max_length=100)
     created = models.DateTimeField(auto_now_add=True)
+    # set by `manage.py archive --close`, the year's resolved complaints and
+    # the viewed notifications sent before then move to the archive tables
+    closed = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.title  
@@ -21,7 +58,7 @@ class Programme(models.Model):
         return self.name
     
     
-class User(AbstractUser):
+class User(SearchedFields, AbstractUser):
     OTP = models.CharField(max_length=100, null=True, blank=True)
     role = models.CharField(max_length=100, default="user")
     registration_number = models.CharField(unique=True,max_length=100 , null=True, blank = True)
@@ -33,24 +70,84 @@ class User(AbstractUser):
 
     REQUIRED_FIELDS = ["username"]
     USERNAME_FIELD = "email"
+    SEARCHED_FIELDS = ("email", "registration_number")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the role as loaded, a user who stops being a lecturer still makes
+        # the cached lecturer lists stale
+        instance._loaded_role = instance.__dict__.get("role")
+        return instance
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # lecturers list and the registrar lookup on every registration complaint
+            models.Index(fields=['role'], name='user_role_idx'),
+            # lecturer directory prefix search
+            models.Index(F('role'), Lower('email'), name='user_role_email_idx'),
+            models.Index(F('role'), Lower('first_name'), name='user_role_first_name_idx'),
+            models.Index(F('role'), Lower('last_name'), name='user_role_last_name_idx'),
+        ]
     
 # common complaint fields 
-class CommonComplaintIssue(models.Model):
+class CommonComplaintIssue(SearchedFields, GroupedFields, models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     year_of_study = models.CharField(max_length=100)
     seen = models.BooleanField(default=False)
     academic_year = models.ForeignKey(AcademicYear, on_delete=models.SET_NULL, null = True)
-    status = models.CharField(max_length=100, default="pending") 
+    # what the registrar and lecturer pages set, "rejected" is listed by the registrar's filters
+    STATUSES = ["pending", "in progress", "goto_office", "resolved", "rejected"]
+    status = models.CharField(max_length=100, default="pending", choices=[(s, s) for s in STATUSES])
+    # when the status last became resolved, None while it isn't; the
+    # analytics time resolutions by it, updated moves on with every save
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    SEARCHED_FIELDS = ("student_id",)
+    # the student stands for their programme
+    GROUPED_FIELDS = ("student_id", "academic_year_id")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the status and resolution time as loaded, a status change moves the
+        # complaint between ComplaintRollup groups and needs both
+        instance._loaded_status = instance.__dict__.get("status")
+        instance._loaded_resolved_at = instance.__dict__.get("resolved_at")
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.status != "resolved":
+            self.resolved_at = None
+        elif self.resolved_at is None or getattr(self, "_loaded_status", None) != "resolved":
+            self.resolved_at = timezone.now()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "status" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "resolved_at"}
+        super().save(*args, **kwargs)
 
     class Meta:
         ordering = ['-created']     
+        indexes = [
+            # student dashboard counts and per-student complaint lists
+            models.Index(fields=['student', 'status'], name='complaint_student_status_idx'),
+            models.Index(fields=['student', '-created'], name='complaint_student_created_idx'),
+            # cursor pagination walks complaints by -created
+            models.Index(fields=['-created', '-id'], name='complaint_created_idx'),
+            # pending backlog only, resolved complaints are never looked up by status
+            models.Index(
+                fields=['student'],
+                condition=models.Q(status='pending'),
+                name='complaint_pending_idx'
+            ),
+        ]
 
 
 
 # course 
-class Course(models.Model):
+class Course(SearchedFields, models.Model):
     name = models.CharField(max_length=100, unique= True)
     code = models.CharField(max_length=100, unique=True) 
     semester = models.CharField(max_length=2)
@@ -58,6 +155,15 @@ class Course(models.Model):
     lecturer = models.ForeignKey(User, on_delete=models.CASCADE)   
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+
+    SEARCHED_FIELDS = ("code", "name")
+
+    class Meta:
+        indexes = [
+            # courses/<lecturer> and all_courses/<programme>, in page order
+            models.Index(fields=['programme', '-created'], name='course_programme_idx'),
+            models.Index(fields=['lecturer', '-created'], name='course_lecturer_idx'),
+        ]
     
 
     def __str__(self):
@@ -69,6 +175,9 @@ class MissingMarksComplaint(CommonComplaintIssue):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     category = models.CharField(max_length=100)
 
+    SEARCHED_FIELDS = ("student_id", "course_id")
+    GROUPED_FIELDS = ("student_id", "academic_year_id", "course_id", "category")
+
     def __str__(self):
         return str(self.created)
     
@@ -77,6 +186,8 @@ class MissingMarksComplaint(CommonComplaintIssue):
 class RegistrationComplaint(CommonComplaintIssue):
     subject = models.CharField(max_length=100)
     details = models.TextField()
+
+    SEARCHED_FIELDS = ("student_id", "subject", "details")
    
     def __str__(self):
         return self.subject[0:20]
@@ -88,9 +199,22 @@ class Notification(models.Model):
     sent = models.DateTimeField(auto_now=True)
     reciever = models.ForeignKey(User, on_delete=models.CASCADE)
     is_viewed = models.BooleanField(default=False)
+    # last time the row was written, set by hand in update()s; what
+    # notifications_sync hands out changes after
+    changed = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-sent']      
+        indexes = [
+            models.Index(fields=['reciever', 'is_viewed', '-sent'], name='notification_inbox_idx'),
+            models.Index(fields=['reciever', 'changed', 'id'], name='notification_changed_idx'),
+            # unread badge and "mark all viewed" only touch unviewed rows
+            models.Index(
+                fields=['reciever', '-sent'],
+                condition=models.Q(is_viewed=False),
+                name='notification_unviewed_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.body[0:20]
@@ -108,11 +232,122 @@ class PasswordResetToken(models.Model):
 
     def __str__(self):
         return f"Password reset token for {self.user.email}"
-    
 
-  
 
+class OutboundEmail(models.Model):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    DEAD = "dead"
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, null=True, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=20, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            # the worker only ever looks for due pending mail, and for
+            # sending mail whose worker's lease ran out
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status__in=['pending', 'sending']),
+                name='outbox_due_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)}"
+
+
+class ComplaintRollup(models.Model):
+    """Complaint counts per kind, programme, course, category, academic year
+    and status, kept up to date by app.rollups as complaints are created,
+    change status and are deleted. Dashboards sum these rows instead of
+    scanning complaints, `manage.py rebuild_rollups` recounts them."""
+
+    MISSING_MARKS = "missing_marks"
+    REGISTRATION = "registration"
+
+    # every dimension below joined into one string, nullable columns can't
+    # carry a unique constraint that treats NULLs as equal on every database
+    key = models.CharField(max_length=200, unique=True)
+    kind = models.CharField(max_length=20)
+    programme = models.ForeignKey(Programme, on_delete=models.SET_NULL, null=True, blank=True)
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True)
+    category = models.CharField(max_length=100, blank=True, default="")
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+    # created to resolved, summed over the resolved complaints of the group
+    resolution_seconds = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return self.key
+
+
+class ArchivedComplaint(GroupedFields, models.Model):
+    """A resolved complaint of a closed academic year, moved out of the
+    complaint tables by app.archiving with the id it had there. Both kinds
+    share this table, the fields of the other kind are left empty."""
+
+    MISSING_MARKS = "missing_marks"
+    REGISTRATION = "registration"
+
+    id = models.BigIntegerField(primary_key=True)
+    kind = models.CharField(max_length=20)
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    student = models.ForeignKey(User, on_delete=models.CASCADE)
+    year_of_study = models.CharField(max_length=100)
+    seen = models.BooleanField(default=False)
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.SET_NULL, null=True)
+    status = models.CharField(max_length=100)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True)
+    category = models.CharField(max_length=100, blank=True, default="")
+    subject = models.CharField(max_length=100, blank=True, default="")
+    details = models.TextField(blank=True, default="")
+    archived = models.DateTimeField(auto_now_add=True)
+
+    GROUPED_FIELDS = ("student_id", "academic_year_id", "course_id", "category")
 
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            # the same lists as the live complaints, with ?archived=
+            models.Index(fields=['student', '-created'], name='archived_student_idx'),
+            models.Index(fields=['course', '-created'], name='archived_course_idx'),
+        ]
 
+    def __str__(self):
+        return f"{self.kind} {self.id}"
 
 
+class ArchivedNotification(models.Model):
+    """A viewed notification sent before the latest academic year closed,
+    moved out of the notification table by app.archiving."""
+
+    id = models.BigIntegerField(primary_key=True)
+    severity = models.CharField(max_length=100)
+    body = models.TextField()
+    sent = models.DateTimeField()
+    reciever = models.ForeignKey(User, on_delete=models.CASCADE)
+    is_viewed = models.BooleanField(default=True)
+    archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-sent']
+        indexes = [
+            models.Index(fields=['reciever', '-sent'], name='archived_notification_idx'),
+        ]
+
+    def __str__(self):
+        return self.body[0:20]
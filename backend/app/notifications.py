@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import transaction
+
+from .broker import get_broker
+from .mail import queue_mail
+from .models import Notification
+from .serializers import NotificationsSerializer
+
+
+def announce(notification):
+    """Push a new notification to the receiver's open streams once the
+    transaction commits, and email it when NOTIFICATION_EMAILS is on."""
+    message = dict(NotificationsSerializer(notification).data)
+    # only push once the row is visible to anyone who re-fetches
+    transaction.on_commit(lambda: get_broker().publish(notification.reciever_id, message))
+
+    if settings.NOTIFICATION_EMAILS:
+        queue_mail("New notification - WBCMS", notification.body, [notification.reciever.email])
+
+
+def create_notifications(notifications):
+    """bulk_create skips post_save, so the bulk paths announce each row here."""
+    notifications = Notification.objects.bulk_create(notifications)
+    for notification in notifications:
+        announce(notification)
+    return notifications
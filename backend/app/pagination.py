@@ -0,0 +1,158 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .archiving import archived_mode
+
+
+class ListCursorPagination(CursorPagination):
+    # keyset pagination, pages are found with WHERE <ordering field> < cursor
+    # instead of OFFSET so deep pages cost the same as the first one
+    page_size = settings.PAGINATION_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    ordering = ("-created", "-id")
+
+
+class MergedCursorPagination(ListCursorPagination):
+    """Keyset pages over several querysets at once, like live rows and their
+    archived copies, in one (-field, -id) order. A page reads page_size + 1
+    rows past the cursor from each queryset and keeps the first page_size of
+    them merged, the cursor is the field and id of the row it stopped at."""
+
+    def paginate_querysets(self, querysets, request):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        field = self.ordering[0].lstrip("-")
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor.reverse
+
+        if cursor is None:
+            after = Q()
+        else:
+            value, row_id = self.position(cursor)
+            lookup = "gt" if reverse else "lt"
+            after = Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"id__{lookup}": row_id})
+        ordering = (field, "id") if reverse else (f"-{field}", "-id")
+
+        rows = [row for queryset in querysets for row in queryset.filter(after).order_by(*ordering)[:self.page_size + 1]]
+        rows.sort(key = lambda row: (getattr(row, field), row.id), reverse = not reverse)
+        more, page = len(rows) > self.page_size, rows[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        def link(row, reverse):
+            position = f"{getattr(row, field).isoformat()}|{row.id}"
+            return self.encode_cursor(Cursor(offset = 0, reverse = reverse, position = position))
+
+        # a previous page was read backwards from the cursor, "more" tells
+        # whether there are rows before it instead of after it
+        if reverse:
+            self.next_link = link(page[-1], False) if page else None
+            self.previous_link = link(page[0], True) if more else None
+        else:
+            self.next_link = link(page[-1], False) if more else None
+            self.previous_link = link(page[0], True) if page and cursor is not None else None
+        return page
+
+    def position(self, cursor):
+        value, _, row_id = (cursor.position or "").rpartition("|")
+        try:
+            value, row_id = parse_datetime(value), int(row_id)
+        except ValueError:
+            value = None
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, row_id
+
+    def get_next_link(self):
+        return self.next_link
+
+    def get_previous_link(self):
+        return self.previous_link
+
+
+def wants_pagination(request):
+    # old clients get the whole list unless they ask for a page
+    if not settings.LEGACY_LIST_RESPONSES:
+        return True
+    return "cursor" in request.GET or "page_size" in request.GET
+
+
+def list_sources(request, queryset, serializer_class, archived):
+    """(queryset, serializer class) pairs a list reads: the live rows, their
+    archived copies with ?archived=only, or both with ?archived=include.
+    archived is the archive's pair, None for lists without one."""
+    try:
+        mode = archived_mode(request.GET.get("archived")) if archived else None
+    except ValueError as error:
+        raise ValidationError({"error": str(error)})
+    if mode == "only":
+        return [archived]
+    if mode == "include":
+        return [(queryset, serializer_class), archived]
+    return [(queryset, serializer_class)]
+
+
+def merged_data(rows, sources, field):
+    # each row serialized by its own queryset's serializer, in the list's order
+    serializers = {queryset.model: serializer_class() for queryset, serializer_class in sources}
+    rows = sorted(rows, key = lambda row: (getattr(row, field), row.id), reverse = True)
+    return [serializers[type(row)].to_representation(row) for row in rows]
+
+
+def merged_page(request, sources, ordering):
+    paginator = MergedCursorPagination()
+    paginator.ordering = ordering
+    page = paginator.paginate_querysets([queryset for queryset, _ in sources], request)
+    return paginator, merged_data(page, sources, ordering[0].lstrip("-"))
+
+
+def paginated_response(request, queryset, serializer_class, ordering=("-created", "-id"), archived=None):
+    sources = list_sources(request, queryset, serializer_class, archived)
+    if len(sources) > 1:
+        if not wants_pagination(request):
+            rows = [row for queryset, _ in sources for row in queryset]
+            return Response(merged_data(rows, sources, ordering[0].lstrip("-")))
+        paginator, data = merged_page(request, sources, ordering)
+        return paginator.get_paginated_response(data)
+
+    [(queryset, serializer_class)] = sources
+    if not wants_pagination(request):
+        converted = serializer_class(queryset, many = True)
+        return Response(converted.data)
+
+    paginator = ListCursorPagination()
+    paginator.ordering = ordering
+    page = paginator.paginate_queryset(queryset, request)
+    converted = serializer_class(page, many = True)
+    return paginator.get_paginated_response(converted.data)
+
+
+async def apaginate(request, queryset, serializer_class, ordering=("-created", "-id"), archived=None):
+    """Data of paginated_response() for async views, request is the plain
+    Django request. The list is fetched with the async ORM, only DRF's cursor
+    pagination, which is sync, runs its page query in a thread."""
+    sources = list_sources(request, queryset, serializer_class, archived)
+    if len(sources) > 1:
+        if not wants_pagination(request):
+            rows = [row for queryset, _ in sources async for row in queryset]
+            return merged_data(rows, sources, ordering[0].lstrip("-"))
+        paginator, data = await sync_to_async(merged_page)(Request(request), sources, ordering)
+        return paginator.get_paginated_response(data).data
+
+    [(queryset, serializer_class)] = sources
+    if not wants_pagination(request):
+        converted = serializer_class([row async for row in queryset], many = True)
+        return converted.data
+
+    paginator = ListCursorPagination()
+    paginator.ordering = ordering
+    page = await sync_to_async(paginator.paginate_queryset)(queryset, Request(request))
+    converted = serializer_class(page, many = True)
+    return paginator.get_paginated_response(converted.data).data
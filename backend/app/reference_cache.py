@@ -0,0 +1,184 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import record_cache_lookup
+from .models import User
+
+# reference data namespaces and the models whose changes make them stale,
+# course rows carry the lecturer's email and the programme's name. Only
+# lecturers appear in reference data, see stales()
+NAMESPACES = {
+    "programmes": ["Programme"],
+    "academic_years": ["AcademicYear"],
+    "courses": ["Course", "Programme", "User"],
+    "lecturers": ["User"],
+}
+
+
+def stales(instance):
+    """Whether saving or deleting instance changes reference data. Students
+    update their profiles all the time, that leaves the cached courses and
+    lecturers alone."""
+    if isinstance(instance, User):
+        return "lecturer" in (instance.role, getattr(instance, "_loaded_role", None))
+    return True
+
+
+def version_key(namespace):
+    return f"refcache_version_{namespace}"
+
+
+def get_version(namespace):
+    """The version is the time the namespace last changed in milliseconds, it
+    doubles as the Last-Modified date of every cached response in it."""
+    version = cache.get(version_key(namespace))
+    if version is None:
+        version = int(time.time() * 1000)
+        cache.add(version_key(namespace), version, None)
+    return version
+
+
+async def aget_version(namespace):
+    version = await cache.aget(version_key(namespace))
+    if version is None:
+        version = int(time.time() * 1000)
+        await cache.aadd(version_key(namespace), version, None)
+    return version
+
+
+def bump(model_name):
+    """Invalidate every namespace built from model_name. Old entries are never
+    deleted, they just stop being looked up and expire."""
+    keys = [version_key(ns) for ns, models in NAMESPACES.items() if model_name in models]
+    current = cache.get_many(keys)
+    now = int(time.time() * 1000)
+    # strictly increasing, two changes within a millisecond still get new keys
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, None)
+
+
+def record(namespace, outcome):
+    # in the default cache, per process unless it is shared (REDIS_URL)
+    record_cache_lookup(outcome == "hits")
+    key = f"refcache_{outcome}_{namespace}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+async def arecord(namespace, outcome):
+    record_cache_lookup(outcome == "hits")
+    key = f"refcache_{outcome}_{namespace}"
+    if not await cache.aadd(key, 1, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            pass
+
+
+def stats():
+    keys = [f"refcache_{outcome}_{ns}" for ns in NAMESPACES for outcome in ("hits", "misses")]
+    values = cache.get_many(keys)
+    return {
+        ns: {
+            "hits": values.get(f"refcache_hits_{ns}", 0),
+            "misses": values.get(f"refcache_misses_{ns}", 0),
+        }
+        for ns in NAMESPACES
+    }
+
+
+def cached_reference(namespace, timeout=24 * 60 * 60):
+    """Serve a GET view's JSON from the cache as pre-rendered bytes, with an
+    ETag so clients can revalidate with a 304. Other methods go straight to
+    the view. Works on sync DRF views and on async views, whose misses are
+    awaited."""
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method != "GET":
+                    return await view(request, *args, **kwargs)
+
+                version = await aget_version(namespace)
+                key = cache_key(namespace, version, request)
+                entry = await cache.aget(key)
+                if entry is None:
+                    response = await view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    entry = await astore(namespace, key, response, timeout)
+                else:
+                    await arecord(namespace, "hits")
+                return respond(request, entry, version)
+
+            return markcoroutinefunction(async_wrapper)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET":
+                return view(request, *args, **kwargs)
+
+            version = get_version(namespace)
+            key = cache_key(namespace, version, request)
+            entry = cache.get(key)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                entry = store(namespace, key, response, timeout)
+            else:
+                record(namespace, "hits")
+            return respond(request, entry, version)
+
+        return wrapper
+
+    return decorator
+
+
+def cache_key(namespace, version, request):
+    return f"refcache:{namespace}:{version}:{request.get_full_path()}"
+
+
+def store(namespace, key, response, timeout):
+    record(namespace, "misses")
+    entry = rendered_entry(response)
+    cache.set(key, entry, timeout)
+    return entry
+
+
+async def astore(namespace, key, response, timeout):
+    await arecord(namespace, "misses")
+    entry = rendered_entry(response)
+    await cache.aset(key, entry, timeout)
+    return entry
+
+
+def rendered_entry(response):
+    # DRF responses carry data, async views hand over already rendered JSON
+    body = JSONRenderer().render(response.data) if hasattr(response, "data") else response.content
+    return (body, f'"{hashlib.md5(body).hexdigest()}"')
+
+
+def respond(request, entry, version):
+    """Only an ETag match gets a 304. Last-Modified has whole seconds, two
+    versions within the same second would look alike to If-Modified-Since.
+    It is rounded up so it never predates the change it stands for."""
+    body, etag = entry
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(-(-version // 1000))
+    return response
@@ -0,0 +1,240 @@
+"""Incrementally maintained complaint analytics.
+
+Every complaint counts in one ComplaintRollup row, its group: kind,
+programme (the student's), course, category, academic year and status.
+Creating a complaint adds one to its group, a save that changes its status
+or one of its GROUPED_FIELDS moves it to another and a delete takes it
+away, and resolved groups also sum the seconds from creation to
+resolution. All the changes of a write are applied
+with a single UPDATE, plus an INSERT the first time a group is seen.
+
+analytics() answers the registrar dashboard from these rows, so its cost
+follows the number of groups and not the number of complaints.
+rebuild() recounts everything from the complaint tables. Archived
+complaints keep counting, archiving moves no complaint between groups."""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Case, Count, DurationField, ExpressionWrapper, F, Q, Sum, Value, When
+
+from .models import ArchivedComplaint, ComplaintRollup, MissingMarksComplaint, RegistrationComplaint, User
+
+DIMENSIONS = ("kind", "programme", "course", "category", "academic_year")
+
+
+def group_key(group):
+    return ":".join("" if group[field] is None else str(group[field]) for field in DIMENSIONS + ("status",))
+
+
+def complaint_group(complaint, status, values, programmes):
+    """The group of complaint with status and values, its GROUPED_FIELDS as
+    saved or as loaded. programmes maps student ids to their programme."""
+    if isinstance(complaint, ArchivedComplaint):
+        marks = complaint.kind == ArchivedComplaint.MISSING_MARKS
+    else:
+        marks = isinstance(complaint, MissingMarksComplaint)
+    return {
+        "kind": ComplaintRollup.MISSING_MARKS if marks else ComplaintRollup.REGISTRATION,
+        "programme": programmes.get(values["student_id"]),
+        "course": values["course_id"] if marks else None,
+        "category": values["category"] if marks else "",
+        "academic_year": values["academic_year_id"],
+        "status": status,
+    }
+
+
+def student_programmes(complaints):
+    """Programme id by student id for the students of complaints, as loaded
+    and as saved. Students selected with their complaint are read from it,
+    the others in one query."""
+    programmes, student_ids = {}, set()
+    for complaint in complaints:
+        if complaint._meta.get_field("student").is_cached(complaint):
+            programmes[complaint.student_id] = complaint.student.programme_id
+        student_ids.add(complaint.student_id)
+        student_ids.add(getattr(complaint, "_loaded_group", {}).get("student_id"))
+    student_ids -= programmes.keys() | {None}
+    if student_ids:
+        programmes.update(User.objects.filter(id__in=student_ids).values_list("id", "programme_id"))
+    return programmes
+
+
+def resolution_seconds(complaint, resolved_at):
+    return int((resolved_at - complaint.created).total_seconds())
+
+
+class Deltas:
+    """Count and resolution time changes per group, applied in one go."""
+
+    def __init__(self, complaints):
+        self.programmes = student_programmes(complaints)
+        self.groups = {}
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(int)
+
+    def add(self, complaint, status, resolved_at, values, sign):
+        group = complaint_group(complaint, status, values, self.programmes)
+        key = group_key(group)
+        self.groups[key] = group
+        self.counts[key] += sign
+        if status == "resolved":
+            self.seconds[key] += sign * resolution_seconds(complaint, resolved_at)
+
+    def apply(self):
+        keys = [key for key in self.groups if self.counts[key] or self.seconds[key]]
+        updated = self.update(keys) if keys else 0
+        if updated < len(keys):
+            # first complaint of a group: insert the missing rows empty, a
+            # concurrent insert of the same group is ignored, then count them
+            existing = set(ComplaintRollup.objects.filter(key__in=keys).values_list("key", flat=True)) if updated else ()
+            missing = [key for key in keys if key not in existing]
+            ComplaintRollup.objects.bulk_create(
+                [ComplaintRollup(key=key, **self.row(self.groups[key])) for key in missing],
+                ignore_conflicts=True,
+            )
+            self.update(missing)
+
+    def update(self, keys):
+        changes = {"count": self.counts}
+        if any(self.seconds[key] for key in keys):
+            changes["resolution_seconds"] = self.seconds
+        if len(keys) == 1:
+            # a single complaint's save, plain arithmetic compiles a lot faster than a CASE
+            return ComplaintRollup.objects.filter(key=keys[0]).update(
+                **{field: F(field) + values[keys[0]] for field, values in changes.items()}
+            )
+        return ComplaintRollup.objects.filter(key__in=keys).update(**{
+            field: F(field) + Case(
+                *(When(key=key, then=Value(values[key])) for key in keys),
+                default=Value(0), output_field=BigIntegerField(),
+            )
+            for field, values in changes.items()
+        })
+
+    @staticmethod
+    def row(group):
+        return {
+            "kind": group["kind"], "programme_id": group["programme"], "course_id": group["course"],
+            "category": group["category"], "academic_year_id": group["academic_year"], "status": group["status"],
+        }
+
+
+def record_created(complaint):
+    deltas = Deltas([complaint])
+    deltas.add(complaint, complaint.status, complaint.resolved_at, complaint.grouped_values(), 1)
+    deltas.apply()
+
+
+def record_deleted(complaint):
+    deltas = Deltas([complaint])
+    deltas.add(complaint, complaint.status, complaint.resolved_at, complaint.grouped_values(), -1)
+    deltas.apply()
+
+
+def record_changes(complaints, status, resolved_at):
+    """Move complaints, loaded with their previous status, resolution time
+    and GROUPED_FIELDS, to the groups of their new status and fields. For
+    saves, and for writes that bypass save(), like the bulk status update."""
+    deltas = Deltas(complaints)
+    for complaint in complaints:
+        values = complaint.grouped_values()
+        if complaint._loaded_status == status and complaint._loaded_group == values:
+            continue
+        deltas.add(complaint, complaint._loaded_status, complaint._loaded_resolved_at, complaint._loaded_group, -1)
+        deltas.add(complaint, status, resolved_at, values, 1)
+    deltas.apply()
+
+
+def grouped_complaints():
+    """Rollup rows counted from the complaint and archive tables, the naive
+    GROUP BY the incremental rows stand in for."""
+    resolution = Sum(
+        ExpressionWrapper(F("resolved_at") - F("created"), output_field=DurationField()),
+        filter=Q(status="resolved"),
+    )
+    groups = {}
+    for kind, queryset, fields in (
+        (ComplaintRollup.MISSING_MARKS, MissingMarksComplaint.objects, ["course", "category"]),
+        (ComplaintRollup.REGISTRATION, RegistrationComplaint.objects, []),
+        (ComplaintRollup.MISSING_MARKS, ArchivedComplaint.objects.filter(kind=ArchivedComplaint.MISSING_MARKS), ["course", "category"]),
+        (ComplaintRollup.REGISTRATION, ArchivedComplaint.objects.filter(kind=ArchivedComplaint.REGISTRATION), []),
+    ):
+        rows = (
+            queryset.order_by()
+            .values("student__programme", "academic_year", "status", *fields)
+            .annotate(total=Count("id"), resolution=resolution)
+        )
+        for row in rows:
+            group = {
+                "kind": kind,
+                "programme": row["student__programme"],
+                "course": row.get("course"),
+                "category": row.get("category", ""),
+                "academic_year": row["academic_year"],
+                "status": row["status"],
+            }
+            key = group_key(group)
+            # a group can have both live and archived complaints
+            rollup = groups.setdefault(key, ComplaintRollup(key=key, count=0, resolution_seconds=0, **Deltas.row(group)))
+            rollup.count += row["total"]
+            rollup.resolution_seconds += int(row["resolution"].total_seconds()) if row["resolution"] else 0
+    return groups.values()
+
+
+def drift():
+    """Keys of the groups whose rollup row differs from a fresh count."""
+    stored = {
+        key: (count, seconds)
+        for key, count, seconds in ComplaintRollup.objects.values_list("key", "count", "resolution_seconds")
+        if count or seconds
+    }
+    fresh = {row.key: (row.count, row.resolution_seconds) for row in grouped_complaints()}
+    return sorted(key for key in stored.keys() | fresh.keys() if stored.get(key) != fresh.get(key))
+
+
+def rebuild():
+    """Replace every rollup row with a fresh count. Returns the number of groups."""
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            # complaint writes queue on their rollup update until the new rows
+            # are in, the count below sees everything committed before them
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {ComplaintRollup._meta.db_table} IN EXCLUSIVE MODE")
+        ComplaintRollup.objects.all().delete()
+        return len(ComplaintRollup.objects.bulk_create(grouped_complaints(), batch_size=1000))
+
+
+def analytics(group_by, filters=None):
+    """Dashboard rows grouped by any of DIMENSIONS: complaint volume, pending
+    backlog, resolution rate and mean hours to resolution. filters are
+    rollup lookups, like {"programme": 3}."""
+    names = {"programme": "programme__name", "course": "course__name", "academic_year": "academic_year__title"}
+    fields = [field for dimension in group_by for field in (dimension, names.get(dimension)) if field]
+
+    rows = (
+        ComplaintRollup.objects.filter(**(filters or {}))
+        .values(*fields)
+        .annotate(
+            total=Sum("count"),
+            pending=Sum("count", filter=Q(status="pending")),
+            resolved=Sum("count", filter=Q(status="resolved")),
+            seconds=Sum("resolution_seconds", filter=Q(status="resolved")),
+        )
+        .order_by(*group_by)
+    )
+    results = []
+    for row in rows:
+        total, pending, resolved = (row.pop(field) or 0 for field in ("total", "pending", "resolved"))
+        seconds = row.pop("seconds") or 0
+        # groups whose complaints all moved elsewhere
+        if not total:
+            continue
+        results.append({
+            **row,
+            "total": total,
+            "pending": pending,
+            "resolved": resolved,
+            "resolution_rate": round(resolved / total, 4),
+            "average_resolution_hours": round(seconds / resolved / 3600, 2) if resolved else None,
+        })
+    return results
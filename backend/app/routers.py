@@ -0,0 +1,125 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+_routing = ContextVar("replica_routing", default=None)
+_tokens = JWTStatelessUserAuthentication()
+
+
+def pin_key(user_id):
+    return f"replica_pin_{user_id}"
+
+
+def token_user_id(request):
+    """Id of the user in the request's access token, or None. The router needs
+    it before DRF authenticates the request, checking the signature is cheap."""
+    header = _tokens.get_header(request)
+    raw_token = header and _tokens.get_raw_token(header)
+    if not raw_token:
+        return None
+    try:
+        return _tokens.get_validated_token(raw_token).get(api_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
+        return None
+
+
+class RequestRouting:
+    """Read routing state of the request being handled."""
+
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        self._pinned = None
+
+    @property
+    def pinned(self):
+        # the user wrote within the last REPLICA_PIN_SECONDS, looked up once
+        # on the first read of the request
+        if self._pinned is None:
+            user_id = token_user_id(self.request)
+            self._pinned = user_id is not None and bool(cache.get(pin_key(user_id)))
+        return self._pinned
+
+
+class PrimaryReplicaRouter:
+    """Sends the reads of a request to a random replica in
+    settings.DATABASE_REPLICAS and writes to the primary. Reads stay on the
+    primary inside a transaction, for the rest of a request once it has
+    written, and for a user's requests within REPLICA_PIN_SECONDS of their
+    last write, so nobody misses their own changes because of replication
+    lag."""
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        # management commands and other work outside a request read from the
+        # primary, they tend to read what they have just written
+        if routing is None or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if routing.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block or routing.pinned:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # real replicas get the schema through replication, local SQLite ones
+        # are migrated like the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Tracks writes per request for PrimaryReplicaRouter, and pins the user to
+    the primary for REPLICA_PIN_SECONDS after a request that wrote. Works in
+    both the WSGI and ASGI stacks, so async views stay on the event loop."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        routing = RequestRouting(request)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        self.pin(request, routing)
+        return response
+
+    async def __acall__(self, request):
+        routing = RequestRouting(request)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        self.pin(request, routing)
+        return response
+
+    def pin(self, request, routing):
+        if routing.wrote and settings.DATABASE_REPLICAS:
+            user_id = token_user_id(request)
+            if user_id is not None:
+                cache.set(pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+TEST_REPLICA = "test_replica"
+
+
+class TestRunner(DiscoverRunner):
+    """Adds TEST_REPLICA, a mirror of the test database like the
+    DB_REPLICA_NAMES ones, for the routing tests, which route to it
+    themselves. It is left out of DATABASE_REPLICAS, so everything else
+    keeps reading the primary."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.DATABASES[TEST_REPLICA] = {**settings.DATABASES["default"], "TEST": {"MIRROR": "default"}}
+        # fills in the defaults of the new alias, connections may already hold the settings dict
+        connections.configure_settings(settings.DATABASES)
@@ -0,0 +1,245 @@
+"""Full-text search over complaints.
+
+Every complaint has one row in the app_complaintsearch index: its kind, a
+title (the registration subject, or the course code and name) and a body
+(the registration details and the student's email and registration number).
+On SQLite the index is an FTS5 table ranked with bm25, on PostgreSQL a
+table with a generated tsvector column under a GIN index ranked with
+ts_rank, both created by migration 0008. Titles weigh more than bodies.
+Other databases have no index: nothing is stored and searches scan the
+complaints for every word, newest first, unranked.
+
+Text is lowercased and split into words before it is stored and before it
+is searched, so both databases see the same words: an email or a
+registration number is found by any of its parts. Words written together in
+a query, like the parts of an email, must appear together, which the index
+also answers much faster than the same words anywhere. A part ending in *,
+like "stud*", matches its last word as a prefix.
+
+Only the newest SEARCH_RANK_WINDOW matches are ranked: a word in most
+complaints would otherwise have every one of them scored for each page.
+
+The signals in app.signals keep the index current as complaints, students
+and courses are saved, rebuild() fills it from scratch."""
+import re
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from .models import CommonComplaintIssue, MissingMarksComplaint, RegistrationComplaint
+
+TABLE = "app_complaintsearch"
+KINDS = {"missing_marks": MissingMarksComplaint, "registration": RegistrationComplaint}
+
+_WORD = re.compile(r"\w+")
+# shorter prefixes are matched as whole words, "1*" would match a tenth of
+# every number in the index
+PREFIX_MIN = 3
+
+
+def words(*texts):
+    return [word for text in texts if text for word in _WORD.findall(text.lower())]
+
+
+def complaint_kind(complaint):
+    return "missing_marks" if isinstance(complaint, MissingMarksComplaint) else "registration"
+
+
+def document(complaint):
+    """(id, kind, title, body) of a complaint, its student and for missing
+    marks its course loaded."""
+    student = complaint.student
+    people = (student.email, student.registration_number)
+    if isinstance(complaint, MissingMarksComplaint):
+        title = words(complaint.course.code, complaint.course.name)
+        body = words(*people)
+    else:
+        title = words(complaint.subject)
+        body = words(complaint.details, *people)
+    return complaint.id, complaint_kind(complaint), " ".join(title), " ".join(body)
+
+
+def phrases(query):
+    """(words, prefix) of each whitespace separated part of query, prefix
+    when the part ends in * and its last word is long enough."""
+    parsed = []
+    for part in query.split():
+        found = words(part)
+        if found:
+            parsed.append((found, part.endswith("*") and len(found[-1]) >= PREFIX_MIN))
+    return parsed
+
+
+class SQLiteIndex:
+    stored = True
+
+    @staticmethod
+    def match(phrases):
+        # every phrase quoted, FTS5 would read AND, OR, NOT and NEAR as operators
+        return " ".join(f'"{" ".join(found)}"' + (" *" if prefix else "") for found, prefix in phrases)
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(f"INSERT OR REPLACE INTO {TABLE} (rowid, kind, title, body) VALUES (%s, %s, %s, %s)", rows)
+
+    def search(self, cursor, phrases, kind, window, limit, offset):
+        # bm25 weights follow the columns: kind, title, body
+        cursor.execute(
+            f"SELECT rowid FROM ("
+            f"SELECT rowid, bm25({TABLE}, 0, 2.0, 1.0) AS score FROM {TABLE} "
+            f"WHERE {TABLE} MATCH %s AND (%s IS NULL OR kind = %s) ORDER BY rowid DESC LIMIT %s"
+            f") ORDER BY score, rowid DESC LIMIT %s OFFSET %s",
+            [self.match(phrases), kind, kind, window, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def delete(self, cursor, ids):
+        # SQLite binds 999 parameters at most
+        size = cursor.db.features.max_query_params
+        for start in range(0, len(ids), size):
+            chunk = ids[start:start + size]
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+
+class PostgresIndex:
+    stored = True
+
+    @staticmethod
+    def match(phrases):
+        return " & ".join(f"({' <-> '.join(found)}{':*' if prefix else ''})" for found, prefix in phrases)
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (complaint_id, kind, title, body) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (complaint_id) DO UPDATE SET kind = EXCLUDED.kind, title = EXCLUDED.title, body = EXCLUDED.body",
+            rows,
+        )
+
+    def search(self, cursor, phrases, kind, window, limit, offset):
+        cursor.execute(
+            f"SELECT complaint_id FROM ("
+            f"SELECT complaint_id, ts_rank(document, query) AS score FROM {TABLE}, to_tsquery('simple', %s) query "
+            "WHERE document @@ query AND (%s::varchar IS NULL OR kind = %s) ORDER BY complaint_id DESC LIMIT %s"
+            ") matches ORDER BY score DESC, complaint_id DESC LIMIT %s OFFSET %s",
+            [self.match(phrases), kind, kind, window, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def delete(self, cursor, ids):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE complaint_id = ANY(%s)", [list(ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {TABLE}")
+
+
+class ScanIndex:
+    # the complaint fields the other indexes copy their text from
+    FIELDS = (
+        "registrationcomplaint__subject", "registrationcomplaint__details",
+        "missingmarkscomplaint__course__code", "missingmarkscomplaint__course__name",
+        "student__email", "student__registration_number",
+    )
+
+    stored = False
+
+    def upsert(self, cursor, rows):
+        pass
+
+    def search(self, cursor, phrases, kind, window, limit, offset):
+        complaints = CommonComplaintIssue.objects.using(cursor.db.alias)
+        for found, prefix in phrases:
+            for word in found:
+                matches = Q()
+                for field in self.FIELDS:
+                    matches |= Q(**{f"{field}__icontains": word})
+                complaints = complaints.filter(matches)
+        if kind is not None:
+            complaints = complaints.filter(**{f"{KINDS[kind]._meta.model_name}__isnull": False})
+        return list(complaints.order_by("-id").values_list("id", flat=True).distinct()[:window][offset:offset + limit])
+
+    def delete(self, cursor, ids):
+        pass
+
+    def clear(self, cursor):
+        pass
+
+
+BACKENDS = {"sqlite": SQLiteIndex(), "postgresql": PostgresIndex()}
+# migration 0008 creates no table anywhere else
+FALLBACK = ScanIndex()
+
+
+def _index(using):
+    connection = connections[using]
+    return connection, BACKENDS.get(connection.vendor, FALLBACK)
+
+
+def index(complaints):
+    """Add or refresh the index rows of complaints."""
+    connection, backend = _index(router.db_for_write(CommonComplaintIssue))
+    rows = [document(complaint) for complaint in complaints] if backend.stored else []
+    if rows:
+        with connection.cursor() as cursor:
+            backend.upsert(cursor, rows)
+
+
+def remove(ids):
+    if ids:
+        connection, backend = _index(router.db_for_write(CommonComplaintIssue))
+        with connection.cursor() as cursor:
+            backend.delete(cursor, list(ids))
+
+
+def complaints_to_index(kinds=KINDS, **filters):
+    """Complaints of kinds matching filters, loaded with what document() reads."""
+    people = ("student__email", "student__registration_number")
+    loaded = {
+        "missing_marks": MissingMarksComplaint.objects.select_related("student", "course")
+            .only("id", "student", "course__code", "course__name", *people),
+        "registration": RegistrationComplaint.objects.select_related("student")
+            .only("id", "student", "subject", "details", *people),
+    }
+    for kind in kinds:
+        yield from loaded[kind].filter(**filters).order_by("id").iterator(chunk_size=settings.SEARCH_INDEX_CHUNK_SIZE)
+
+
+def reindex(kinds=KINDS, **filters):
+    """Refresh the complaints of kinds matching filters, after a change to
+    the students or courses they show. Returns how many were indexed."""
+    if not _index(router.db_for_write(CommonComplaintIssue))[1].stored:
+        return 0
+    chunk, count = [], 0
+    for complaint in complaints_to_index(kinds, **filters):
+        chunk.append(complaint)
+        if len(chunk) >= settings.SEARCH_INDEX_CHUNK_SIZE:
+            index(chunk)
+            count, chunk = count + len(chunk), []
+    index(chunk)
+    return count + len(chunk)
+
+
+def rebuild():
+    """Empty the index and index every complaint again, in one transaction
+    so searches never see it half filled. Returns how many were indexed."""
+    using = router.db_for_write(CommonComplaintIssue)
+    connection, backend = _index(using)
+    with transaction.atomic(using):
+        with connection.cursor() as cursor:
+            backend.clear(cursor)
+        return reindex()
+
+
+def search(query, kind=None, limit=None, offset=0):
+    """Ids of the complaints matching every part of query, best match first.
+    kind narrows them to "missing_marks" or "registration"."""
+    parts = phrases(query)
+    if not parts:
+        return []
+    connection, backend = _index(router.db_for_read(CommonComplaintIssue))
+    with connection.cursor() as cursor:
+        return backend.search(
+            cursor, parts, kind, settings.SEARCH_RANK_WINDOW, limit or settings.PAGINATION_PAGE_SIZE, offset
+        )
@@ -0,0 +1,104 @@
+from django.db import transaction
+
+from .models import (
+    User, Programme, AcademicYear, Course, Notification,
+    MissingMarksComplaint, RegistrationComplaint
+)
+
+STATUSES = ["pending", "pending", "resolved", "in progress"]
+
+
+def seed(programmes=5, students=500, lecturers=20, courses=50, complaints_per_student=4, notifications_per_user=5):
+    """Fill the database with a realistic spread of users, courses, complaints
+    and notifications. Everything is written with bulk_create so large
+    volumes stay fast, rows are tagged with a "seed" prefix so they don't
+    clash with real data. Returns a dict of a few representative objects
+    that callers can build URLs from."""
+
+    years = AcademicYear.objects.bulk_create([
+        AcademicYear(title=f"{2020 + i}/{2021 + i}") for i in range(4)
+    ])
+    programme_rows = Programme.objects.bulk_create([
+        Programme(name=f"seed programme {i}") for i in range(programmes)
+    ])
+
+    # unusable password, hashing thousands of passwords would dominate the run
+    lecturer_rows = User.objects.bulk_create([
+        User(
+            email=f"seed.lecturer{i}@cit.mak.ac.ug",
+            username=f"seed.lecturer{i}",
+            role="lecturer",
+            password="!",
+            programme=programme_rows[i % programmes],
+        )
+        for i in range(lecturers)
+    ])
+    registrar = User.objects.filter(role="registrar").first()
+    if registrar is None:
+        registrar = User.objects.create(
+            email="seed.registrar@mak.ac.ug", username="seed.registrar", role="registrar", password="!"
+        )
+
+    student_rows = User.objects.bulk_create([
+        User(
+            email=f"seed.student{i}@students.mak.ac.ug",
+            username=f"seed.student{i}",
+            role="student",
+            password="!",
+            registration_number=f"seed/{i}",
+            student_number=f"seed{i}",
+            programme=programme_rows[i % programmes],
+            has_profile=True,
+        )
+        for i in range(students)
+    ], batch_size=1000)
+
+    course_rows = Course.objects.bulk_create([
+        Course(
+            name=f"seed course {i}",
+            code=f"SEED{i}",
+            semester=str(i % 2 + 1),
+            programme=programme_rows[i % programmes],
+            lecturer=lecturer_rows[i % lecturers],
+        )
+        for i in range(courses)
+    ])
+
+    # django can't bulk_create multi-table inheritance children, so they are
+    # saved one by one inside a single transaction
+    marks, registration = [], []
+    for i, student in enumerate(student_rows):
+        for j in range(complaints_per_student):
+            common = dict(
+                student=student,
+                year_of_study=str(j % 3 + 1),
+                academic_year=years[(i + j) % len(years)],
+                status=STATUSES[(i + j) % len(STATUSES)],
+            )
+            if j % 2:
+                registration.append(RegistrationComplaint(subject=f"seed subject {i}.{j}", details="seeded", **common))
+            else:
+                marks.append(MissingMarksComplaint(course=course_rows[(i + j) % courses], category="exam", **common))
+    _save_all(marks)
+    _save_all(registration)
+
+    Notification.objects.bulk_create([
+        Notification(severity="info", body=f"seed notification {j}", reciever=user, is_viewed=bool(j % 2))
+        for user in student_rows + lecturer_rows
+        for j in range(notifications_per_user)
+    ], batch_size=1000)
+
+    return {
+        "programme": programme_rows[0],
+        "student": student_rows[0],
+        "lecturer": lecturer_rows[0],
+        "registrar": registrar,
+        "course": course_rows[0],
+        "academic_year": years[0],
+    }
+
+
+def _save_all(objs):
+    with transaction.atomic():
+        for obj in objs:
+            obj.save(force_insert=True)
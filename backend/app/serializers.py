@@ -1,11 +1,24 @@
-from rest_framework.serializers import ModelSerializer, EmailField, CharField
-from .models import User, Course, Programme, AcademicYear, Notification, MissingMarksComplaint, RegistrationComplaint
+from rest_framework.serializers import ModelSerializer, BaseSerializer, EmailField, CharField, PrimaryKeyRelatedField
+from .models import (
+    User, Course, Programme, AcademicYear, Notification, MissingMarksComplaint, RegistrationComplaint, CommonComplaintIssue,
+    ArchivedComplaint, ArchivedNotification
+)
 
 class UserSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'    
 
+class LecturerSerializer(ModelSerializer):
+    # directory listing only, no credentials and no group/permission lookups
+    class Meta:
+        model = User
+        fields = ["id", "first_name", "last_name", "username", "email", "programme"]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.only(*LecturerSerializer.Meta.fields)
+
 class CourseSerializer(ModelSerializer):
     email = EmailField(source="lecturer.email", read_only = True)
     program = EmailField(source="programme.name", read_only = True)
@@ -14,6 +27,11 @@ class CourseSerializer(ModelSerializer):
         model = Course
         fields = '__all__'
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # load everything the source= fields above read in the same query
+        return queryset.select_related("lecturer", "programme")
+
 class ProgrammeSerializer(ModelSerializer):
     class Meta:
         model = Programme
@@ -28,6 +46,10 @@ class RegistrationComplaintSerializer(ModelSerializer):
         model = RegistrationComplaint
         fields = '__all__'
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related("student", "academic_year")
+
 class MissingMarksComplaintSerializer(ModelSerializer):
     year = CharField(source = "academic_year.title", read_only = True)
     registration_number = CharField(source = "student.registration_number", read_only = True)
@@ -36,16 +58,122 @@ class MissingMarksComplaintSerializer(ModelSerializer):
     courseName = CharField(source = "course.name", read_only = True)
     academicYear  = CharField(source= "academic_year.title", read_only = True)
     semester  = CharField(source= "course.semester", read_only = True)
+    # the lecturer is notified of every new complaint, load it with the course
+    course = PrimaryKeyRelatedField(queryset = Course.objects.select_related("lecturer"))
     class Meta:
         model = MissingMarksComplaint
         fields = '__all__'
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related("student", "academic_year", "course")
+
+class ComplaintFeedSerializer(BaseSerializer):
+    """Serializes CommonComplaintIssue rows as whichever complaint kind they
+    are, tagged with a "type" the frontend filters on."""
+
+    KINDS = (
+        ("missingmarkscomplaint", MissingMarksComplaintSerializer, "missing marks complaint"),
+        ("registrationcomplaint", RegistrationComplaintSerializer, "registration issues"),
+    )
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # both children are joined in, django fills the parent fields on them
+        # from the same row so no per-row query is needed
+        return queryset.select_related(
+            "student", "academic_year", "missingmarkscomplaint__course", "registrationcomplaint"
+        )
+
+    def to_representation(self, instance):
+        for accessor, serializer_class, label in self.KINDS:
+            complaint = getattr(instance, accessor, None)
+            if complaint is not None:
+                data = self.kind_serializer(serializer_class).to_representation(complaint)
+                data["type"] = label
+                return data
+
+    def kind_serializer(self, serializer_class):
+        # one per kind for the whole list, building a serializer's fields
+        # costs several times more than serializing a row with them
+        serializers = self.__dict__.setdefault("_kind_serializers", {})
+        if serializer_class not in serializers:
+            serializers[serializer_class] = serializer_class()
+        return serializers[serializer_class]
+
+
+class ArchivedRegistrationComplaintSerializer(ModelSerializer):
+    """RegistrationComplaintSerializer's fields for an archived registration
+    complaint, plus when it was archived."""
+    year = CharField(source = "academic_year.title", read_only = True)
+    registration_number = CharField(source = "student.registration_number", read_only = True)
+    student_number = CharField(source = "student.student_number", read_only = True)
+    email = CharField(source = "student.email", read_only = True)
+    class Meta:
+        model = ArchivedComplaint
+        fields = [
+            "id", "year", "registration_number", "student_number", "email", "created", "updated",
+            "year_of_study", "seen", "status", "resolved_at", "subject", "details", "student", "academic_year", "archived",
+        ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related("student", "academic_year")
+
+class ArchivedMissingMarksComplaintSerializer(ModelSerializer):
+    """MissingMarksComplaintSerializer's fields for an archived missing marks
+    complaint, plus when it was archived."""
+    year = CharField(source = "academic_year.title", read_only = True)
+    registration_number = CharField(source = "student.registration_number", read_only = True)
+    student_number = CharField(source = "student.student_number", read_only = True)
+    email = CharField(source = "student.email", read_only = True)
+    courseName = CharField(source = "course.name", read_only = True)
+    academicYear  = CharField(source= "academic_year.title", read_only = True)
+    semester  = CharField(source= "course.semester", read_only = True)
+    class Meta:
+        model = ArchivedComplaint
+        fields = [
+            "id", "year", "registration_number", "student_number", "email", "courseName", "academicYear", "semester",
+            "course", "created", "updated", "year_of_study", "seen", "status", "resolved_at", "category", "student",
+            "academic_year", "archived",
+        ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related("student", "academic_year", "course")
+
+class ArchivedComplaintFeedSerializer(ComplaintFeedSerializer):
+    """ComplaintFeedSerializer for ArchivedComplaint rows."""
+
+    KINDS = {
+        ArchivedComplaint.MISSING_MARKS: (ArchivedMissingMarksComplaintSerializer, "missing marks complaint"),
+        ArchivedComplaint.REGISTRATION: (ArchivedRegistrationComplaintSerializer, "registration issues"),
+    }
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related("student", "academic_year", "course")
+
+    def to_representation(self, instance):
+        serializer_class, label = self.KINDS[instance.kind]
+        data = self.kind_serializer(serializer_class).to_representation(instance)
+        data["type"] = label
+        return data
+
+
 class NotificationsSerializer(ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
 
+class ArchivedNotificationSerializer(ModelSerializer):
+    class Meta:
+        model = ArchivedNotification
+        fields = ["id", "severity", "body", "sent", "is_viewed", "reciever", "archived"]
+
 class YearsSerializer(ModelSerializer):
     class Meta:
         model = AcademicYear
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        # years are closed by `manage.py archive --close`
+        read_only_fields = ["closed"]
\ No newline at end of file
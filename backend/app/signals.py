@@ -0,0 +1,96 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import MissingMarksComplaint, RegistrationComplaint, ArchivedComplaint, Notification, User, Programme, AcademicYear, Course
+from .counters import invalidate_student_statistics, invalidate_registrar
+from .notifications import announce
+from .authentication import invalidate_auth_state
+from . import reference_cache, rollups, search
+
+
+@receiver(post_save, sender=MissingMarksComplaint)
+@receiver(post_save, sender=RegistrationComplaint)
+@receiver(post_delete, sender=MissingMarksComplaint)
+@receiver(post_delete, sender=RegistrationComplaint)
+@receiver(post_delete, sender=ArchivedComplaint)
+def complaint_changed(sender, instance, **kwargs):
+    invalidate_student_statistics(instance.student_id)
+
+
+@receiver(post_save, sender=MissingMarksComplaint)
+@receiver(post_save, sender=RegistrationComplaint)
+def complaint_saved(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_created(instance)
+    elif hasattr(instance, "_loaded_status"):
+        rollups.record_changes([instance], instance.status, instance.resolved_at)
+    # a second save of the same instance starts from what the first one wrote
+    instance._loaded_status, instance._loaded_resolved_at = instance.status, instance.resolved_at
+    instance._loaded_group = instance.grouped_values()
+
+
+@receiver(post_delete, sender=MissingMarksComplaint)
+@receiver(post_delete, sender=RegistrationComplaint)
+@receiver(post_delete, sender=ArchivedComplaint)
+def complaint_deleted(sender, instance, **kwargs):
+    rollups.record_deleted(instance)
+
+
+def searched_text_changed(instance):
+    values = instance.searched_values()
+    changed = getattr(instance, "_loaded_search", None) != values
+    instance._loaded_search = values
+    return changed
+
+
+@receiver(post_save, sender=MissingMarksComplaint)
+@receiver(post_save, sender=RegistrationComplaint)
+def complaint_text_saved(sender, instance, created, **kwargs):
+    if searched_text_changed(instance) or created:
+        search.index([instance])
+
+
+# a student's email and registration number and a course's code and name
+# are indexed with the complaints that show them
+@receiver(post_save, sender=User)
+def student_text_saved(sender, instance, created, **kwargs):
+    if searched_text_changed(instance) and not created and instance.role == "student":
+        search.reindex(student=instance.id)
+
+
+@receiver(post_save, sender=Course)
+def course_text_saved(sender, instance, created, **kwargs):
+    if searched_text_changed(instance) and not created:
+        search.reindex(kinds=["missing_marks"], course=instance.id)
+
+
+@receiver(post_delete, sender=MissingMarksComplaint)
+@receiver(post_delete, sender=RegistrationComplaint)
+def complaint_unindexed(sender, instance, **kwargs):
+    search.remove([instance.id])
+
+
+@receiver(post_save, sender=Notification)
+def notification_created(sender, instance, created, **kwargs):
+    if created:
+        announce(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_registrar(instance)
+    invalidate_auth_state(instance.id)
+
+
+@receiver(post_save, sender=Programme)
+@receiver(post_save, sender=AcademicYear)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Programme)
+@receiver(post_delete, sender=AcademicYear)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=User)
+def reference_data_changed(sender, instance, **kwargs):
+    if reference_cache.stales(instance):
+        reference_cache.bump(sender.__name__)
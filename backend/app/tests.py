@@ -1,3 +1,1606 @@
-from django.test import TestCase
+"""Query budget and latency regression suite, query scaling, pagination and
+student statistics, async login and complaint submission tests, and the
+bulk import, complaint export, analytics rollup, search, archival, mail
+outbox, sent complaints, notification sync and stream, bulk status update,
+reference cache, token revocation, metrics and replica routing tests.
 
-# Create your tests here.
+Seeds students, complaints and notifications, then drives every route in
+app/urls.py through the test client. A run fails when an endpoint runs more
+queries than its budget in ENDPOINTS. With PERF_LATENCY=true it seeds a
+realistic volume and also fails when an endpoint runs more queries than its
+baseline, or when its latency is more than PERF_THRESHOLD above the JSON
+baseline.
+
+    python manage.py test app
+    PERF_LATENCY=true python manage.py test app.tests.EndpointPerformanceTests
+
+Environment:
+    PERF_LATENCY          true to check latencies against the baseline
+    PERF_STUDENTS         students to seed (200, 20000 with PERF_LATENCY)
+    PERF_ITERATIONS       requests per endpoint (3, 50 with PERF_LATENCY)
+    PERF_THRESHOLD        allowed latency regression, 0.25 is 25% (0.25)
+    PERF_FLOOR_MS         regressions below this many ms are noise (2)
+    PERF_PERCENTILES      percentiles checked against the baseline (50), p95
+                          and p99 are recorded but swing with a noisy machine
+    PERF_BASELINE         baseline file (benchmarks/perf_baseline.json)
+    PERF_UPDATE_BASELINE  true to record this run as the new baseline
+
+Latencies depend on the machine, record a baseline on the machine that
+checks against it. Without a baseline the latency check is skipped.
+"""
+import asyncio
+import csv
+import gc
+import io
+import json
+import os
+import time
+import warnings
+from datetime import timedelta
+from pathlib import Path
+from smtplib import SMTPException
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections
+from django.db.models import F
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import get_resolver
+from django.utils import timezone
+from django.utils.http import parse_http_date
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from .authentication import CachedStatelessJWTAuthentication
+from .counters import REGISTRAR_KEY
+from .exports import COLUMNS
+from .importing import IMPORTS, read_rows
+from .mail import claim_batch, queue_mail, send_queued_batch
+from .models import (
+    AcademicYear, ArchivedComplaint, ArchivedNotification, CommonComplaintIssue, ComplaintRollup, Course,
+    MissingMarksComplaint, Notification, OutboundEmail, PasswordResetToken, Programme, RegistrationComplaint, User,
+)
+from . import archiving, async_views, broker, metrics, reference_cache, rollups, search
+from .routers import ReplicaRoutingMiddleware, pin_key
+from .seeding import seed
+from .views import login_response
+
+LATENCY = os.getenv("PERF_LATENCY", "false").lower() == "true"
+# the query budgets hold at any volume, only latencies need a realistic one
+STUDENTS = int(os.getenv("PERF_STUDENTS", 20000 if LATENCY else 200))
+ITERATIONS = int(os.getenv("PERF_ITERATIONS", 50 if LATENCY else 3))
+THRESHOLD = float(os.getenv("PERF_THRESHOLD", 0.25))
+FLOOR_MS = float(os.getenv("PERF_FLOOR_MS", 2))
+PERCENTILES = [f"p{p.strip()}_ms" for p in os.getenv("PERF_PERCENTILES", "50").split(",")]
+BASELINE = Path(os.getenv("PERF_BASELINE", Path(__file__).resolve().parent.parent / "benchmarks" / "perf_baseline.json"))
+UPDATE_BASELINE = os.getenv("PERF_UPDATE_BASELINE", "false").lower() == "true"
+
+PASSWORD = "Perf#Passw0rd"
+
+
+def endpoint(method, route, url, data=None, status=200, max_queries=0, auth=True, **extra):
+    """One measured request. url and data are called with the seeded objects
+    and the iteration number, so writes can use fresh values every time."""
+    return {
+        "method": method, "route": route, "url": url, "data": data or (lambda o, i: None),
+        "status": status, "max_queries": max_queries, "auth": auth, "extra": extra,
+    }
+
+
+ENDPOINTS = [
+    endpoint("POST", "token/", lambda o, i: "/token/", lambda o, i: {"email": o["student"].email, "password": PASSWORD}, max_queries=1, auth=False),
+    endpoint("POST", "token/refresh", lambda o, i: "/token/refresh", lambda o, i: {"refresh": o["refresh"]}, max_queries=1, auth=False),
+    endpoint("POST", "signup/", lambda o, i: "/signup/", lambda o, i: {
+        "email": f"perf.signup{i}@students.mak.ac.ug", "username": f"perf.signup{i}", "password": PASSWORD,
+    }, status=201, max_queries=6, auth=False),
+    endpoint("POST", "login/", lambda o, i: "/login/", lambda o, i: {"email": o["student"].email, "password": PASSWORD}, max_queries=1, auth=False),
+    endpoint("PATCH", "update_profile/<str:pk>", lambda o, i: f"/update_profile/{o['student'].id}", lambda o, i: {"first_name": f"Perf{i}"}, status=202, max_queries=6),
+    endpoint("GET", "courses/<str:pk>", lambda o, i: f"/courses/{o['lecturer'].id}", max_queries=2),
+    endpoint("POST", "courses/<str:pk>", lambda o, i: f"/courses/{o['lecturer'].id}", lambda o, i: {
+        "name": f"perf course {i}", "code": f"PERF{i}", "semester": "1",
+        "programme": o["programme"].id, "lecturer": o["lecturer"].id,
+    }, status=201, max_queries=5),
+    endpoint("GET", "all_courses/<str:pk>", lambda o, i: f"/all_courses/{o['programme'].id}", max_queries=1),
+    endpoint("GET", "programmes/", lambda o, i: "/programmes/", max_queries=1),
+    endpoint("POST", "programmes/", lambda o, i: "/programmes/", lambda o, i: {"name": f"perf programme {i}"}, status=201, max_queries=2),
+    endpoint("GET", "lecturers/", lambda o, i: "/lecturers/", max_queries=1),
+    # the live and the archived complaints are counted on a cache miss
+    endpoint("GET", "student_statistics/<str:pk>", lambda o, i: f"/student_statistics/{o['student'].id}", max_queries=2),
+    endpoint("GET", "notifications/<str:pk>", lambda o, i: f"/notifications/{o['student'].id}", max_queries=2),
+    endpoint("POST", "notifications/<str:pk>", lambda o, i: f"/notifications/{o['student'].id}", lambda o, i: {
+        "severity": "info", "body": f"perf notification {i}", "reciever": o["student"].id,
+    }, status=201, max_queries=3),
+    endpoint("GET", "view_notifications/<str:pk>", lambda o, i: f"/view_notifications/{o['student'].id}", status=202, max_queries=2),
+    endpoint("GET", "notifications_sync/<str:pk>", lambda o, i: f"/notifications_sync/{o['student'].id}", max_queries=2),
+    # the test client is WSGI, where the stream answers 501 without a query
+    endpoint("GET", "notifications_stream/<str:pk>", lambda o, i: f"/notifications_stream/{o['student'].id}", status=501, max_queries=0),
+    endpoint("GET", "academic_years/", lambda o, i: "/academic_years/", max_queries=1),
+    endpoint("POST", "academic_years/", lambda o, i: "/academic_years/", lambda o, i: {"title": f"{3000 + i}/{3001 + i}"}, status=201, max_queries=1),
+    endpoint("GET", "registration_issues/<str:pk>", lambda o, i: f"/registration_issues/{o['student'].id}", max_queries=1),
+    # complaint writes add an UPDATE of the analytics rollup, and three more
+    # queries the first time they reach a group (all the seeded registration
+    # complaints are pending, the first resolved one starts a group); new
+    # complaints add their search index row
+    endpoint("POST", "registration_issues/<str:pk>", lambda o, i: f"/registration_issues/{o['student'].id}", lambda o, i: {
+        "student": o["student"].id, "academic_year": o["academic_year"].id,
+        "year_of_study": "2", "subject": f"perf subject {i}", "details": "perf",
+    }, status=201, max_queries=12),
+    endpoint("GET", "missing_marks/<str:pk>", lambda o, i: f"/missing_marks/{o['student'].id}", max_queries=1),
+    endpoint("POST", "missing_marks/<str:pk>", lambda o, i: f"/missing_marks/{o['student'].id}", lambda o, i: {
+        "student": o["student"].id, "course": o["course"].id, "academic_year": o["academic_year"].id,
+        "year_of_study": "2", "category": "exam",
+    }, status=201, max_queries=10),
+    endpoint("GET", "sent_complaints/<str:pk>", lambda o, i: f"/sent_complaints/{o['student'].id}", max_queries=1),
+    endpoint("GET", "reg_complaints/<str:pk>", lambda o, i: f"/reg_complaints/{o['programme'].id}", max_queries=2),
+    endpoint("PATCH", "update_reg_complaint/<str:pk>", lambda o, i: f"/update_reg_complaint/{o['registration_ids'][0]}",
+             lambda o, i: {"status": "resolved"}, status=202, max_queries=9),
+    endpoint("PATCH", "update_marks_complaint/<str:pk>", lambda o, i: f"/update_marks_complaint/{o['marks_ids'][0]}",
+             lambda o, i: {"status": "resolved"}, status=202, max_queries=9),
+    endpoint("PATCH", "bulk_update_reg_complaints/", lambda o, i: "/bulk_update_reg_complaints/",
+             lambda o, i: {"ids": o["registration_ids"], "status": "resolved"}, status=202, max_queries=9),
+    endpoint("PATCH", "bulk_update_marks_complaints/", lambda o, i: "/bulk_update_marks_complaints/",
+             lambda o, i: {"ids": o["marks_ids"], "status": "resolved"}, status=202, max_queries=9),
+    endpoint("GET", "marks_complaints/<str:pk>", lambda o, i: f"/marks_complaints/{o['course'].id}", max_queries=2),
+    # one programme's complaints of both kinds, streamed
+    endpoint("GET", "export_complaints/", lambda o, i: f"/export_complaints/?programme={o['programme'].id}", max_queries=2),
+    endpoint("GET", "complaint_analytics/", lambda o, i: "/complaint_analytics/?group_by=programme,academic_year", max_queries=1),
+    # a student's registration number, its words match the complaints of a few hundred students
+    endpoint("GET", "search_complaints/", lambda o, i: f"/search_complaints/?q=seed/{i + 1}", max_queries=2),
+    # a different student and client address every time, the endpoint is rate limited on both
+    endpoint("POST", "forgot-password/", lambda o, i: "/forgot-password/", lambda o, i: {"email": f"seed.student{i + 1}@students.mak.ac.ug"},
+             max_queries=3, auth=False, REMOTE_ADDR=lambda o, i: f"10.0.{i // 250}.{i % 250}"),
+    endpoint("POST", "reset-password/<str:token>/", lambda o, i: f"/reset-password/{o['reset_tokens'][i]}/",
+             lambda o, i: {"password": "An0ther#Perf-Passw0rd"}, max_queries=5, auth=False),
+    endpoint("GET", "metrics/", lambda o, i: "/metrics/", max_queries=0),
+]
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def endpoint_key(spec):
+    return f"{spec['method']} {spec['route']}"
+
+
+# hashing is the same work on every run, a fast hasher keeps it from drowning the rest of login
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class EndpointPerformanceTests(TestCase):
+    results = None
+
+    @classmethod
+    def setUpTestData(cls):
+        objects = seed(
+            programmes=10, students=STUDENTS, lecturers=100, courses=200,
+            complaints_per_student=2, notifications_per_user=3,
+        )
+        student = objects["student"]
+        student.set_password(PASSWORD)
+        student.save()
+
+        tokens = login_response(student)
+        objects["refresh"], objects["access"] = tokens["refresh"], tokens["access"]
+        # a page worth of complaints for the bulk updates
+        objects["registration_ids"] = list(RegistrationComplaint.objects.values_list("id", flat=True)[:50])
+        objects["marks_ids"] = list(MissingMarksComplaint.objects.values_list("id", flat=True)[:50])
+        reset_users = User.objects.filter(role="student").exclude(id=student.id).order_by("id")[:ITERATIONS + 1]
+        objects["reset_tokens"] = [f"perf-reset-{user.id}" for user in reset_users]
+        PasswordResetToken.objects.bulk_create([
+            PasswordResetToken(user=user, token=f"perf-reset-{user.id}", expires_at=timezone.now() + timedelta(hours=1))
+            for user in reset_users
+        ])
+        cls.objects = objects
+
+    def setUp(self):
+        cache.clear()
+
+    def measure(self):
+        """Run every endpoint ITERATIONS times and keep its worst query count
+        and its latency percentiles. Runs once, both tests read the results."""
+        if EndpointPerformanceTests.results is not None:
+            return EndpointPerformanceTests.results
+
+        # keep collector pauses over the seeded objects, and over the garbage
+        # of the endpoint before, out of the latencies
+        gc.collect()
+        gc.freeze()
+        results = {}
+        for spec in ENDPOINTS:
+            gc.collect()
+            headers = {"HTTP_AUTHORIZATION": f"Bearer {self.objects['access']}"} if spec["auth"] else {}
+            latencies, queries, statuses = [], [], set()
+
+            # the first request warms caches and code paths, its queries count but not its time
+            for i in range(ITERATIONS + 1):
+                extra = {key: value(self.objects, i) for key, value in spec["extra"].items()}
+                data = spec["data"](self.objects, i)
+                request = getattr(self.client, spec["method"].lower())
+                # the frontend sends JSON bodies
+                kwargs = {"content_type": "application/json"} if data is not None else {}
+
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = request(spec["url"](self.objects, i), data, **kwargs, **headers, **extra)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured))
+                statuses.add(response.status_code)
+                if i == 0:
+                    latencies.clear()
+
+            results[endpoint_key(spec)] = {
+                "statuses": sorted(statuses),
+                "queries": max(queries),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+            }
+
+        gc.unfreeze()
+        EndpointPerformanceTests.results = results
+        return results
+
+    def test_every_route_is_measured(self):
+        measured = {spec["route"] for spec in ENDPOINTS}
+        routes = {str(pattern.pattern) for pattern in get_resolver("app.urls").url_patterns}
+        self.assertEqual(routes - measured, set(), "routes without a query budget in ENDPOINTS")
+
+    def test_query_budgets(self):
+        results = self.measure()
+        for spec in ENDPOINTS:
+            result = results[endpoint_key(spec)]
+            with self.subTest(endpoint_key(spec)):
+                self.assertEqual(result["statuses"], [spec["status"]])
+                self.assertLessEqual(result["queries"], spec["max_queries"])
+
+    @skipUnless(LATENCY, "PERF_LATENCY=true checks latencies")
+    def test_latency_against_baseline(self):
+        results = self.measure()
+        volumes = {"students": STUDENTS, "iterations": ITERATIONS}
+
+        if UPDATE_BASELINE:
+            BASELINE.write_text(json.dumps({"volumes": volumes, "endpoints": results}, indent=2, sort_keys=True) + "\n")
+            return
+        if not BASELINE.exists():
+            self.skipTest(f"no baseline at {BASELINE}, PERF_UPDATE_BASELINE=true records one")
+
+        baseline = json.loads(BASELINE.read_text())
+        if baseline["volumes"] != volumes:
+            self.skipTest(f"baseline was recorded with {baseline['volumes']}, this run uses {volumes}")
+
+        for key, result in results.items():
+            recorded = baseline["endpoints"].get(key)
+            if recorded is None:
+                continue
+            with self.subTest(key):
+                self.assertLessEqual(result["queries"], recorded["queries"], "more queries than the baseline")
+                for stat in PERCENTILES:
+                    limit = recorded[stat] * (1 + THRESHOLD) + FLOOR_MS
+                    self.assertLessEqual(result[stat], limit, f"{stat} regressed, baseline {recorded[stat]}ms")
+
+
+class QueryScalingTests(TestCase):
+    """Lists cost the same number of queries whatever the number of rows in
+    them. Each list is read with N rows added, then with 2N."""
+
+    N = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=1, students=2, lecturers=1, courses=1, complaints_per_student=2, notifications_per_user=1)
+
+    def setUp(self):
+        self.added = 0
+        # the export needs a token, the other lists don't mind one
+        self.client = self.client_class(headers={"Authorization": f"Bearer {login_response(self.objects['registrar'])['access']}"})
+
+    def add_rows(self, count):
+        """count more rows in every list of the seeded student, programme,
+        course and lecturer, each with related rows of its own."""
+        objects = self.objects
+        start, self.added = self.added, self.added + count
+        students = User.objects.bulk_create([
+            User(email=f"scaling{i}@students.mak.ac.ug", username=f"scaling{i}", role="student", password="!",
+                 registration_number=f"scaling/{i}", programme=objects["programme"])
+            for i in range(start, self.added)
+        ])
+        courses = Course.objects.bulk_create([
+            Course(name=f"scaling course {i}", code=f"SCALE{i}", semester="1", programme=objects["programme"], lecturer=objects["lecturer"])
+            for i in range(start, self.added)
+        ])
+        common = dict(year_of_study="1", academic_year=objects["academic_year"])
+        for student, course in zip(students, courses):
+            MissingMarksComplaint.objects.create(student=objects["student"], course=course, category="exam", **common)
+            MissingMarksComplaint.objects.create(student=student, course=objects["course"], category="exam", **common)
+            RegistrationComplaint.objects.create(student=objects["student"], subject="scaling", details="scaling", **common)
+            RegistrationComplaint.objects.create(student=student, subject="scaling", details="scaling", **common)
+        # ids clear of the live complaints'
+        ArchivedComplaint.objects.bulk_create([
+            archived
+            for i, (student, course) in enumerate(zip(students, courses), start=10**9 + 2 * start)
+            for archived in (
+                ArchivedComplaint(id=i * 2, kind=ArchivedComplaint.MISSING_MARKS, student=objects["student"], course=course,
+                                  category="exam", created=timezone.now(), updated=timezone.now(), status="resolved", **common),
+                ArchivedComplaint(id=i * 2 + 1, kind=ArchivedComplaint.REGISTRATION, student=student, subject="scaling",
+                                  created=timezone.now(), updated=timezone.now(), status="resolved", **common),
+            )
+        ])
+        User.objects.bulk_create([
+            User(email=f"scaling{i}@cit.mak.ac.ug", username=f"scaling.lecturer{i}", role="lecturer", password="!",
+                 programme=objects["programme"])
+            for i in range(start, self.added)
+        ])
+        Notification.objects.bulk_create([
+            Notification(severity="info", body=f"scaling {i}", reciever=objects["student"]) for i in range(start, self.added)
+        ])
+
+    def queries(self, url, params=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def assertQueriesDoNotGrow(self, urls):
+        self.add_rows(self.N)
+        counts = {url: self.queries(url) for url in urls}
+        self.add_rows(self.N)
+        for url in urls:
+            with self.subTest(url):
+                self.assertEqual(self.queries(url), counts[url])
+
+    def test_seen_marking(self):
+        # every added complaint is unseen, the lists mark them all in one UPDATE
+        urls = [f"/reg_complaints/{self.objects['programme'].id}", f"/marks_complaints/{self.objects['course'].id}"]
+        self.assertQueriesDoNotGrow(urls)
+        self.assertFalse(CommonComplaintIssue.objects.filter(seen=False, registrationcomplaint__isnull=False).exists())
+        self.assertFalse(CommonComplaintIssue.objects.filter(seen=False, missingmarkscomplaint__course=self.objects["course"]).exists())
+
+    def test_lists(self):
+        objects = self.objects
+        student, programme, course, lecturer = (objects[name].id for name in ("student", "programme", "course", "lecturer"))
+        urls = [
+            f"/missing_marks/{student}",
+            f"/registration_issues/{student}",
+            f"/sent_complaints/{student}",
+            f"/reg_complaints/{programme}",
+            f"/marks_complaints/{course}",
+            f"/notifications/{student}",
+            f"/courses/{lecturer}",
+            f"/all_courses/{programme}",
+            "/lecturers/",
+        ]
+        # and with the archived rows, merged into the same list
+        urls += [f"{url}?archived=include" for url in urls[:6]]
+        urls += ["/search_complaints/?q=scaling&page_size=100", "/export_complaints/?format=json"]
+        self.assertQueriesDoNotGrow(urls)
+
+
+class PaginationTests(TestCase):
+    """Cursor pages of the notifications list, the live rows alone and
+    merged with the archived ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=1, students=1, lecturers=1, courses=1, complaints_per_student=2, notifications_per_user=7)
+        student = cls.objects["student"]
+        cls.url = f"/notifications/{student.id}"
+        # bulk created, every live notification has the same sent time and
+        # the pages are told apart by id
+        cls.live = list(Notification.objects.filter(reciever=student).order_by("-sent", "-id").values_list("id", flat=True))
+        ArchivedNotification.objects.bulk_create([
+            ArchivedNotification(id=10**9 + i, severity="info", body=f"archived {i}", sent=timezone.now() - timedelta(days=i),
+                                 reciever=student)
+            for i in range(1, 6)
+        ])
+        cls.archived = list(ArchivedNotification.objects.order_by("-sent", "-id").values_list("id", flat=True))
+
+    def pages(self, params):
+        """Results of every page from the first one following next, then
+        of every page from the last one following previous."""
+        forward = [self.client.get(self.url, params).json()]
+        while forward[-1]["next"]:
+            forward.append(self.client.get(forward[-1]["next"]).json())
+        backward = [forward[-1]]
+        while backward[-1]["previous"]:
+            backward.append(self.client.get(backward[-1]["previous"]).json())
+        ids = lambda pages: [[row["id"] for row in page["results"]] for page in pages]
+        return ids(forward), ids(backward)
+
+    def assertPagesCover(self, params, expected):
+        forward, backward = self.pages({"page_size": 3, **params})
+        self.assertTrue(all(len(page) <= 3 for page in forward))
+        # every row once, in the list's order, whichever way the pages are walked
+        self.assertEqual([row for page in forward for row in page], expected)
+        self.assertEqual(backward, forward[::-1])
+
+    def test_cursors_round_trip(self):
+        self.assertPagesCover({}, self.live)
+
+    def test_merged_cursors_round_trip(self):
+        self.assertPagesCover({"archived": "include"}, self.live + self.archived)
+        self.assertPagesCover({"archived": "only"}, self.archived)
+
+    def test_page_size(self):
+        with mock.patch("app.pagination.ListCursorPagination.max_page_size", 2):
+            self.assertEqual(len(self.client.get(self.url, {"page_size": 5}).json()["results"]), 2)
+            self.assertEqual(len(self.client.get(self.url, {"page_size": 5, "archived": "include"}).json()["results"]), 2)
+        with mock.patch("app.pagination.ListCursorPagination.page_size", 4):
+            self.assertEqual(len(self.client.get(self.url, {"page_size": "x"}).json()["results"]), 4)
+        self.assertEqual(self.client.get(self.url, {"cursor": "bogus"}).status_code, 404)
+
+    def test_legacy_list_responses(self):
+        with override_settings(LEGACY_LIST_RESPONSES=True):
+            # a plain list of every row unless the client asks for a page
+            self.assertEqual([row["id"] for row in self.client.get(self.url).json()], self.live)
+            self.assertEqual(len(self.client.get(self.url, {"page_size": 3}).json()["results"]), 3)
+        with override_settings(LEGACY_LIST_RESPONSES=False):
+            response = self.client.get(self.url).json()
+            self.assertEqual([row["id"] for row in response["results"]], self.live)
+            self.assertIsNone(response["next"])
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class AsyncLoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed(programmes=1, students=1, lecturers=1, courses=1, complaints_per_student=0, notifications_per_user=0)["student"]
+        cls.user.set_password(PASSWORD)
+        cls.user.save()
+
+    def login(self, password, method="post"):
+        # the view login/ serves when ASYNC_VIEWS is on
+        request = getattr(AsyncRequestFactory(), method)("/login/", json.dumps({"email": self.user.email, "password": password}), content_type="application/json")
+        return async_to_sync(async_views.login_async)(request)
+
+    def test_same_contract_as_login(self):
+        response = self.login(PASSWORD)
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.content)
+        self.assertEqual(body["user"], self.client.post("/login/", {"email": self.user.email, "password": PASSWORD}).json()["user"])
+        self.assertEqual(CachedStatelessJWTAuthentication().get_validated_token(body["access"])["user_id"], str(self.user.id))
+
+        self.assertEqual(self.login("wrong").status_code, 401)
+        self.assertEqual(self.login(PASSWORD, method="put").status_code, 405)
+
+
+class ComplaintSubmissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=1, students=2, lecturers=1, courses=1, complaints_per_student=2, notifications_per_user=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def submit(self, kind):
+        objects = self.objects
+        common = {"student": objects["student"].id, "academic_year": objects["academic_year"].id, "year_of_study": "1"}
+        if kind == "missing_marks":
+            data = {**common, "course": objects["course"].id, "category": "exam"}
+        else:
+            data = {**common, "subject": "Submitted", "details": "submitted"}
+        return self.client.post(f"/{kind}/{objects['student'].id}", data, content_type="application/json")
+
+    def test_failed_notification_leaves_no_complaint(self):
+        for kind, model in (("missing_marks", MissingMarksComplaint), ("registration_issues", RegistrationComplaint)):
+            with self.subTest(kind):
+                complaints, rollup = model.objects.count(), sum(ComplaintRollup.objects.values_list("count", flat=True))
+                with mock.patch.object(Notification.objects, "create", side_effect=DatabaseError("disk full")):
+                    with self.assertRaises(DatabaseError):
+                        self.submit(kind)
+                # the complaint and what its signals wrote went with the notification
+                self.assertEqual(model.objects.count(), complaints)
+                self.assertEqual(sum(ComplaintRollup.objects.values_list("count", flat=True)), rollup)
+
+                self.assertEqual(self.submit(kind).status_code, 201)
+                self.assertEqual(model.objects.count(), complaints + 1)
+
+    def test_new_registrar_gets_the_notifications(self):
+        registrar = self.objects["registrar"]
+        self.assertEqual(self.submit("registration_issues").status_code, 201)
+        self.assertEqual(Notification.objects.latest("id").reciever_id, registrar.id)
+        self.assertEqual(cache.get(REGISTRAR_KEY), registrar.id)
+
+        registrar.role = "user"
+        registrar.save()
+        self.assertIsNone(cache.get(REGISTRAR_KEY))
+        successor = User.objects.create(email="seed.registrar2@mak.ac.ug", username="seed.registrar2", role="registrar")
+
+        self.assertEqual(self.submit("registration_issues").status_code, 201)
+        self.assertEqual(Notification.objects.latest("id").reciever_id, successor.id)
+
+
+class StudentStatisticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=1, students=2, lecturers=1, courses=1, complaints_per_student=4, notifications_per_user=0)
+
+    def setUp(self):
+        cache.clear()
+        self.student = self.objects["student"]
+
+    def statistics(self):
+        response = self.client.get(f"/student_statistics/{self.student.id}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def counted(self):
+        complaints = CommonComplaintIssue.objects.filter(student=self.student)
+        return {
+            "total": complaints.count(),
+            "pending": complaints.filter(status="pending").count(),
+            "resolved": complaints.filter(status="resolved").count(),
+            "missing_marks": MissingMarksComplaint.objects.filter(student=self.student).count(),
+            "registration": RegistrationComplaint.objects.filter(student=self.student).count(),
+        }
+
+    def test_counts_served_from_the_cache(self):
+        counts = self.statistics()
+        self.assertEqual(counts, self.counted())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.statistics(), counts)
+
+    def test_complaint_writes_invalidate(self):
+        before = self.statistics()
+        complaint = MissingMarksComplaint.objects.create(
+            student=self.student, course=self.objects["course"], academic_year=self.objects["academic_year"],
+            year_of_study="1", category="exam",
+        )
+        after = self.statistics()
+        self.assertEqual(after, self.counted())
+        self.assertEqual((after["total"], after["pending"], after["missing_marks"]),
+                         (before["total"] + 1, before["pending"] + 1, before["missing_marks"] + 1))
+
+        complaint.status = "resolved"
+        complaint.save()
+        self.assertEqual(self.statistics(), self.counted())
+
+        registration = RegistrationComplaint.objects.filter(student=self.student, status="pending")
+        self.client.patch("/bulk_update_reg_complaints/", {"ids": list(registration.values_list("id", flat=True)), "status": "resolved"},
+                          content_type="application/json")
+        self.assertEqual(self.statistics(), self.counted())
+
+        RegistrationComplaint.objects.filter(student=self.student).first().delete()
+        complaint.delete()
+        self.assertEqual(self.statistics(), self.counted())
+
+
+class BulkImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=2, students=2, lecturers=2, courses=1, complaints_per_student=0, notifications_per_user=0)
+
+    def run_import(self, kind, text, chunk_size=2):
+        errors = []
+        importer = IMPORTS[kind](chunk_size=chunk_size, workers=1, on_error=lambda line, message: errors.append(line))
+        return importer.run(read_rows(io.BytesIO(text.encode()), f"{kind}.csv")), errors
+
+    def test_students(self):
+        result, errors = self.run_import("students", "\n".join([
+            "Email,First_Name,Programme,Registration_Number,Password",
+            "new.one@students.mak.ac.ug,One,seed programme 0,new/1,",
+            "new.two@cit.mak.ac.ug,Two,,new/2,Import#2024-pass",
+            # the same registration number as the row before, in the next chunk
+            "new.three@students.mak.ac.ug,Three,,new/2,",
+            "seed.student0@students.mak.ac.ug,Taken,,,",
+            "someone@gmail.com,Domain,,,",
+            "new.four@students.mak.ac.ug,Four,no such programme,,",
+            "new.five@students.mak.ac.ug,Five,,,1234",
+        ]))
+
+        self.assertEqual((result.rows, result.created, result.failed), (7, 2, 5))
+        self.assertEqual(errors, [4, 5, 6, 7, 8])
+        one = User.objects.get(email="new.one@students.mak.ac.ug")
+        self.assertEqual((one.role, one.programme, one.has_usable_password()), ("student", self.objects["programme"], False))
+        two = User.objects.get(email="new.two@cit.mak.ac.ug")
+        self.assertEqual(two.role, "lecturer")
+        self.assertTrue(two.check_password("Import#2024-pass"))
+
+    def test_courses(self):
+        lecturer = self.objects["lecturer"]
+        result, errors = self.run_import("courses", "\n".join([
+            "name,code,semester,programme,lecturer",
+            f"Imported course,IMP1,1,seed programme 0,{lecturer.email}",
+            f"Another course,IMP1,1,seed programme 0,{lecturer.email}",
+            f"Third course,IMP3,1,seed programme 0,{self.objects['student'].email}",
+            "Fourth course,IMP4,1,seed programme 0,",
+        ]))
+
+        self.assertEqual((result.created, result.failed), (1, 3))
+        self.assertCountEqual(errors, [3, 4, 5])
+        self.assertEqual(Course.objects.get(code="IMP1").lecturer, lecturer)
+
+    def test_admin_upload(self):
+        admin_user = User.objects.create_superuser(email="admin@mak.ac.ug", username="admin", password="Admin#2024-pass")
+        self.client.force_login(admin_user)
+        upload = SimpleUploadedFile("students.csv", b"email\nuploaded@students.mak.ac.ug\nbad\n")
+
+        response = self.client.post("/admin/app/user/import/", {"file": upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["result"].created, 1)
+        self.assertEqual(response.context["errors"], [(3, "Enter a valid email address.")])
+        self.assertTrue(User.objects.filter(email="uploaded@students.mak.ac.ug").exists())
+
+
+@override_settings(EXPORT_CHUNK_SIZE=3)
+class ComplaintExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=2, students=4, lecturers=2, courses=2, complaints_per_student=4, notifications_per_user=0)
+
+    def setUp(self):
+        self.headers = {"Authorization": f"Bearer {login_response(self.objects['registrar'])['access']}"}
+        self.client = self.client_class(headers=self.headers)
+
+    def export(self, query=""):
+        response = self.client.get(f"/export_complaints/{query}")
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_streams_every_complaint_of_the_programme(self):
+        programme = self.objects["programme"]
+        response, body = self.export(f"?programme={programme.id}")
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(body)))
+        expected = (
+            MissingMarksComplaint.objects.filter(student__programme=programme).count()
+            + RegistrationComplaint.objects.filter(student__programme=programme).count()
+        )
+        self.assertEqual(len(rows), expected)
+        self.assertEqual({row["programme"] for row in rows}, {programme.name})
+        self.assertEqual(list(rows[0]), COLUMNS)
+
+    def test_json_filters(self):
+        _, body = self.export("?format=json&type=registration&status=pending&from=2000-01-01&to=2999-12-31")
+
+        rows = json.loads(body)
+        self.assertEqual(len(rows), RegistrationComplaint.objects.filter(status="pending").count())
+        self.assertEqual({(row["type"], row["status"], row["course_code"]) for row in rows}, {("registration issues", "pending", None)})
+
+        _, body = self.export("?format=json&to=2000-01-01")
+        self.assertEqual(json.loads(body), [])
+
+    async def test_asgi_streams_an_async_iterator(self):
+        # a sync iterator would be read into a list first, with a warning
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            # the async client only sends headers given with the request
+            response = await self.async_client.get("/export_complaints/?format=json", headers=self.headers)
+            body = b"".join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual(len(json.loads(body)), await MissingMarksComplaint.objects.acount() + await RegistrationComplaint.objects.acount())
+
+    def test_needs_a_token(self):
+        for headers in ({}, {"Authorization": "Bearer invalid"}):
+            with self.subTest(headers), self.assertNumQueries(0):
+                response = self.client_class(headers=headers).get("/export_complaints/")
+                self.assertEqual(response.status_code, 401)
+                self.assertFalse(response.streaming)
+                self.assertEqual(response["WWW-Authenticate"], 'Bearer realm="api"')
+
+        user = self.objects["registrar"]
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get("/export_complaints/").status_code, 401)
+
+    def test_bad_parameters(self):
+        for query in ("?format=xml", "?type=other", "?from=2024-13-01", "?programme=abc", "?academic_year=2024/2025"):
+            with self.subTest(query):
+                self.assertEqual(self.client.get(f"/export_complaints/{query}").status_code, 400)
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command("export_complaints", "--type=missing_marks", stdout=output)
+
+        rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+        self.assertEqual(len(rows), MissingMarksComplaint.objects.count())
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=2, students=6, lecturers=2, courses=3, complaints_per_student=4, notifications_per_user=0)
+
+    def assertMatchesRebuild(self):
+        incremental = sorted((row.key, row.count, row.resolution_seconds) for row in ComplaintRollup.objects.exclude(count=0))
+        self.assertEqual(rollups.drift(), [])
+        rollups.rebuild()
+        self.assertEqual(incremental, sorted(ComplaintRollup.objects.values_list("key", "count", "resolution_seconds")))
+
+    def test_seeded_complaints_are_counted(self):
+        self.assertEqual(
+            sum(ComplaintRollup.objects.values_list("count", flat=True)),
+            MissingMarksComplaint.objects.count() + RegistrationComplaint.objects.count(),
+        )
+        self.assertMatchesRebuild()
+
+    def test_status_changes_move_counts(self):
+        registration = list(RegistrationComplaint.objects.filter(status="pending").values_list("id", flat=True))
+        marks = list(MissingMarksComplaint.objects.exclude(status="resolved").values_list("id", flat=True))
+
+        self.client.patch(f"/update_reg_complaint/{registration[0]}", {"status": "resolved"}, content_type="application/json")
+        self.client.patch(f"/update_marks_complaint/{marks[0]}", {"status": "in progress"}, content_type="application/json")
+        self.client.patch("/bulk_update_reg_complaints/", {"ids": registration, "status": "resolved"}, content_type="application/json")
+        self.client.patch("/bulk_update_marks_complaints/", {"ids": marks, "status": "resolved"}, content_type="application/json")
+        # saving an unchanged complaint moves nothing
+        MissingMarksComplaint.objects.get(id=marks[0]).save()
+
+        self.assertMatchesRebuild()
+
+    def test_group_field_changes_move_counts(self):
+        objects = self.objects
+        marks = MissingMarksComplaint.objects.filter(student=objects["student"]).first()
+        marks.academic_year = AcademicYear.objects.exclude(id=marks.academic_year_id).first()
+        marks.save()
+        marks.course = Course.objects.exclude(id=marks.course_id).first()
+        marks.category = "coursework" if marks.category != "coursework" else "exam"
+        marks.status = "resolved" if marks.status != "resolved" else "pending"
+        marks.save()
+
+        registration = RegistrationComplaint.objects.filter(student=objects["student"]).first()
+        registration.student = User.objects.filter(role="student").exclude(programme=objects["student"].programme_id).first()
+        registration.save()
+
+        self.assertMatchesRebuild()
+
+    def test_programmes_of_selected_students_are_not_read_again(self):
+        other = AcademicYear.objects.exclude(id=self.objects["academic_year"].id).first()
+        complaints = list(MissingMarksComplaint.objects.select_related("student").exclude(academic_year=other))
+        for complaint in complaints:
+            complaint.academic_year = other
+        with CaptureQueriesContext(connection) as captured:
+            rollups.record_changes(complaints, "pending", None)
+        self.assertEqual([query["sql"] for query in captured if User._meta.db_table in query["sql"]], [])
+
+        # the students of complaints loaded without them, in one query
+        complaint = MissingMarksComplaint.objects.exclude(academic_year=other).first()
+        complaint.academic_year = other
+        with CaptureQueriesContext(connection) as captured:
+            rollups.record_changes([complaint], complaint.status, complaint.resolved_at)
+        self.assertEqual(len([query for query in captured if User._meta.db_table in query["sql"]]), 1)
+
+    def test_resolving_again_keeps_resolution_time(self):
+        registration = list(RegistrationComplaint.objects.filter(status="resolved").values_list("id", flat=True))
+        marks = list(MissingMarksComplaint.objects.filter(status="resolved").values_list("id", flat=True))
+        self.assertTrue(registration and marks)
+        resolved_at = dict(CommonComplaintIssue.objects.filter(status="resolved").values_list("id", "resolved_at"))
+
+        self.client.patch(f"/update_reg_complaint/{registration[0]}", {"status": "resolved"}, content_type="application/json")
+        self.client.patch(f"/update_marks_complaint/{marks[0]}", {"status": "resolved"}, content_type="application/json")
+        self.client.patch("/bulk_update_reg_complaints/", {"ids": registration, "status": "resolved"}, content_type="application/json")
+        self.client.patch("/bulk_update_marks_complaints/", {"ids": marks, "status": "resolved"}, content_type="application/json")
+        MissingMarksComplaint.objects.get(id=marks[0]).save()
+
+        self.assertEqual(dict(CommonComplaintIssue.objects.filter(status="resolved").values_list("id", "resolved_at")), resolved_at)
+        self.assertMatchesRebuild()
+
+    def test_reopening_clears_resolution_time(self):
+        complaint = RegistrationComplaint.objects.filter(status="resolved").first()
+        self.client.patch(f"/update_reg_complaint/{complaint.id}", {"status": "in progress"}, content_type="application/json")
+        self.assertIsNone(RegistrationComplaint.objects.get(id=complaint.id).resolved_at)
+        self.assertMatchesRebuild()
+
+    def test_create_and_delete(self):
+        objects = self.objects
+        MissingMarksComplaint.objects.create(
+            student=objects["student"], course=objects["course"], academic_year=objects["academic_year"],
+            year_of_study="1", category="coursework",
+        )
+        RegistrationComplaint.objects.filter(student=objects["student"]).first().delete()
+        self.assertMatchesRebuild()
+
+    def test_command_fixes_drift(self):
+        ComplaintRollup.objects.filter(id=ComplaintRollup.objects.first().id).update(count=1000)
+        self.assertEqual(len(rollups.drift()), 1)
+
+        output = io.StringIO()
+        call_command("rebuild_rollups", stdout=output)
+        self.assertIn("1 had drifted", output.getvalue())
+        self.assertEqual(rollups.drift(), [])
+
+    def test_endpoint(self):
+        response = self.client.get("/complaint_analytics/?group_by=programme")
+        rows = response.json()
+        self.assertEqual(len(rows), 2)
+        for row in rows:
+            programme = row["programme"]
+            complaints = [
+                *MissingMarksComplaint.objects.filter(student__programme=programme).values_list("status", flat=True),
+                *RegistrationComplaint.objects.filter(student__programme=programme).values_list("status", flat=True),
+            ]
+            self.assertEqual(row["total"], len(complaints))
+            self.assertEqual(row["pending"], complaints.count("pending"))
+            self.assertEqual(row["resolution_rate"], round(complaints.count("resolved") / len(complaints), 4))
+
+        self.assertEqual(self.client.get("/complaint_analytics/?group_by=student").status_code, 400)
+        self.assertEqual(self.client.get("/complaint_analytics/?programme=x").status_code, 400)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=2, students=6, lecturers=2, courses=3, complaints_per_student=2, notifications_per_user=0)
+
+    def found(self, query, **params):
+        response = self.client.get("/search_complaints/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.json()["results"]]
+
+    def test_finds_every_searched_field(self):
+        student, course = self.objects["student"], self.objects["course"]
+        registration = RegistrationComplaint.objects.create(
+            student=student, academic_year=self.objects["academic_year"], year_of_study="1",
+            subject="Timetable clash", details="Two papers scheduled on the same afternoon",
+        )
+        marks = MissingMarksComplaint.objects.filter(course=course).first()
+
+        self.assertEqual(self.found("timetable"), [registration.id])
+        self.assertEqual(self.found("afternoon same"), [registration.id])
+        # words written together are matched together
+        self.assertEqual(self.found("same-afternoon"), [registration.id])
+        self.assertEqual(self.found("afternoon-same"), [])
+        self.assertEqual(self.found("timet*"), [registration.id])
+        self.assertEqual(self.found("timet"), [])
+        self.assertIn(marks.id, self.found(course.code))
+        self.assertIn(marks.id, self.found(course.name))
+        mine = set(student.commoncomplaintissue_set.values_list("id", flat=True))
+        self.assertEqual(set(self.found(student.email)), mine)
+        self.assertEqual(set(self.found(student.registration_number)) & mine, mine)
+        self.assertEqual(self.found("timetable", type="missing_marks"), [])
+
+    def test_ranked_and_paginated(self):
+        student = self.objects["student"]
+        for subject, details in (("other", "exam exam"), ("exam results", "missing"), ("other", "exam")):
+            RegistrationComplaint.objects.create(student=student, year_of_study="1", subject=subject, details=details)
+        # the word in the subject outranks the word in the details
+        self.assertEqual(RegistrationComplaint.objects.get(id=self.found("exam")[0]).subject, "exam results")
+
+        response = self.client.get("/search_complaints/", {"q": "exam", "page_size": 2}).json()
+        self.assertEqual(len(response["results"]), 2)
+        second = self.client.get(response["next"]).json()
+        self.assertEqual(len(second["results"]), 1)
+        self.assertIsNone(second["next"])
+        self.assertIsNotNone(second["previous"])
+
+        # only the newest matches are ranked
+        with override_settings(SEARCH_RANK_WINDOW=2):
+            self.assertEqual(len(self.found("exam")), 2)
+
+    def test_index_follows_changes(self):
+        student, course = self.objects["student"], self.objects["course"]
+        complaint = RegistrationComplaint.objects.filter(student=student).first()
+        complaint.subject = "Renamed subject"
+        complaint.save()
+        self.assertEqual(self.found("renamed"), [complaint.id])
+
+        course = Course.objects.get(id=course.id)
+        course.code = "XYZ9"
+        course.save()
+        self.assertEqual(set(self.found("xyz9")), set(MissingMarksComplaint.objects.filter(course=course).values_list("id", flat=True)))
+
+        student = User.objects.get(id=student.id)
+        student.email = "renamed.student@students.mak.ac.ug"
+        student.save()
+        self.assertEqual(set(self.found("renamed.student")), set(student.commoncomplaintissue_set.values_list("id", flat=True)))
+
+        complaint.delete()
+        self.assertEqual(self.found("renamed subject"), [])
+
+    def test_status_change_leaves_the_index_alone(self):
+        complaint = RegistrationComplaint.objects.first()
+        with CaptureQueriesContext(connection) as captured:
+            self.client.patch(f"/update_reg_complaint/{complaint.id}", {"status": "resolved"}, content_type="application/json")
+        self.assertFalse([query for query in captured if search.TABLE in query["sql"]])
+
+    def test_other_databases_scan_complaints(self):
+        student = self.objects["student"]
+        with mock.patch.object(connections["default"], "vendor", "microsoft"):
+            with CaptureQueriesContext(connection) as captured:
+                complaint = RegistrationComplaint.objects.create(
+                    student=student, year_of_study="1", subject="Timetable clash", details="Two papers",
+                )
+                self.assertEqual(search.rebuild(), 0)
+            self.assertFalse([query for query in captured if search.TABLE in query["sql"]])
+
+            self.assertEqual(self.found("timetable papers"), [complaint.id])
+            self.assertEqual(self.found("timetable", type="missing_marks"), [])
+            mine = set(student.commoncomplaintissue_set.values_list("id", flat=True))
+            self.assertEqual(set(self.found(student.email, page_size=100)), mine)
+
+    def test_rebuild_and_bad_parameters(self):
+        self.assertEqual(search.rebuild(), MissingMarksComplaint.objects.count() + RegistrationComplaint.objects.count())
+        self.assertEqual(len(self.found("seed", page_size=100)), search.rebuild())
+        self.assertEqual(self.found("  ,  "), [])
+        for params in ({"type": "other"}, {"page": "0"}, {"page_size": "x"}):
+            with self.subTest(params):
+                self.assertEqual(self.client.get("/search_complaints/", {"q": "seed", **params}).status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=2, students=6, lecturers=2, courses=3, complaints_per_student=4, notifications_per_user=4)
+        # the seeded complaints of 2022/2023 are all resolved, those of 2020/2021 all pending
+        cls.closing = ["2020/2021", "2022/2023"]
+
+    def archive(self, *args):
+        output = io.StringIO()
+        call_command("archive", *(f"--close={title}" for title in self.closing), "--batch-size=3", *args, stdout=output)
+        return output.getvalue()
+
+    def pages(self, url, **params):
+        """Every row of a list, following its next links."""
+        rows, response = [], self.client.get(url, {"page_size": 3, **params}).json()
+        rows += response["results"]
+        while response["next"]:
+            response = self.client.get(response["next"]).json()
+            rows += response["results"]
+        return rows
+
+    def test_moves_resolved_complaints_and_viewed_notifications(self):
+        student = self.objects["student"]
+        statistics = self.client.get(f"/student_statistics/{student.id}").json()
+        resolved = set(CommonComplaintIssue.objects.filter(academic_year__title__in=self.closing, status="resolved").values_list("id", flat=True))
+        viewed = set(Notification.objects.filter(is_viewed=True).values_list("id", flat=True))
+        self.assertTrue(resolved)
+
+        self.assertIn(f"{len(resolved)} complaints to archive", self.archive("--dry-run"))
+        self.assertFalse(AcademicYear.objects.filter(closed__isnull=False).exists())
+        self.assertIn(f"{len(resolved)} complaints and {len(viewed)} notifications archived", self.archive())
+
+        self.assertEqual(set(ArchivedComplaint.objects.values_list("id", flat=True)), resolved)
+        self.assertFalse(CommonComplaintIssue.objects.filter(id__in=resolved).exists())
+        self.assertTrue(CommonComplaintIssue.objects.filter(academic_year__title="2020/2021").exists())
+        self.assertEqual(set(ArchivedNotification.objects.values_list("id", flat=True)), viewed)
+        self.assertFalse(Notification.objects.filter(is_viewed=True).exists())
+
+        # still counted on the dashboards, gone from the search
+        cache.clear()
+        self.assertEqual(self.client.get(f"/student_statistics/{student.id}").json(), statistics)
+        self.assertEqual(rollups.drift(), [])
+        self.assertFalse(set(search.search("seed", limit=100)) & resolved)
+        # a second run finds nothing left
+        self.assertIn("0 complaints and 0 notifications archived", self.archive())
+
+    def test_batches_over_the_parameter_limit(self):
+        resolved = set(CommonComplaintIssue.objects.filter(academic_year__title__in=self.closing, status="resolved").values_list("id", flat=True))
+        viewed = set(Notification.objects.filter(is_viewed=True).values_list("id", flat=True))
+        limit = 4
+        self.assertGreater(min(len(resolved), len(viewed)), limit)
+
+        with mock.patch.object(connection.features, "max_query_params", limit), CaptureQueriesContext(connection) as captured:
+            output = self.archive("--batch-size=100")
+        self.assertIn(f"{len(resolved)} complaints and {len(viewed)} notifications archived", output)
+        self.assertEqual(set(ArchivedComplaint.objects.values_list("id", flat=True)), resolved)
+        self.assertEqual(set(ArchivedNotification.objects.values_list("id", flat=True)), viewed)
+        self.assertEqual(rollups.drift(), [])
+
+        deletes = [query["sql"] for query in captured if query["sql"].startswith("DELETE")]
+        self.assertTrue(deletes)
+        for sql in deletes:
+            self.assertLessEqual(sql.split(" IN ", 1)[-1].count(","), limit - 1, sql)
+
+    def test_lists_include_archived_on_request(self):
+        student = self.objects["student"]
+        everything = set(student.commoncomplaintissue_set.values_list("id", flat=True))
+        self.archive()
+        archived = set(ArchivedComplaint.objects.filter(student=student).values_list("id", flat=True))
+        self.assertTrue(archived)
+
+        url = f"/sent_complaints/{student.id}"
+        self.assertEqual({row["id"] for row in self.pages(url)}, everything - archived)
+        self.assertEqual({row["id"] for row in self.pages(url, archived="only")}, archived)
+        rows = self.pages(url, archived="include")
+        self.assertEqual([row["id"] for row in rows], sorted({row["id"] for row in rows}, reverse=True))
+        self.assertEqual({row["id"] for row in rows}, everything)
+        self.assertEqual({row["type"] for row in rows if "archived" in row}, {"missing marks complaint"})
+
+        # back from the last page
+        response = self.client.get(url, {"page_size": 3, "archived": "include"}).json()
+        second = self.client.get(response["next"]).json()
+        self.assertEqual(self.client.get(second["previous"]).json()["results"], response["results"])
+
+        notifications = self.pages(f"/notifications/{student.id}", archived="include")
+        self.assertEqual(len(notifications), 4)
+        self.assertEqual(len([row for row in notifications if "archived" in row]), 2)
+
+        # archived rows have the live rows' fields
+        marks = MissingMarksComplaint.objects.filter(student=student).first()
+        live = self.client.get(f"/missing_marks/{student.id}", {"page_size": 10}).json()["results"][0]
+        for url in (f"/missing_marks/{student.id}", f"/marks_complaints/{marks.course_id}"):
+            with self.subTest(url):
+                rows = [row for row in self.pages(url, archived="include") if "archived" in row]
+                self.assertTrue(rows)
+                self.assertEqual(set(rows[0]) - {"archived"}, set(live))
+        # the second student's archived complaint is a registration one
+        other = User.objects.get(email="seed.student1@students.mak.ac.ug")
+        for url in (f"/registration_issues/{other.id}", f"/reg_complaints/{other.programme_id}"):
+            with self.subTest(url):
+                self.assertTrue([row for row in self.pages(url, archived="only") if "subject" in row])
+
+        self.assertEqual(self.client.get(url, {"archived": "all"}).status_code, 400)
+
+    def test_export_and_legacy_lists(self):
+        total = MissingMarksComplaint.objects.count() + RegistrationComplaint.objects.count()
+        self.archive()
+        archived = ArchivedComplaint.objects.count()
+
+        headers = {"Authorization": f"Bearer {login_response(self.objects['registrar'])['access']}"}
+        for query, expected in (("", total - archived), ("&archived=include", total), ("&archived=only", archived)):
+            with self.subTest(query):
+                response = self.client.get(f"/export_complaints/?format=json{query}", headers=headers)
+                self.assertEqual(len(json.loads(b"".join(response.streaming_content))), expected)
+        self.assertEqual(self.client.get("/export_complaints/?archived=all", headers=headers).status_code, 400)
+
+        # a plain list for clients that ask for no page
+        student = self.objects["student"]
+        rows = self.client.get(f"/sent_complaints/{student.id}", {"archived": "include"}).json()
+        self.assertEqual(len(rows), 4)
+
+    def test_batch_skips_complaints_reopened_meanwhile(self):
+        year = AcademicYear.objects.get(title="2022/2023")
+        archiving.close_year(year)
+        ids = list(archiving.complaints_to_archive().values_list("id", flat=True)[:3])
+        RegistrationComplaint.objects.filter(id__in=ids).update(status="pending")
+
+        moved = archiving.archive_complaints(ids)
+
+        reopened = set(RegistrationComplaint.objects.filter(id__in=ids).values_list("id", flat=True))
+        self.assertEqual(moved, len(ids) - len(reopened))
+        self.assertEqual(set(CommonComplaintIssue.objects.filter(id__in=ids).values_list("id", flat=True)), reopened)
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_BACKOFF=60)
+class MailOutboxTests(TestCase):
+    """The test runner swaps SMTP for the locmem backend, sent mail lands in mail.outbox."""
+
+    def setUp(self):
+        self.email = queue_mail("Reset your password", "follow the link", ["someone@students.mak.ac.ug"])
+
+    def test_delivers_and_claims_before_sending(self):
+        statuses = []
+        send = locmem.EmailBackend.send_messages
+
+        def recording_send(backend, messages):
+            # claimed in a transaction of its own before SMTP is talked to
+            statuses.append(OutboundEmail.objects.get(id=self.email.id).status)
+            return send(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", recording_send):
+            self.assertEqual(send_queued_batch(), (1, 0))
+
+        self.assertEqual(statuses, [OutboundEmail.SENDING])
+        self.assertEqual([(message.subject, message.to) for message in mail.outbox], [("Reset your password", ["someone@students.mak.ac.ug"])])
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.SENT, 1))
+        self.assertIsNotNone(self.email.sent_at)
+        self.assertEqual(send_queued_batch(), (0, 0))
+
+    def test_retries_with_backoff_then_dead_letters(self):
+        with mock.patch.object(locmem.EmailBackend, "send_messages", side_effect=SMTPException("mailbox unavailable")):
+            for attempt, backoff in ((1, 60), (2, 120)):
+                started = timezone.now()
+                self.assertEqual(send_queued_batch(), (0, 1))
+                self.email.refresh_from_db()
+                self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.PENDING, attempt))
+                self.assertEqual(self.email.last_error, "mailbox unavailable")
+                self.assertGreaterEqual(self.email.next_attempt_at, started + timedelta(seconds=backoff))
+                # not due again before its backoff ran out
+                self.assertEqual(send_queued_batch(), (0, 0))
+                OutboundEmail.objects.filter(id=self.email.id).update(next_attempt_at=timezone.now())
+
+            self.assertEqual(send_queued_batch(), (0, 1))
+
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.DEAD, 3))
+        self.assertEqual(send_queued_batch(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_unreachable_server_and_expired_lease(self):
+        with mock.patch.object(locmem.EmailBackend, "open", side_effect=ConnectionRefusedError("refused")):
+            self.assertEqual(send_queued_batch(), (0, 1))
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.PENDING, 1))
+
+        # a worker that died after claiming leaves the email sending until its lease runs out
+        OutboundEmail.objects.filter(id=self.email.id).update(status=OutboundEmail.SENDING, next_attempt_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(send_queued_batch(), (0, 0))
+        OutboundEmail.objects.filter(id=self.email.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_batch(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_crashed_sends_count_as_attempts(self):
+        for attempt in (1, 2):
+            # a worker claims the email and dies before recording anything
+            claim_batch(10, timezone.now())
+            self.email.refresh_from_db()
+            self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.SENDING, attempt))
+            OutboundEmail.objects.filter(id=self.email.id).update(next_attempt_at=timezone.now())
+
+        self.assertEqual(send_queued_batch(), (0, 0))
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.status, OutboundEmail.DEAD)
+        self.assertEqual(mail.outbox, [])
+
+    def test_results_only_recorded_under_the_lease(self):
+        send = locmem.EmailBackend.send_messages
+
+        def slow_send(backend, messages):
+            # the lease ran out mid-send and another worker claimed the email
+            OutboundEmail.objects.filter(id=self.email.id).update(
+                attempts=F("attempts") + 1, next_attempt_at=timezone.now() + timedelta(hours=1)
+            )
+            return send(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", slow_send):
+            self.assertEqual(send_queued_batch(), (1, 0))
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts, self.email.sent_at), (OutboundEmail.SENDING, 2, None))
+
+    @override_settings(OUTBOX_LEASE=0)
+    def test_nothing_sent_once_the_lease_ran_out(self):
+        self.assertEqual(send_queued_batch(), (0, 0))
+        self.email.refresh_from_db()
+        # handed back without counting an attempt that never happened
+        self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.PENDING, 0))
+        self.assertEqual(mail.outbox, [])
+
+
+class SentComplaintsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=1, students=2, lecturers=1, courses=1, complaints_per_student=4, notifications_per_user=0)
+
+    async def async_get(self, view, url, *args):
+        # the async views are only routed with ASYNC_VIEWS, call them directly
+        return await view(AsyncRequestFactory().get(url), *args)
+
+    def test_filters(self):
+        student, year = self.objects["student"], self.objects["academic_year"]
+        url = f"/sent_complaints/{student.id}"
+        rows = self.client.get(url, {"academic_year": year.id}).json()
+        self.assertEqual({row["id"] for row in rows}, set(student.commoncomplaintissue_set.filter(academic_year=year).values_list("id", flat=True)))
+
+        for params in ({"academic_year": "abc"}, {"academic_year": "abc", "archived": "include"}):
+            with self.subTest(params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "academic_year must be a number"})
+
+        response = async_to_sync(self.async_get)(async_views.sent_complaints, f"{url}?academic_year=abc", str(student.id))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {"error": "academic_year must be a number"})
+
+
+class NotificationSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=1, students=2, lecturers=1, courses=1, complaints_per_student=0, notifications_per_user=4)
+
+    def sync(self, since=None, **headers):
+        return self.client.get(f"/notifications_sync/{self.objects['student'].id}", {"since": since} if since else {}, **headers)
+
+    def synced(self, since=None):
+        """The ids of every notification handed out after since, following
+        partial responses, and the last watermark."""
+        ids, more = [], True
+        while more:
+            response = self.sync(since).json()
+            ids += [row["id"] for row in response["notifications"]]
+            since, more = response["watermark"], response["more"]
+        return ids, since
+
+    def test_not_modified_and_deltas(self):
+        student = self.objects["student"]
+        response = self.sync()
+        self.assertEqual(len(response.json()["notifications"]), 4)
+        self.assertEqual(response.json()["unread"], 2)
+        watermark, etag = response.json()["watermark"], response["ETag"]
+        self.assertEqual(self.sync(watermark, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # marking viewed is a change
+        unread = set(Notification.objects.filter(reciever=student, is_viewed=False).values_list("id", flat=True))
+        self.client.get(f"/view_notifications/{student.id}")
+        response = self.sync(watermark, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row["id"] for row in response.json()["notifications"]}, unread)
+        self.assertEqual(response.json()["unread"], 0)
+
+        new = Notification.objects.create(severity="info", body="new", reciever=student)
+        ids, watermark = self.synced(response.json()["watermark"])
+        self.assertEqual(ids, [new.id])
+        self.assertEqual(self.synced(watermark), ([], watermark))
+
+    @override_settings(PAGINATION_MAX_PAGE_SIZE=3)
+    def test_truncated_responses_lose_nothing(self):
+        student = self.objects["student"]
+        Notification.objects.bulk_create([Notification(severity="info", body=f"more {i}", reciever=student) for i in range(4)])
+        response = self.sync()
+        self.assertTrue(response.json()["more"])
+        self.assertNotIn("ETag", response)
+
+        ids, watermark = self.synced()
+        self.assertEqual(sorted(ids), sorted(Notification.objects.filter(reciever=student).values_list("id", flat=True)))
+        # one UPDATE gives every row it marks the same change time
+        unread = set(Notification.objects.filter(reciever=student, is_viewed=False).values_list("id", flat=True))
+        self.assertGreater(len(unread), 3)
+        self.client.get(f"/view_notifications/{student.id}")
+        ids, _ = self.synced(watermark)
+        self.assertEqual(sorted(ids), sorted(unread))
+
+    def test_unknown_user_and_bad_watermark(self):
+        for pk in (10**9, "abc"):
+            with self.subTest(pk):
+                self.assertEqual(self.client.get(f"/notifications_sync/{pk}").status_code, 404)
+        for since in ("yesterday", "2024-01-01T00:00:00|x"):
+            with self.subTest(since):
+                self.assertEqual(self.sync(since).status_code, 400)
+
+
+class NotificationStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        objects = seed(programmes=1, students=2, lecturers=1, courses=1, complaints_per_student=0, notifications_per_user=0)
+        cls.student, cls.lecturer = objects["student"], objects["lecturer"]
+
+    def setUp(self):
+        cache.clear()
+
+    def open(self, pk, user=None):
+        headers = {"Authorization": f"Bearer {login_response(user)['access']}"} if user else {}
+        request = AsyncRequestFactory().get(f"/notifications_stream/{pk}", headers=headers)
+        return async_to_sync(async_views.notifications_stream)(request, str(pk))
+
+    def test_needs_the_token_of_the_streamed_user(self):
+        self.assertEqual(self.open(self.student.id).status_code, 401)
+        self.assertEqual(self.open(self.student.id, self.lecturer).status_code, 403)
+        response = self.open(self.student.id, self.student)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+    def test_saved_notification_reaches_the_stream(self):
+        response = self.open(self.student.id, self.student)
+
+        def notify(receiver, body):
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(severity="info", body=body, reciever=receiver)
+
+        async def read():
+            events = aiter(response.streaming_content)
+            self.assertEqual(await anext(events), b"retry: 5000\n\n")
+            # the other user's notification is not for this stream
+            await sync_to_async(notify)(self.lecturer, "for the lecturer")
+            await sync_to_async(notify)(self.student, "for the student")
+            event = await asyncio.wait_for(anext(events), 5)
+            await events.aclose()
+            return event
+
+        event = async_to_sync(read)().decode()
+        self.assertTrue(event.startswith("event: notification\ndata: "))
+        self.assertEqual(json.loads(event.split("data: ", 1)[1])["body"], "for the student")
+        self.assertEqual(broker.get_broker().subscriber_count(), 0)
+
+
+class BulkStatusUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=1, students=4, lecturers=1, courses=1, complaints_per_student=2, notifications_per_user=0)
+
+    def update(self, data, kind="reg"):
+        return self.client.patch(f"/bulk_update_{kind}_complaints/", data, content_type="application/json")
+
+    def test_per_id_results(self):
+        pending = list(RegistrationComplaint.objects.filter(status="pending").values_list("id", flat=True))
+        resolved = list(RegistrationComplaint.objects.filter(status="resolved").values_list("id", flat=True))
+        marks = MissingMarksComplaint.objects.first()
+        self.assertTrue(pending and resolved)
+        updated = {complaint_id: RegistrationComplaint.objects.get(id=complaint_id).updated for complaint_id in resolved}
+
+        response = self.update({"ids": [*pending, *resolved, str(marks.id), "x", None], "status": "resolved"})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["results"], [
+            *({"id": complaint_id, "result": "updated"} for complaint_id in pending),
+            *({"id": complaint_id, "result": "unchanged"} for complaint_id in resolved),
+            {"id": str(marks.id), "result": "not found"},
+            {"id": "x", "result": "invalid"},
+            {"id": None, "result": "invalid"},
+        ])
+        self.assertFalse(RegistrationComplaint.objects.filter(id__in=pending).exclude(status="resolved").exists())
+        # the complaints already resolved were neither written nor notified again
+        self.assertEqual({c.id: c.updated for c in RegistrationComplaint.objects.filter(id__in=resolved)}, updated)
+        self.assertEqual(Notification.objects.count(), len(pending))
+        self.assertEqual(rollups.drift(), [])
+
+    def test_invalid_input(self):
+        complaint = RegistrationComplaint.objects.first()
+        for data in ({"ids": [complaint.id], "status": "banana"}, {"ids": complaint.id, "status": "resolved"}, {"ids": [complaint.id]}):
+            for kind in ("reg", "marks"):
+                with self.subTest(data=data, kind=kind):
+                    self.assertEqual(self.update(data, kind).status_code, 400)
+        self.assertFalse(CommonComplaintIssue.objects.filter(status="banana").exists())
+        self.assertFalse(ComplaintRollup.objects.filter(status="banana").exists())
+        self.assertFalse(Notification.objects.exists())
+
+
+class ReferenceCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.objects = seed(programmes=2, students=2, lecturers=2, courses=2, complaints_per_student=0, notifications_per_user=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        return ["/programmes/", "/lecturers/", f"/courses/{self.objects['lecturer'].id}", f"/all_courses/{self.objects['programme'].id}"]
+
+    def cached(self):
+        """The lists still served from the cache, without a query."""
+        cached = []
+        for url in self.urls():
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(url)
+            if not captured:
+                cached.append(url)
+        return cached
+
+    def test_conditional_get(self):
+        response = self.client.get("/programmes/")
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/programmes/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+            # Last-Modified only has whole seconds, a change within the same second would go unnoticed
+            self.assertEqual(self.client.get("/programmes/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 200)
+            cached = self.client.get("/programmes/")
+        self.assertEqual((cached.status_code, cached.content), (200, response.content))
+        self.assertEqual(self.client.get("/programmes/", HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+        version = reference_cache.get_version("programmes")
+        Programme.objects.create(name="new programme")
+        self.assertGreaterEqual(parse_http_date(response["Last-Modified"]) * 1000, version)
+        response = self.client.get("/programmes/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("new programme", {row["name"] for row in response.json()})
+
+    def test_only_lecturer_changes_invalidate(self):
+        self.cached()
+        student = User.objects.get(id=self.objects["student"].id)
+        student.first_name = "Renamed"
+        student.save()
+        self.assertEqual(self.cached(), self.urls())
+
+        lecturer = User.objects.get(id=self.objects["lecturer"].id)
+        lecturer.email = "renamed.lecturer@cit.mak.ac.ug"
+        lecturer.save()
+        self.assertEqual(self.cached(), ["/programmes/"])
+        self.assertIn("renamed.lecturer@cit.mak.ac.ug", {row["email"] for row in self.client.get("/lecturers/").json()})
+
+        # a lecturer who stops being one leaves the directory
+        lecturer.role = "student"
+        lecturer.save()
+        self.assertNotIn(lecturer.id, {row["id"] for row in self.client.get("/lecturers/").json()})
+
+    def test_stats_command_needs_a_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, "REDIS_URL"):
+            call_command("reference_cache_stats")
+
+
+@override_settings(AUTH_STATE_CACHE_TIMEOUT=60)
+class TokenRevocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed(programmes=1, students=1, lecturers=1, courses=1, complaints_per_student=0, notifications_per_user=0)["student"]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(id=self.user.id)
+        self.token = login_response(self.user)["access"]
+
+    def authenticate(self, after=0):
+        """Authenticate the token, after seconds have passed for the cache."""
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        # the local-memory cache expires entries by time.time()
+        with mock.patch("time.time", return_value=time.time() + after):
+            return CachedStatelessJWTAuthentication().authenticate(request)
+
+    def test_normal_path_reads_no_rows(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        # the user is built from the token's claims
+        self.assertEqual(user.id, str(self.user.id))
+        self.assertEqual(self.client.get("/metrics/", HTTP_AUTHORIZATION=f"Bearer {self.token}").status_code, 200)
+
+    def assertRevoked(self, change):
+        self.authenticate()
+        change()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        response = self.client.get(f"/student_statistics/{self.user.id}", HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        self.assertEqual(response.status_code, 401)
+        with self.assertRaises(AuthenticationFailed):
+            async_to_sync(CachedStatelessJWTAuthentication().aauthenticate)(
+                RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {self.token}")
+            )
+
+    def assertRevokedWithinTimeout(self, update):
+        # a write that skips the User signals waits for the cached state to expire
+        self.authenticate()
+        User.objects.filter(id=self.user.id).update(**update)
+        self.authenticate(after=59)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(after=61)
+
+    def test_password_change(self):
+        def change_password():
+            self.user.set_password("An0ther#Passw0rd")
+            self.user.save()
+        self.assertRevoked(change_password)
+
+    def test_password_change_elsewhere(self):
+        self.assertRevokedWithinTimeout({"password": "changed elsewhere"})
+
+    def test_deactivation(self):
+        def deactivate():
+            self.user.is_active = False
+            self.user.save()
+        self.assertRevoked(deactivate)
+
+    def test_deactivation_elsewhere(self):
+        self.assertRevokedWithinTimeout({"is_active": False})
+
+
+@override_settings(MIDDLEWARE=["app.metrics.MetricsMiddleware", *(m for m in settings.MIDDLEWARE if m != "app.metrics.MetricsMiddleware")])
+class MetricsTests(TestCase):
+    route = "student_statistics/<str:pk>"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = seed(programmes=1, students=1, lecturers=1, courses=1, complaints_per_student=3, notifications_per_user=0)["student"]
+        cls.token = login_response(cls.student)["access"]
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+
+    def get_statistics(self):
+        return self.client.get(f"/student_statistics/{self.student.id}", HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+    def scrape(self):
+        response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 200)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                samples[name] = float(value)
+        return samples
+
+    def sample(self, samples, name, **labels):
+        labels = "".join(f',{label}="{value}"' for label, value in labels.items())
+        return samples[f'{name}{{route="{self.route}",method="GET"{labels}}}']
+
+    def test_requests_are_recorded_per_route(self):
+        # a miss counts the complaints, the next request is served from the cache
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.get_statistics().status_code, 200)
+        queries = len(captured)
+        cached = self.get_statistics()
+
+        samples = self.scrape()
+        self.assertEqual(self.sample(samples, "cms_http_requests_total", status=200), 2)
+        self.assertEqual(self.sample(samples, "cms_db_queries_total"), queries)
+        # the auth state and the statistics, missed once and then hit
+        self.assertEqual(self.sample(samples, "cms_cache_misses_total"), 2)
+        self.assertEqual(self.sample(samples, "cms_cache_hits_total"), 2)
+        self.assertEqual(self.sample(samples, "cms_http_response_bytes_total"), 2 * len(cached.content))
+        self.assertEqual(self.sample(samples, "cms_http_request_duration_seconds_bucket", le="+Inf"), 2)
+        self.assertEqual(self.sample(samples, "cms_http_request_duration_seconds_count"), 2)
+
+    def test_duration_buckets_are_cumulative(self):
+        for duration in (0.003, 0.03, 0.03, 30):
+            metrics.registry.observe(self.route, "GET", 200, duration, metrics.RequestStats(), 0)
+
+        samples = self.scrape()
+        buckets = {bound: self.sample(samples, "cms_http_request_duration_seconds_bucket", le=bound) for bound in ("0.005", "0.025", "0.05", "10", "+Inf")}
+        self.assertEqual(buckets, {"0.005": 1, "0.025": 1, "0.05": 3, "10": 3, "+Inf": 4})
+        self.assertAlmostEqual(self.sample(samples, "cms_http_request_duration_seconds_sum"), 30.063)
+
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with override_settings(SLOW_REQUEST_THRESHOLD_MS=0), self.assertLogs("app.performance", "WARNING") as logs:
+            self.get_statistics()
+        [message] = logs.output
+        self.assertIn(f"slow request GET /student_statistics/{self.student.id} ({self.route})", message)
+        self.assertIn("SELECT", message)
+
+        with self.assertNoLogs("app.performance"):
+            self.get_statistics()
+
+    def test_only_allowed_addresses_can_scrape(self):
+        self.assertEqual(self.client.get("/metrics/", REMOTE_ADDR="203.0.113.7").status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=["203.0.113.7"]):
+            self.assertEqual(self.client.get("/metrics/", REMOTE_ADDR="203.0.113.7").status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=["test_replica"], REPLICA_PIN_SECONDS=10)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routing between the primary and test_replica, the replica
+    app.runner.TestRunner adds. Transactional, the replica connection only
+    sees committed rows."""
+
+    databases = {"default", "test_replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.objects = seed(programmes=1, students=2, lecturers=1, courses=1, complaints_per_student=0, notifications_per_user=1)
+        self.token = login_response(self.objects["student"])["access"]
+
+    def request(self, method, url, data=None, token=None):
+        """The response and the queries it ran on the primary and on the replica."""
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        kwargs = {"content_type": "application/json"} if data is not None else {}
+        with CaptureQueriesContext(connections["default"]) as primary, CaptureQueriesContext(connections["test_replica"]) as replica:
+            response = getattr(self.client, method)(url, data, **kwargs, **headers)
+        return response, [query["sql"] for query in primary], [query["sql"] for query in replica]
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        response, primary, replica = self.request("get", "/programmes/")
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual((len(primary), len(replica)), (0, 1))
+
+        response, primary, replica = self.request("post", "/programmes/", {"name": "new programme"})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue([sql for sql in primary if sql.startswith("INSERT")])
+        # the unique name check before the write reads the replica
+        self.assertEqual([sql.split()[0] for sql in replica], ["SELECT"])
+        # outside a request, like a management command, everything is on the primary
+        with CaptureQueriesContext(connections["test_replica"]) as replica:
+            self.assertEqual(Programme.objects.count(), 2)
+        self.assertEqual(len(replica), 0)
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        def view(request):
+            programmes = [Programme.objects.count()]
+            Programme.objects.create(name="written")
+            programmes.append(Programme.objects.count())
+            return JsonResponse({"programmes": programmes})
+
+        request = RequestFactory().get("/")
+        with CaptureQueriesContext(connections["default"]) as primary, CaptureQueriesContext(connections["test_replica"]) as replica:
+            response = ReplicaRoutingMiddleware(view)(request)
+        self.assertEqual(json.loads(response.content), {"programmes": [1, 2]})
+        self.assertEqual(len(replica), 1)
+        self.assertEqual([query["sql"].split()[0] for query in primary], ["INSERT", "SELECT"])
+
+    def test_writers_are_pinned_to_the_primary(self):
+        student = self.objects["student"]
+        url = f"/notifications/{student.id}"
+        response, primary, replica = self.request("post", url, {"severity": "info", "body": "hello", "reciever": student.id}, self.token)
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse([sql for sql in replica if not sql.startswith("SELECT")])
+
+        # the writer reads its own write from the primary for REPLICA_PIN_SECONDS
+        response, primary, replica = self.request("get", url, token=self.token)
+        self.assertIn("hello", {row["body"] for row in response.json()})
+        self.assertEqual((bool(primary), replica), (True, []))
+        # everyone else still reads the replica
+        _, primary, replica = self.request("get", url)
+        self.assertEqual((primary, bool(replica)), ([], True))
+
+        cache.delete(pin_key(student.id))
+        _, primary, replica = self.request("get", url, token=self.token)
+        self.assertEqual((primary, bool(replica)), ([], True))
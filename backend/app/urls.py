@@ -1,27 +1,43 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views, metrics, exports
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+
+def view(sync_view, async_view):
+    # ASYNC_VIEWS swaps in the async view on the same route
+    return async_view if settings.ASYNC_VIEWS else sync_view
+
+
 urlpatterns = [
     path('token/', views.CustomTokenObtainPairView.as_view()),
     path('token/refresh', TokenRefreshView.as_view()),
     path('signup/', views.sign_up),
-    path('login/', views.login),
+    path('login/', view(views.login, async_views.login_async)),
     path('update_profile/<str:pk>', views.update_profile),
     path('courses/<str:pk>', views.courses),
     path('all_courses/<str:pk>', views.all_courses),
-    path('programmes/', views.programmes),
+    path('programmes/', view(views.programmes, async_views.programmes)),
     path('lecturers/', views.lecturers),
-    path('student_statistics/<str:pk>', views.student_statistics),
-    path('notifications/<str:pk>', views.notifications),
+    path('student_statistics/<str:pk>', view(views.student_statistics, async_views.student_statistics)),
+    path('notifications/<str:pk>', view(views.notifications, async_views.notifications)),
     path('view_notifications/<str:pk>', views.view_notifications),
-    path('academic_years/', views.academic_years),
+    path('notifications_sync/<str:pk>', views.notifications_sync),
+    path('notifications_stream/<str:pk>', async_views.notifications_stream),
+    path('academic_years/', view(views.academic_years, async_views.academic_years)),
     path('registration_issues/<str:pk>', views.registration_issues),
     path('missing_marks/<str:pk>', views.missing_marks),
-    path('sent_complaints/<str:pk>', views.sent_complaints),
+    path('sent_complaints/<str:pk>', view(views.sent_complaints, async_views.sent_complaints)),
     path('reg_complaints/<str:pk>', views.reg_complaints),
     path('update_reg_complaint/<str:pk>', views.update_reg_complaint),
     path('update_marks_complaint/<str:pk>', views.update_marks_complaint),
+    path('bulk_update_reg_complaints/', views.bulk_update_reg_complaints),
+    path('bulk_update_marks_complaints/', views.bulk_update_marks_complaints),
     path('marks_complaints/<str:pk>', views.marks_complaints),
+    path('export_complaints/', exports.export_complaints),
+    path('complaint_analytics/', views.complaint_analytics),
+    path('search_complaints/', views.search_complaints),
     path('forgot-password/', views.forgot_password, name='forgot_password'),
     path('reset-password/<str:token>/', views.reset_password, name='reset_password'),
+    path('metrics/', metrics.metrics),
 ]
\ No newline at end of file
@@ -4,15 +4,17 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 from .models import User, PasswordResetToken
 from rest_framework.response import Response
-from django.core.mail import send_mail
 from django.contrib.auth.hashers import make_password
-from rest_framework import status
+from rest_framework import exceptions, status
 from rest_framework.decorators import api_view, throttle_classes
 from .serializers import (
     UserSerializer, Notification, AcademicYear, YearsSerializer, 
     NotificationsSerializer, CourseSerializer, Course, ProgrammeSerializer, 
     Programme, MissingMarksComplaint, MissingMarksComplaintSerializer, 
-    RegistrationComplaint, RegistrationComplaintSerializer
+    RegistrationComplaint, RegistrationComplaintSerializer, CommonComplaintIssue,
+    ComplaintFeedSerializer, LecturerSerializer, ArchivedComplaint, ArchivedComplaintFeedSerializer,
+    ArchivedMissingMarksComplaintSerializer, ArchivedRegistrationComplaintSerializer,
+    ArchivedNotification, ArchivedNotificationSerializer
 )
 import random
 from django.conf import settings
@@ -20,9 +22,20 @@ from django.utils.crypto import get_random_string
 from django.utils import timezone
 from datetime import timedelta
 from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Count, Max
+from django.db.models.functions import Lower
+from django.utils.dateparse import parse_datetime
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.throttling import AnonRateThrottle
+from rest_framework.utils.urls import replace_query_param
+from .pagination import paginated_response
+from .counters import get_student_statistics, get_registrar_id, invalidate_student_statistics
+from . import rollups, search
+from .notifications import create_notifications
+from .reference_cache import cached_reference
+from .mail import queue_mail
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -35,7 +48,7 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['email'] = user.email
         token['student_number'] = user.student_number
         token['registration_number'] = user.registration_number
-        token['programme'] = user.programme
+        token['programme'] = user.programme_id
         token['has_profile'] = user.has_profile
 
         return token
@@ -103,31 +116,29 @@ def login(request):
                 return Response({"error": "Invalid email or password"}, 
                              status=status.HTTP_401_UNAUTHORIZED)
 
-            # Generate tokens
-            access_token = AccessToken.for_user(user)
-            refresh_token = RefreshToken.for_user(user)
-
-            try:
-                user_programme = int(user.programme.id) if user.programme else None
-            except:
-                user_programme = None
-
-            return Response({
-                "access": str(access_token),
-                "refresh": str(refresh_token),
-                "user": {
-                    "email": user.email,
-                    "student_number": user.student_number,
-                    "registration_number": user.registration_number,
-                    "programme": user_programme,
-                    "role": user.role,
-                    "user_id": user.id,
-                    "has_profile": "true" if user.has_profile else "false",
-                }
-            })
+            return Response(login_response(user))
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+def login_response(user):
+    # Generate tokens
+    access_token = AccessToken.for_user(user)
+    refresh_token = RefreshToken.for_user(user)
+
+    return {
+        "access": str(access_token),
+        "refresh": str(refresh_token),
+        "user": {
+            "email": user.email,
+            "student_number": user.student_number,
+            "registration_number": user.registration_number,
+            "programme": user.programme_id,
+            "role": user.role,
+            "user_id": user.id,
+            "has_profile": "true" if user.has_profile else "false",
+        }
+    }
+
 @api_view(['POST'])
 def verify_otp(request):
     if request.method == "POST":
@@ -178,10 +189,8 @@ def update_profile(request, pk):
         return Response(status= status.HTTP_404_NOT_FOUND)     
 
 @api_view(['GET', 'POST'])
+@cached_reference("courses")
 def courses(request, pk):
-    courses = Course.objects.filter(lecturer = pk)
-    converted = CourseSerializer(courses, many = True)
-    
     if request.method == "POST":
         converted = CourseSerializer(data = request.data)
 
@@ -192,20 +201,19 @@ def courses(request, pk):
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-    return Response(converted.data)  
+    courses = CourseSerializer.setup_eager_loading(Course.objects.filter(lecturer = pk))
+    return paginated_response(request, courses, CourseSerializer)
 
 @api_view(['GET'])
+@cached_reference("courses")
 def all_courses(request, pk):
-    courses = Course.objects.filter(programme = pk)
-    converted = CourseSerializer(courses, many = True)
-    return Response(converted.data)  
+    courses = CourseSerializer.setup_eager_loading(Course.objects.filter(programme = pk))
+    return paginated_response(request, courses, CourseSerializer)
   
 @api_view(['GET', 'POST'])
+@cached_reference("programmes")
 def programmes(request):
 
-    programmes = Programme.objects.all()
-    converted = ProgrammeSerializer(programmes, many = True)
-    
     if request.method == "POST":
         converted = ProgrammeSerializer(data = request.data)
 
@@ -216,21 +224,12 @@ def programmes(request):
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-    return Response(converted.data)    
+    programmes = Programme.objects.all()
+    return paginated_response(request, programmes, ProgrammeSerializer, ordering = ("name",))
 
 @api_view(['GET'])
 def student_statistics(request, pk):
-    reg_complaints_all = RegistrationComplaint.objects.filter(student=pk).count()
-    reg_complaints_pending = RegistrationComplaint.objects.filter(student=pk, status="pending").count()
-    marks_complaints_all = MissingMarksComplaint.objects.filter(student=pk).count()
-    marks_complaints_pending = MissingMarksComplaint.objects.filter(student=pk, status="pending").count()
-
-    response = {
-        "total": marks_complaints_all + reg_complaints_all,
-        "pending": marks_complaints_pending + reg_complaints_pending
-    }
-
-    return Response(response)
+    return Response(get_student_statistics(pk))
 
 
 
@@ -257,13 +256,19 @@ def notifications(request, pk):
             
 
         notifications = Notification.objects.filter(reciever = pk)
-        converted = NotificationsSerializer(notifications, many = True)
-        return Response(converted.data)
+        return paginated_response(
+            request, notifications, NotificationsSerializer, ordering = ("-sent", "-id"),
+            archived = archived_notifications(pk)
+        )
     
     else:
         return Response(status = status.HTTP_403_FORBIDDEN)
     
 
+def archived_notifications(pk):
+    return ArchivedNotification.objects.filter(reciever = pk), ArchivedNotificationSerializer
+
+
 @api_view(['GET'])
 def view_notifications(request, pk):
     try:
@@ -272,19 +277,72 @@ def view_notifications(request, pk):
         user = None
 
     if user is not None:
-        notifications = Notification.objects.filter(reciever = pk)
-
-        for notification in notifications:
-            notification.is_viewed = True
-            notification.save()
+        Notification.objects.filter(reciever = pk, is_viewed = False).update(is_viewed = True, changed = timezone.now())
 
         return Response(status=status.HTTP_202_ACCEPTED)
     
     else:
         return Response(status = status.HTTP_403_FORBIDDEN)
 
+
+@api_view(['GET'])
+def notifications_sync(request, pk):
+    """Incremental notification polling. Returns the notifications sent or
+    changed (viewed) after the ?since= watermark of the previous response,
+    oldest change first, plus the unread count. At most
+    PAGINATION_MAX_PAGE_SIZE come at once, "more" says others are waiting
+    and the watermark is that of the last one returned, so asking again
+    with it carries on where the response stopped. Clients that send back
+    the ETag of a complete response get a 304 when nothing has changed,
+    which costs a single aggregate query."""
+    try:
+        summary = User.objects.filter(id = pk).aggregate(
+            users = Count("id", distinct = True),
+            latest = Max("notification__changed"),
+            total = Count("notification"),
+            unread = Count("notification", filter = Q(notification__is_viewed = False))
+        )
+    except ValueError:
+        summary = {"users": 0}
+    if not summary["users"]:
+        return Response(status = status.HTTP_404_NOT_FOUND)
+
+    latest = summary["latest"].isoformat() if summary["latest"] else None
+    etag = f'"{pk}-{latest}-{summary["total"]}-{summary["unread"]}"'
+
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status = status.HTTP_304_NOT_MODIFIED, headers = {"ETag": etag})
+
+    notifications = Notification.objects.filter(reciever = pk)
+    since = request.query_params.get("since")
+    if since:
+        # "<changed>|<id>" of the last row handed out, or a bare timestamp
+        changed, _, row_id = since.replace(" ", "+").partition("|")
+        changed = parse_datetime(changed)
+        if changed is None or (row_id and not row_id.isdigit()):
+            return Response({"error": "since must be a watermark or an ISO 8601 timestamp"}, status = status.HTTP_400_BAD_REQUEST)
+        after = Q(changed__gt = changed)
+        if row_id:
+            after |= Q(changed = changed, id__gt = int(row_id))
+        notifications = notifications.filter(after)
+
+    page = list(notifications.order_by("changed", "id")[:settings.PAGINATION_MAX_PAGE_SIZE + 1])
+    more, page = len(page) > settings.PAGINATION_MAX_PAGE_SIZE, page[:settings.PAGINATION_MAX_PAGE_SIZE]
+    converted = NotificationsSerializer(page, many = True)
+    # a partial response isn't what the ETag describes, clients keep the one
+    # of the last complete response
+    headers = {} if more else {"ETag": etag}
+    return Response({
+        "notifications": converted.data,
+        "unread": summary["unread"],
+        "more": more,
+        "watermark": f"{page[-1].changed.isoformat()}|{page[-1].id}" if page else since,
+    }, headers = headers)
+
+
     
 @api_view(['GET', 'POST'])
+@cached_reference("academic_years")
 def academic_years(request):
     if request.method == "POST":
         # Validate that the title is in the format YYYY/YYYY
@@ -309,8 +367,7 @@ def academic_years(request):
             return Response(converted.errors, status=status.HTTP_400_BAD_REQUEST)
 
     academic_years = AcademicYear.objects.all().order_by('-created')
-    converted = YearsSerializer(academic_years, many=True)
-    return Response(converted.data)
+    return paginated_response(request, academic_years, YearsSerializer)
 
 @api_view(['GET', 'POST'])
 def missing_marks(request, pk):
@@ -319,24 +376,29 @@ def missing_marks(request, pk):
         converted = MissingMarksComplaintSerializer(data = request.data)
 
         if converted.is_valid():
-            student = User.objects.get(id = request.data["student"])
-            course = Course.objects.get(id = request.data["course"])
-            lecturer = User.objects.get(id = course.lecturer.id)
-            
-            Notification.objects.create(
-                severity = "warning",
-                body = f"You have a new complaint on {course.name} from {student.email}",
-                reciever = lecturer
-            )
-            converted.save()
+            # validation already loaded the student and the course with its lecturer
+            student = converted.validated_data["student"]
+            course = converted.validated_data["course"]
+
+            with transaction.atomic():
+                converted.save()
+                Notification.objects.create(
+                    severity = "warning",
+                    body = f"You have a new complaint on {course.name} from {student.email}",
+                    reciever_id = course.lecturer_id
+                )
             return Response(converted.data, status = status.HTTP_201_CREATED)
         
         else:
             return Response(status = status.HTTP_400_BAD_REQUEST)
 
-    complaints = MissingMarksComplaint.objects.filter(student = pk)
-    converted = MissingMarksComplaintSerializer(complaints, many = True)
-    return Response(converted.data)
+    complaints = MissingMarksComplaintSerializer.setup_eager_loading(
+        MissingMarksComplaint.objects.filter(student = pk)
+    )
+    return paginated_response(
+        request, complaints, MissingMarksComplaintSerializer,
+        archived = archived_complaints(ArchivedComplaint.MISSING_MARKS, student = pk)
+    )
 
 @api_view(['GET', 'POST'])
 def registration_issues(request, pk):
@@ -345,56 +407,92 @@ def registration_issues(request, pk):
         converted = RegistrationComplaintSerializer(data = request.data)
 
         if converted.is_valid():
-            student = User.objects.get(id = request.data["student"])
-            registrar = User.objects.get(role = "registrar")
-            Notification.objects.create(
-                severity = "warning",
-                body = f"You have a new complaint titled ({(request.data["subject"])}) from {student.email}",
-                reciever = registrar
-            )            
-            converted.save()
+            student = converted.validated_data["student"]
+            subject = converted.validated_data["subject"]
+
+            with transaction.atomic():
+                converted.save()
+                Notification.objects.create(
+                    severity = "warning",
+                    body = f"You have a new complaint titled ({subject}) from {student.email}",
+                    reciever_id = get_registrar_id()
+                )
             return Response(converted.data, status = status.HTTP_201_CREATED)
         
         else:
             return Response(status = status.HTTP_400_BAD_REQUEST)
 
-    complaints = RegistrationComplaint.objects.filter(student = pk)
-    converted = RegistrationComplaintSerializer(complaints, many = True)
-    return Response(converted.data)
+    complaints = RegistrationComplaintSerializer.setup_eager_loading(
+        RegistrationComplaint.objects.filter(student = pk)
+    )
+    return paginated_response(
+        request, complaints, RegistrationComplaintSerializer,
+        archived = archived_complaints(ArchivedComplaint.REGISTRATION, student = pk)
+    )
+
+
+ARCHIVED_SERIALIZERS = {
+    ArchivedComplaint.MISSING_MARKS: ArchivedMissingMarksComplaintSerializer,
+    ArchivedComplaint.REGISTRATION: ArchivedRegistrationComplaintSerializer,
+}
+
+def archived_complaints(kind, **filters):
+    """The archive's (queryset, serializer) of a list of one kind of complaints."""
+    serializer_class = ARCHIVED_SERIALIZERS[kind]
+    return serializer_class.setup_eager_loading(ArchivedComplaint.objects.filter(kind = kind, **filters)), serializer_class
 
 
 @api_view(['GET'])
 def sent_complaints(request, pk):
-    reg_complaints_all = RegistrationComplaint.objects.filter(student=pk)
-    marks_complaints_all = MissingMarksComplaint.objects.filter(student=pk)
+    complaints = sent_complaints_queryset(pk, request.query_params)
+    return paginated_response(
+        request, complaints, ComplaintFeedSerializer,
+        archived = archived_sent_complaints(pk, request.query_params)
+    )
 
-    all_complaints = []
 
-    converted_missing = MissingMarksComplaintSerializer(marks_complaints_all, many=True)
-    converted_reg = RegistrationComplaintSerializer(reg_complaints_all, many=True)
-    
-    for complaint in converted_missing.data:
-        complaint["type"] = "missing marks complaint"
-        all_complaints.append(complaint)
+def sent_complaints_filters(params):
+    filters = {field: params[field] for field in ("status", "academic_year") if params.get(field)}
+    if "academic_year" in filters:
+        try:
+            filters["academic_year"] = int(filters["academic_year"])
+        except ValueError:
+            raise exceptions.ValidationError({"error": "academic_year must be a number"})
+    return filters
+
+
+def sent_complaints_queryset(pk, params):
+    complaints = CommonComplaintIssue.objects.filter(
+        Q(missingmarkscomplaint__isnull = False) | Q(registrationcomplaint__isnull = False),
+        student = pk,
+        **sent_complaints_filters(params)
+    )
+    return ComplaintFeedSerializer.setup_eager_loading(complaints)
 
-    for complaint in converted_reg.data:
-        complaint["type"] = "registration issues"
-        all_complaints.append(complaint)
 
-    return Response(all_complaints)
+def archived_sent_complaints(pk, params):
+    complaints = ArchivedComplaint.objects.filter(student = pk, **sent_complaints_filters(params))
+    return ArchivedComplaintFeedSerializer.setup_eager_loading(complaints), ArchivedComplaintFeedSerializer
 
 
 @api_view(['GET'])
 def reg_complaints(request, pk):
-    reg_complaints = RegistrationComplaint.objects.filter(student__programme = pk)
-    
-    for complaint in reg_complaints:
-        complaint.seen = True
-        complaint.save()
-
-    converted = RegistrationComplaintSerializer(reg_complaints, many = True)
+    # mark everything unseen as seen with one UPDATE on the parent table, the
+    # queryset below is evaluated afterwards so it reports the new state
+    CommonComplaintIssue.objects.filter(
+        registrationcomplaint__isnull = False,
+        student__programme = pk,
+        seen = False
+    ).update(seen = True)
+
+    reg_complaints = RegistrationComplaintSerializer.setup_eager_loading(
+        RegistrationComplaint.objects.filter(student__programme = pk)
+    )
 
-    return Response(converted.data)
+    return paginated_response(
+        request, reg_complaints, RegistrationComplaintSerializer,
+        archived = archived_complaints(ArchivedComplaint.REGISTRATION, student__programme = pk)
+    )
 
 @api_view(['PATCH'])
 def update_reg_complaint(request, pk):
@@ -404,7 +502,10 @@ def update_reg_complaint(request, pk):
         complaint = None
 
     if complaint is not None:
-        
+        # the status it already has, nothing to write or tell the student
+        if complaint.status == request.data["status"]:
+            return Response(status= status.HTTP_202_ACCEPTED)
+
         Notification.objects.create(
             reciever = complaint.student,
             severity = "success" if request.data["status"] == "resolved" else "info",
@@ -420,12 +521,15 @@ def update_reg_complaint(request, pk):
 @api_view(['PATCH'])
 def update_marks_complaint(request, pk):
     try:
-        complaint = MissingMarksComplaint.objects.get(id = pk)
+        complaint = MissingMarksComplaint.objects.select_related("course__lecturer").get(id = pk)
     except:
         complaint = None
 
     if complaint is not None:
-        
+        # the status it already has, nothing to write or tell the student
+        if complaint.status == request.data["status"]:
+            return Response(status= status.HTTP_202_ACCEPTED)
+
         Notification.objects.create(
             reciever = complaint.student,
             severity = "success" if request.data["status"] == "resolved" else "info",
@@ -438,17 +542,137 @@ def update_marks_complaint(request, pk):
     else:
         return Response(status=status.HTTP_400_BAD_REQUEST)      
 
+def bulk_update_complaints(request, complaints, describe):
+    """Set one status on many complaints with a single UPDATE and notify each
+    student with one bulk INSERT. `complaints` is the queryset the ids are
+    looked up in, `describe` builds a notification body from a row of it.
+    Returns per-id results."""
+    ids = request.data.get("ids")
+    new_status = request.data.get("status")
+    if not isinstance(ids, list) or not new_status:
+        return Response({"error": "ids (a list) and status are required"}, status = status.HTTP_400_BAD_REQUEST)
+    if new_status not in CommonComplaintIssue.STATUSES:
+        return Response({"error": f"status must be one of {', '.join(CommonComplaintIssue.STATUSES)}"}, status = status.HTTP_400_BAD_REQUEST)
+
+    parsed = []
+    for complaint_id in ids:
+        try:
+            parsed.append((complaint_id, int(complaint_id)))
+        except (TypeError, ValueError):
+            parsed.append((complaint_id, None))
+    valid_ids = [complaint_id for _, complaint_id in parsed if complaint_id is not None]
+
+    now = timezone.now()
+    with transaction.atomic():
+        found = {c.id: c for c in complaints.filter(id__in = valid_ids)}
+        # complaints already in the status are neither written nor notified again
+        changed = [c for c in found.values() if c.status != new_status]
+        CommonComplaintIssue.objects.filter(id__in = [c.id for c in changed]).update(
+            status = new_status, updated = now, resolved_at = now if new_status == "resolved" else None
+        )
+        # update() skips post_save, move the rows' counts in the analytics rollup here
+        rollups.record_changes(changed, new_status, now if new_status == "resolved" else None)
+        create_notifications([
+            Notification(
+                reciever_id = complaint.student_id,
+                severity = "success" if new_status == "resolved" else "info",
+                body = describe(complaint)
+            )
+            for complaint in changed
+        ])
+
+    # update() skips the post_save handlers that keep dashboard counters fresh
+    invalidate_student_statistics(*{c.student_id for c in changed})
+
+    def result(complaint_id):
+        if complaint_id is None:
+            return "invalid"
+        if complaint_id not in found:
+            return "not found"
+        return "unchanged" if found[complaint_id].status == new_status else "updated"
+
+    results = [{"id": raw, "result": result(complaint_id)} for raw, complaint_id in parsed]
+
+    return Response({"status": new_status, "results": results}, status = status.HTTP_202_ACCEPTED)
+
+# what rollups.record_changes reads from a complaint besides its student's programme
+ROLLUP_FIELDS = ("status", "created", "resolved_at", "academic_year")
+
+@api_view(['PATCH'])
+def bulk_update_reg_complaints(request):
+    return bulk_update_complaints(
+        request,
+        RegistrationComplaint.objects.select_related("student").only("id", "student__programme", *ROLLUP_FIELDS),
+        lambda complaint: "The registrar has addressed a complaint you made, please get to know more about this from the complaints page"
+    )
+
+@api_view(['PATCH'])
+def bulk_update_marks_complaints(request):
+    return bulk_update_complaints(
+        request,
+        MissingMarksComplaint.objects.select_related("student", "course__lecturer").only(
+            "id", "student__programme", "year_of_study", "category", "course__name", "course__lecturer__email", *ROLLUP_FIELDS
+        ),
+        lambda complaint: f"The lecturer ({complaint.course.lecturer.email}) has addressed a complaint you made about missing marks for a courseunit  ({complaint.course.name}) that you covered in {complaint.year_of_study}, please get to know more about this from the complaints page"
+    )
+
 @api_view(['GET'])
 def marks_complaints(request, pk):
-    complaints = MissingMarksComplaint.objects.filter(course = pk)
-    
-    for complaint in complaints:
-        complaint.seen = True
-        complaint.save()
+    CommonComplaintIssue.objects.filter(
+        missingmarkscomplaint__course = pk,
+        seen = False
+    ).update(seen = True)
 
-    converted = MissingMarksComplaintSerializer(complaints, many = True)
+    complaints = MissingMarksComplaintSerializer.setup_eager_loading(
+        MissingMarksComplaint.objects.filter(course = pk)
+    )
+
+    return paginated_response(
+        request, complaints, MissingMarksComplaintSerializer,
+        archived = archived_complaints(ArchivedComplaint.MISSING_MARKS, course = pk)
+    )
 
-    return Response(converted.data)      
+@api_view(['GET'])
+def complaint_analytics(request):
+    """GET complaint_analytics/?group_by=programme,academic_year&programme=&course=&category=&academic_year=&kind=
+    read from the rollup table, one row per group instead of one per complaint"""
+    group_by = [d for d in request.query_params.get("group_by", "programme").split(",") if d]
+    if not group_by or any(d not in rollups.DIMENSIONS for d in group_by):
+        return Response({"error": f"group_by must be a comma separated list of {', '.join(rollups.DIMENSIONS)}"}, status = status.HTTP_400_BAD_REQUEST)
+
+    filters = {d: request.query_params[d] for d in rollups.DIMENSIONS if request.query_params.get(d)}
+    try:
+        return Response(rollups.analytics(group_by, filters))
+    except ValueError as error:
+        return Response({"error": str(error)}, status = status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+def search_complaints(request):
+    """GET search_complaints/?q=&type=missing_marks|registration&page=&page_size=
+    complaints matching every word of q, best match first, a page at a time"""
+    kind = request.query_params.get("type") or None
+    if kind is not None and kind not in search.KINDS:
+        return Response({"error": f"type must be one of {', '.join(search.KINDS)}"}, status = status.HTTP_400_BAD_REQUEST)
+    try:
+        page = int(request.query_params.get("page", 1))
+        page_size = min(int(request.query_params.get("page_size", settings.PAGINATION_PAGE_SIZE)), settings.PAGINATION_MAX_PAGE_SIZE)
+        if page < 1 or page_size < 1:
+            raise ValueError
+    except ValueError:
+        return Response({"error": "page and page_size must be positive numbers"}, status = status.HTTP_400_BAD_REQUEST)
+
+    # ranked pages are numbered, a cursor can't follow a relevance order; one
+    # id past the page says whether there is a next one
+    ids = search.search(request.query_params.get("q", ""), kind, limit = page_size + 1, offset = (page - 1) * page_size)
+    rank = {complaint_id: position for position, complaint_id in enumerate(ids[:page_size])}
+    complaints = ComplaintFeedSerializer.setup_eager_loading(CommonComplaintIssue.objects.filter(id__in = rank))
+
+    url = request.build_absolute_uri()
+    return Response({
+        "next": replace_query_param(url, "page", page + 1) if len(ids) > page_size else None,
+        "previous": replace_query_param(url, "page", page - 1) if page > 1 else None,
+        "results": ComplaintFeedSerializer(sorted(complaints, key = lambda c: rank[c.id]), many = True).data,
+    })
 
 class PasswordResetThrottle(AnonRateThrottle):
     rate = '3/hour'  # Allow 3 requests per hour
@@ -488,27 +712,18 @@ def forgot_password(request):
     # Set cache to prevent multiple requests
     cache.set(cache_key, True, 3600)  # Cache for 1 hour
 
-    # Send the reset email
+    # Queue the reset email, send_queued_mail delivers it outside the request
     reset_url = f"{settings.FRONTEND_URL}/reset-password/{token}"
-    try:
-        send_mail(
-            'Password Reset Request - WBCMS',
-            f'Hello,\n\n'
-            f'You have requested to reset your password for the Web-based Complaint Monitoring System (WBCMS).\n\n'
-            f'Click the following link to reset your password: {reset_url}\n\n'
-            f'This link will expire in 24 hours.\n\n'
-            f'If you did not request a password reset, please ignore this email and ensure your account is secure.\n\n'
-            f'Best regards,\nWBCMS Team',
-            settings.DEFAULT_FROM_EMAIL,
-            [email],
-            fail_silently=False,
-        )
-    except Exception as e:
-        # Log the error but don't expose it to the user
-        print(f"Failed to send password reset email: {str(e)}")
-        return Response({
-            'error': 'Failed to send reset email. Please try again later.'
-        }, status=500)
+    queue_mail(
+        'Password Reset Request - WBCMS',
+        f'Hello,\n\n'
+        f'You have requested to reset your password for the Web-based Complaint Monitoring System (WBCMS).\n\n'
+        f'Click the following link to reset your password: {reset_url}\n\n'
+        f'This link will expire in 24 hours.\n\n'
+        f'If you did not request a password reset, please ignore this email and ensure your account is secure.\n\n'
+        f'Best regards,\nWBCMS Team',
+        [email],
+    )
 
     return Response({
         'message': 'If an account exists with this email, you will receive password reset instructions.'
@@ -555,15 +770,34 @@ def reset_password(request, token):
     reset_token.save()
     PasswordResetToken.objects.filter(user=user, used=False).delete()
 
-    # Clear any existing sessions for this user
-    user.auth_token_set.all().delete()
+    # Tokens issued before now carry the old password fingerprint and are
+    # rejected from here on, the User save above already dropped the cached state
 
     return Response({
         'message': 'Password has been reset successfully. You can now login with your new password.'
     })
 
 @api_view(['GET'])
+@cached_reference("lecturers")
 def lecturers(request):
-    lecturers = User.objects.filter(role='lecturer')
-    converted = UserSerializer(lecturers, many=True)
-    return Response(converted.data)
\ No newline at end of file
+    lecturers = LecturerSerializer.setup_eager_loading(User.objects.filter(role='lecturer'))
+
+    # prefix search on name or email, served by the (role, lower(column)) indexes
+    prefix = request.query_params.get("search", "").strip().lower()
+    if prefix:
+        lecturers = lecturers.annotate(
+            email_lower = Lower("email"),
+            first_name_lower = Lower("first_name"),
+            last_name_lower = Lower("last_name")
+        ).filter(
+            prefix_range("email_lower", prefix)
+            | prefix_range("first_name_lower", prefix)
+            | prefix_range("last_name_lower", prefix)
+        )
+
+    return paginated_response(request, lecturers, LecturerSerializer, ordering = ("id",))
+
+
+def prefix_range(field, prefix):
+    # a range instead of LIKE 'prefix%' so a plain btree index is usable on every backend
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + "\uffff"})
\ No newline at end of file
@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app.routers.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -79,12 +80,44 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 # JWT AUTH SETTINGS 
+# stateless mode trusts the token's claims and only checks a cached
+# active/password state, set JWT_STATELESS_AUTH=false to load the user row on
+# every request instead
+JWT_STATELESS_AUTH = os.getenv("JWT_STATELESS_AUTH", "true").lower() == "true"
+# seconds a deactivation or password change can take to reach other workers
+AUTH_STATE_CACHE_TIMEOUT = int(os.getenv("AUTH_STATE_CACHE_TIMEOUT", 60))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'app.authentication.CachedStatelessJWTAuthentication'
+        if JWT_STATELESS_AUTH else
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     )
 }
 
+# LIST PAGINATION SETTINGS
+# list endpoints return cursor pages ({"next", "previous", "results"}), set
+# LEGACY_LIST_RESPONSES to keep returning plain lists to clients that don't
+# send a cursor or page_size
+PAGINATION_PAGE_SIZE = int(os.getenv("PAGINATION_PAGE_SIZE", 50))
+PAGINATION_MAX_PAGE_SIZE = int(os.getenv("PAGINATION_MAX_PAGE_SIZE", 500))
+LEGACY_LIST_RESPONSES = os.getenv("LEGACY_LIST_RESPONSES", "true").lower() == "true"
+
+# seconds the student dashboard counters stay cached, complaint writes
+# invalidate them so this only bounds staleness from writes made outside the
+# app (raw SQL, other services). 0 turns the cache off
+STUDENT_STATISTICS_CACHE_TIMEOUT = int(os.getenv("STUDENT_STATISTICS_CACHE_TIMEOUT", 3600))
+
+# NOTIFICATION STREAM SETTINGS
+# app.broker keeps the notifications_stream/ clients in memory, a new
+# notification reaches the streams served by the process that saved it.
+# Seconds between keep-alive comments on an idle stream
+NOTIFICATION_STREAM_HEARTBEAT = int(os.getenv("NOTIFICATION_STREAM_HEARTBEAT", 15))
+
+# under an ASGI server (see run.sh), serve login and the busiest reads with
+# the async views in app/async_views.py instead of the sync DRF views
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "false").lower() == "true"
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -93,6 +126,9 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
     "UPDATE_LAST_LOGIN": False,
+    # tokens carry a fingerprint of the password hash and stop working once it changes
+    "CHECK_REVOKE_TOKEN": True,
+    "REVOKE_TOKEN_CLAIM": "hash_password",
 
     "ALGORITHM": "HS256",
     "VERIFYING_KEY": "",
@@ -129,12 +165,96 @@ SIMPLE_JWT = {
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgres for production, anything else keeps the SQLite file.
+# Postgres connections are reused either through Django's built-in pool
+# (DB_POOL=true, needs psycopg[pool]) or kept open for DB_CONN_MAX_AGE seconds
+
+if os.getenv("DB_ENGINE", "sqlite") == "postgres":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("DB_NAME", "cms"),
+            'USER': os.getenv("DB_USER", "postgres"),
+            'PASSWORD': os.getenv("DB_PASSWORD", ""),
+            'HOST': os.getenv("DB_HOST", "localhost"),
+            'PORT': os.getenv("DB_PORT", "5432"),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.getenv("DB_POOL", "false").lower() == "true":
+        # the pool hands connections back itself, Django refuses persistent
+        # connections on top of it
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+            'max_size': int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+            'timeout': int(os.getenv("DB_POOL_TIMEOUT", 10)),
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv("DB_CONN_MAX_AGE", 60))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv("DB_NAME", BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {},
+        }
+    }
+    # on by default for a DB_NAME database only: WAL rewrites the file's
+    # header and leaves -wal/-shm files next to it, the checked-in
+    # db.sqlite3 keeps its rollback journal unless SQLITE_TUNED=true
+    if os.getenv("SQLITE_TUNED", "true" if os.getenv("DB_NAME") else "false").lower() == "true":
+        # WAL lets readers run alongside the single writer, writers wait up
+        # to the timeout for the lock instead of failing with "database is
+        # locked", and IMMEDIATE takes the write lock when the transaction
+        # starts so it can't deadlock upgrading a read lock halfway through
+        DATABASES['default']['OPTIONS'] = {
+            'timeout': int(os.getenv("SQLITE_BUSY_TIMEOUT", 20)),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        }
+
+# Read replicas
+# reads go to a random replica and writes to the primary ('default'), a user
+# who just wrote reads from the primary for REPLICA_PIN_SECONDS afterwards.
+# DB_REPLICA_HOSTS lists Postgres replica hosts, DB_REPLICA_NAMES SQLite
+# files for local testing (copied from the primary by refresh_replicas)
+
+_postgres = DATABASES['default']['ENGINE'].endswith('postgresql')
+_replicas = os.getenv("DB_REPLICA_HOSTS" if _postgres else "DB_REPLICA_NAMES", "")
+for number, replica in enumerate(filter(None, _replicas.split(",")), start=1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        ('HOST' if _postgres else 'NAME'): replica.strip(),
+        # tests run against the primary's test database
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['app.routers.PrimaryReplicaRouter']
+# adds the replica alias the routing tests use, see app/runner.py
+TEST_RUNNER = 'app.runner.TestRunner'
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 10))
+
+# Cache
+# reference data responses, dashboard counters and the registrar lookup live
+# here, set REDIS_URL when running more than one process so invalidations
+# reach every worker
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -154,6 +274,53 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# the first hasher hashes new passwords, the rest only verify existing hashes,
+# which are upgraded to the first one on the next successful login. scrypt is
+# built in, argon2 needs argon2-cffi
+
+PASSWORD_HASHER_POLICIES = {
+    "pbkdf2": [
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ],
+    "argon2": [
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ],
+    "scrypt": [
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+    ],
+}
+PASSWORD_HASHERS = PASSWORD_HASHER_POLICIES[os.getenv("PASSWORD_HASHER_POLICY", "pbkdf2")]
+
+# threads async views hash passwords on, roughly one per core
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", os.cpu_count() or 1))
+
+# rows per validation query and bulk_create of `manage.py bulk_import` and
+# the admin imports, only one chunk is held in memory at a time
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+# rows fetched per round trip and rendered per response chunk by the
+# complaint exports, their memory use depends on this and not on the row count
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 2000))
+# complaints loaded and written per round trip when the search index is
+# rebuilt, or refreshed after a student or course changes
+SEARCH_INDEX_CHUNK_SIZE = int(os.getenv("SEARCH_INDEX_CHUNK_SIZE", 2000))
+# search ranks the newest this many matches of a query, the rest of a very
+# broad query's matches are not returned
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", 10000))
+# rows `manage.py archive` moves per transaction, and the seconds it waits
+# between two so that live writes queued on their locks get through
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 1000))
+ARCHIVE_BATCH_PAUSE = float(os.getenv("ARCHIVE_BATCH_PAUSE", 0))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -180,3 +347,42 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER or "webmaster@localhost")
+
+# used to build the link in password reset emails
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
+
+# OUTBOX SETTINGS
+# mail is queued in the OutboundEmail table and sent by `manage.py send_queued_mail`
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+# seconds before the first retry, doubled after every failed attempt
+OUTBOX_RETRY_BACKOFF = int(os.getenv("OUTBOX_RETRY_BACKOFF", 60))
+# seconds a worker has to send the batch it claimed before another may retry it
+OUTBOX_LEASE = int(os.getenv("OUTBOX_LEASE", 300))
+# also email every in-app notification to its receiver
+NOTIFICATION_EMAILS = os.getenv("NOTIFICATION_EMAILS", "false").lower() == "true"
+
+# METRICS
+# per URL pattern timings, query counts, cache hits and response sizes,
+# scraped by Prometheus from metrics/ on the allowed addresses only
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_ALLOWED_IPS = os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+# requests slower than this are logged to app.performance with their slowest queries
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 500))
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", 10))
+
+if METRICS_ENABLED:
+    # outermost, so the time spent in the other middleware is counted too
+    MIDDLEWARE.insert(0, 'app.metrics.MetricsMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'app.performance': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
@@ -0,0 +1,124 @@
+"""Size of the live complaint and notification tables, and latency of the
+lists over them, before and after `manage.py archive` moves the closed
+years out, for a range of table sizes. Three of the four seeded academic
+years are settled (every complaint resolved) and closed, the fourth stays
+current. Also reports how long each archive batch holds its transaction.
+Each size runs in its own process against its own database.
+
+    python benchmarks/archival.py --sizes 10000,100000,400000
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from common import setup_django, percentile, Timer
+
+REPEAT = 20
+TABLES = ["app_commoncomplaintissue", "app_missingmarkscomplaint", "app_registrationcomplaint", "app_notification"]
+
+
+def table_size(name):
+    """Rows, and kilobytes of the table with its indexes: in pages, and
+    holding rows. Pages the archived rows only partly emptied stay with the
+    table until new rows fill them or a VACUUM (FULL on PostgreSQL), the rows
+    figure drops with every row moved."""
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {name}")
+        rows = cursor.fetchone()[0]
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_total_relation_size(%s), NULL", [name])
+        else:
+            cursor.execute(
+                "SELECT SUM(pgsize), SUM(payload) FROM dbstat "
+                "WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                [name],
+            )
+        allocated, used = cursor.fetchone()
+        return rows, (allocated or 0) // 1024, (used or 0) // 1024
+
+
+def timed(client, url, params):
+    samples = []
+    for _ in range(REPEAT + 1):
+        with Timer() as timer:
+            response = client.get(url, params)
+        assert response.status_code == 200, (url, response.status_code)
+        samples.append(timer.elapsed * 1000)
+    # the first request warms caches
+    return percentile(samples[1:], 50)
+
+
+def run(size):
+    setup_django()
+
+    from django.test import Client
+    from django.utils import timezone
+    from app import archiving, rollups
+    from app.models import AcademicYear, CommonComplaintIssue
+    from app.seeding import seed
+
+    # two complaints per student, one of each kind; a course count prime to
+    # the four seeded years gives every course complaints of every year
+    objects = seed(programmes=10, students=max(1, size // 2), lecturers=20, courses=199, complaints_per_student=2, notifications_per_user=4)
+    past = list(AcademicYear.objects.order_by("title")[:3])
+    CommonComplaintIssue.objects.filter(academic_year__in=past).update(status="resolved", resolved_at=timezone.now())
+    rollups.rebuild()
+    client = Client()
+
+    student, programme, course = objects["student"].id, objects["programme"].id, objects["course"].id
+    page = {"page_size": 50}
+    urls = {
+        "sent_complaints": (f"/sent_complaints/{student}", {}),
+        "notifications": (f"/notifications/{student}", {}),
+        "reg_complaints": (f"/reg_complaints/{programme}", {}),
+        "reg_complaints page": (f"/reg_complaints/{programme}", page),
+        "marks_complaints": (f"/marks_complaints/{course}", {}),
+        "marks_complaints page": (f"/marks_complaints/{course}", page),
+    }
+
+    def measure(**params):
+        return {name: timed(client, url, {**query, **params}) for name, (url, query) in urls.items()}
+
+    tables = {name: table_size(name) for name in TABLES}
+    before = measure()
+
+    batches = []
+    with Timer() as timer:
+        for year in past:
+            archiving.close_year(year)
+        moved = archiving.archive(on_batch=lambda table, count, seconds: batches.append(seconds * 1000))
+    after, included = measure(), measure(archived="include")
+
+    print(
+        f"{size} complaints: {moved['complaints']} complaints and {moved['notifications']} notifications archived "
+        f"in {timer.elapsed:.1f}s, {len(batches)} batches, batch p50 {percentile(batches, 50):.1f} ms max {max(batches):.1f} ms",
+        flush=True,
+    )
+    for name in TABLES:
+        (rows, kb, used), (rows_after, kb_after, used_after) = tables[name], table_size(name)
+        print(
+            f"    {name:26} {rows:8} rows {kb:7} KB ({used:7} KB of rows)   "
+            f"-> {rows_after:8} rows {kb_after:7} KB ({used_after:7} KB of rows)",
+            flush=True,
+        )
+    for name in urls:
+        print(
+            f"    {name:22} {before[name]:8.2f} ms -> {after[name]:8.2f} ms   archived=include {included[name]:8.2f} ms",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,400000")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run(args.single)
+    else:
+        for size in args.sizes.split(","):
+            subprocess.run([sys.executable, __file__, f"--single={size}"], env=os.environ, check=True)
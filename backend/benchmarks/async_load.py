@@ -0,0 +1,170 @@
+"""Load test of the busiest read endpoints (notifications, student_statistics,
+sent_complaints, academic_years, programmes) at high concurrency, comparing:
+
+    wsgi          the sync views behind a threaded WSGI server, a thread per
+                  connection like runserver or gunicorn --threads
+    asgi sync     the same sync views under the ASGI app
+    asgi async    the async views, ASYNC_VIEWS=true under the ASGI app
+
+Requests are fed to the WSGI and ASGI applications in-process, so the numbers
+are the app's own and not a server's or the network's.
+
+    python benchmarks/async_load.py --concurrency 200 --requests 4000
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import subprocess
+import sys
+import threading
+
+from common import setup_django, percentile, Timer
+
+MODES = {
+    "wsgi": "false",
+    "asgi sync": "false",
+    "asgi async": "true",
+}
+
+
+def setup():
+    setup_django()
+
+    from django.conf import settings
+    from django.core import signals
+    from django.db import close_old_connections
+    from app.seeding import seed
+    from app.views import login_response
+
+    objects = seed(students=500, complaints_per_student=4, notifications_per_user=10)
+    # production settings: no query log, and a connection per request, which
+    # setup_django() turns off for the single threaded benchmarks
+    settings.DEBUG = False
+    signals.request_started.connect(close_old_connections)
+    signals.request_finished.connect(close_old_connections)
+
+    students = list(type(objects["student"]).objects.filter(role="student").values_list("id", flat=True))
+    token = login_response(objects["student"])["access"]
+    return students, token
+
+
+def urls(students, requests):
+    paths = ("/notifications/{}", "/student_statistics/{}", "/sent_complaints/{}", "/academic_years/", "/programmes/")
+    return [random.choice(paths).format(random.choice(students)) for _ in range(requests)]
+
+
+def run_wsgi(paths, token, concurrency):
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+
+    def request(path):
+        environ = {
+            "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80", "HTTP_HOST": "testserver", "HTTP_AUTHORIZATION": f"Bearer {token}",
+            "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+        }
+        statuses = []
+        with Timer() as timer:
+            body = b"".join(application(environ, lambda status, headers: statuses.append(status)))
+        assert statuses[0].startswith("200"), statuses[0]
+        return timer.elapsed, len(body)
+
+    # each thread is one connection sending its requests back to back
+    queue = iter(paths)
+    results = []
+
+    def client():
+        for path in queue:
+            results.append(request(path))
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    with Timer() as timer:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return results, timer.elapsed
+
+
+def run_asgi(paths, token, concurrency):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+
+    async def request(path):
+        messages = []
+
+        async def receive():
+            if not messages:
+                messages.append(None)
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # the client never disconnects, the app stops listening once it has answered
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+            "headers": [(b"host", b"testserver"), (b"authorization", f"Bearer {token}".encode())],
+            "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+        }
+        with Timer() as timer:
+            await application(scope, receive, send)
+        assert messages[1]["status"] == 200, messages[1]["status"]
+        return timer.elapsed, sum(len(m.get("body", b"")) for m in messages[2:])
+
+    queue = iter(paths)
+    results = []
+
+    async def client():
+        for path in queue:
+            results.append(await request(path))
+
+    async def main():
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    with Timer() as timer:
+        asyncio.run(main())
+    return results, timer.elapsed
+
+
+def run(mode, concurrency, requests):
+    students, token = setup()
+    paths = urls(students, requests)
+
+    run_mode = run_wsgi if mode == "wsgi" else run_asgi
+    # warm up caches and code paths before measuring
+    run_mode(paths[:200], token, concurrency)
+    results, elapsed = run_mode(paths, token, concurrency)
+
+    latencies = [latency for latency, _ in results]
+    print(
+        f"{mode:11} {len(results) / elapsed:8.1f} req/s  p50 {percentile(latencies, 50) * 1000:7.1f}ms  "
+        f"p99 {percentile(latencies, 99) * 1000:8.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        random.seed(0)
+        run(args.mode, args.concurrency, args.requests)
+    else:
+        print(f"{args.requests} requests, {args.concurrency} concurrent")
+        # ASYNC_VIEWS is read when the urls load, so every mode gets its own process
+        for mode, async_views in MODES.items():
+            subprocess.run(
+                [sys.executable, __file__, f"--mode={mode}", f"--concurrency={args.concurrency}", f"--requests={args.requests}"],
+                env={**os.environ, "ASYNC_VIEWS": async_views},
+                check=True,
+            )
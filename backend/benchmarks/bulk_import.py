@@ -0,0 +1,120 @@
+"""Students and courses loaded one at a time through sign_up and courses/,
+against app.importing's chunked bulk import, plus the import's peak memory
+for two file sizes to show it doesn't grow with the file.
+
+    python benchmarks/bulk_import.py --students 20000 --courses 2000
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+import tracemalloc
+
+from common import setup_django, Timer
+
+PASSWORD = "Import#2024-pass"
+
+
+def write_students(path, count, passwords, start=0):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["email", "first_name", "last_name", "registration_number", "student_number", "programme", "password"])
+        for i in range(start, start + count):
+            # one row in a hundred fails: a bad domain or an unknown programme
+            domain = "gmail.com" if i % 200 == 0 else "students.mak.ac.ug"
+            programme = "no such programme" if i % 200 == 100 else f"seed programme {i % 10}"
+            writer.writerow([
+                f"import.student{i}@{domain}", "Import", f"Student{i}", f"import/{i}", f"import{i}",
+                programme, PASSWORD if passwords else "",
+            ])
+
+
+def write_courses(path, count):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "code", "semester", "programme", "lecturer"])
+        for i in range(count):
+            writer.writerow([f"import course {i}", f"IMP{i}", "1", f"seed programme {i % 10}", f"seed.lecturer{i % 100}@cit.mak.ac.ug"])
+
+
+def run_import(kind, path):
+    from app.importing import IMPORTS, read_rows
+
+    with open(path, "rb") as file:
+        return IMPORTS[kind]().run(read_rows(file, path))
+
+
+def peak_memory(kind, path):
+    tracemalloc.start()
+    run_import(kind, path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(students, hashed, courses, sample):
+    setup_django()
+
+    from django.conf import settings
+    from django.test import Client
+    from app.models import User
+    from app.seeding import seed
+    from app.views import login_response
+
+    objects = seed(programmes=10, students=10, lecturers=100, courses=10, complaints_per_student=0, notifications_per_user=0)
+    client = Client()
+    headers = {"HTTP_AUTHORIZATION": f"Bearer {login_response(objects['registrar'])['access']}"}
+    directory = tempfile.mkdtemp()
+
+    # one request per student, each hashing its password
+    with Timer() as timer:
+        for i in range(sample):
+            response = client.post("/signup/", json.dumps({
+                "email": f"signup{i}@students.mak.ac.ug", "username": f"signup{i}", "password": PASSWORD,
+            }), content_type="application/json")
+            assert response.status_code == 201, response.status_code
+    print(f"sign_up, one request per row           {sample / timer.elapsed:9.1f} rows/s")
+
+    path = os.path.join(directory, "students.csv")
+    write_students(path, students, passwords=False)
+    result = run_import("students", path)
+    print(f"import students, no passwords          {result.rows_per_second:9.1f} rows/s  "
+          f"({result.rows} rows, {result.created} created, {result.failed} failed)")
+
+    path = os.path.join(directory, "students_passwords.csv")
+    write_students(path, hashed, passwords=True, start=students)
+    result = run_import("students", path)
+    print(f"import students, with passwords        {result.rows_per_second:9.1f} rows/s  "
+          f"({result.rows} rows, {settings.PASSWORD_HASHING_WORKERS} hashing processes)")
+
+    lecturer = User.objects.filter(role="lecturer").first()
+    with Timer() as timer:
+        for i in range(sample):
+            response = client.post(f"/courses/{lecturer.id}", json.dumps({
+                "name": f"posted course {i}", "code": f"POST{i}", "semester": "1",
+                "programme": objects["programme"].id, "lecturer": lecturer.id,
+            }), content_type="application/json", **headers)
+            assert response.status_code == 201, response.status_code
+    print(f"courses/ POST, one request per row     {sample / timer.elapsed:9.1f} rows/s")
+
+    path = os.path.join(directory, "courses.csv")
+    write_courses(path, courses)
+    result = run_import("courses", path)
+    print(f"import courses                         {result.rows_per_second:9.1f} rows/s  ({result.created} created)")
+
+    # same chunk size, four times the rows
+    for count in (students // 4, students):
+        path = os.path.join(directory, f"memory{count}.csv")
+        write_students(path, count, passwords=False, start=10 * students + count)
+        print(f"peak memory importing {count:6} students  {peak_memory('students', path) / 2**20:9.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--hashed", type=int, default=500, help="students imported with a password")
+    parser.add_argument("--courses", type=int, default=2000)
+    parser.add_argument("--sample", type=int, default=100, help="rows sent through the one at a time endpoints")
+    args = parser.parse_args()
+    main(args.students, args.hashed, args.courses, args.sample)
@@ -0,0 +1,49 @@
+"""Resolving N complaints with the bulk endpoint against one PATCH per
+complaint, the way the frontend used to.
+
+    python benchmarks/bulk_status_update.py --complaints 1000
+"""
+import argparse
+import json
+
+from common import setup_django, Timer
+
+
+def main(complaints):
+    setup_django()
+
+    from django.db import connection, reset_queries
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from app.models import MissingMarksComplaint
+    from app.seeding import seed
+
+    # every seeded student gets two missing marks complaints
+    seed(students=complaints // 2, complaints_per_student=4, notifications_per_user=0)
+    ids = list(MissingMarksComplaint.objects.values_list("id", flat=True)[:complaints])
+    half = len(ids) // 2
+    client = Client()
+
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries, Timer() as one_by_one:
+        for complaint_id in ids[:half]:
+            client.patch(f"/update_marks_complaint/{complaint_id}", {"status": "resolved"}, content_type="application/json")
+    single_queries = len(queries)
+
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries, Timer() as bulk:
+        response = client.patch(
+            "/bulk_update_marks_complaints/",
+            json.dumps({"ids": ids[half:], "status": "resolved"}),
+            content_type="application/json",
+        )
+    assert response.status_code == 202, response.status_code
+
+    print(f"one PATCH per complaint: {half} complaints in {one_by_one.elapsed:.2f}s, {single_queries} queries")
+    print(f"bulk endpoint:           {len(ids) - half} complaints in {bulk.elapsed:.2f}s, {len(queries)} queries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--complaints", type=int, default=1000)
+    main(parser.parse_args().complaints)
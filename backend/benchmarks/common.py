@@ -0,0 +1,48 @@
+"""Shared setup for the benchmark scripts: configures Django against a
+throwaway SQLite file (never backend/db.sqlite3), or the configured Postgres
+database, and migrates it."""
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+
+def setup_django(database=None):
+    import django
+    from django.conf import settings
+
+    # with DB_ENGINE=postgres the configured database is used as is, point
+    # DB_NAME at a scratch database
+    if settings.DATABASES["default"]["ENGINE"].endswith("sqlite3"):
+        settings.DATABASES["default"]["NAME"] = database or os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3")
+    django.setup()
+
+    from django.core import signals
+    from django.core.management import call_command
+    from django.db import close_old_connections
+    from django.test.utils import setup_test_environment
+
+    # locmem email and the testserver host for django.test.Client, and keep one
+    # connection open across requests like the test runner does
+    setup_test_environment()
+    signals.request_started.disconnect(close_old_connections)
+    signals.request_finished.disconnect(close_old_connections)
+    call_command("migrate", verbosity=0)
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
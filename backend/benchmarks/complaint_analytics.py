@@ -0,0 +1,96 @@
+"""Registrar dashboard by programme and academic year, read from the
+complaint rollup against the GROUP BY over every complaint it replaces, for
+a range of table sizes, plus what keeping the rollup counted adds to a
+complaint save. Each size runs in its own process against its own database.
+
+    python benchmarks/complaint_analytics.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from common import setup_django, percentile, Timer
+
+REPEAT = 20
+
+
+def naive(group_by):
+    """The same dashboard rows counted from the complaint tables."""
+    from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+    from app.models import MissingMarksComplaint, RegistrationComplaint
+
+    fields = ["student__programme" if dimension == "programme" else dimension for dimension in group_by]
+    totals = {}
+    for model in (MissingMarksComplaint, RegistrationComplaint):
+        rows = model.objects.order_by().values(*fields).annotate(
+            total=Count("id"),
+            pending=Count("id", filter=Q(status="pending")),
+            resolved=Count("id", filter=Q(status="resolved")),
+            seconds=Sum(ExpressionWrapper(F("resolved_at") - F("created"), output_field=DurationField()), filter=Q(status="resolved")),
+        )
+        for row in rows:
+            group = totals.setdefault(tuple(row[field] for field in fields), [0, 0, 0])
+            group[0] += row["total"]
+            group[1] += row["pending"]
+            group[2] += row["resolved"]
+    return totals
+
+
+def timed(function):
+    samples = []
+    for _ in range(REPEAT):
+        with Timer() as timer:
+            function()
+        samples.append(timer.elapsed * 1000)
+    return percentile(samples, 50)
+
+
+def run(size):
+    setup_django()
+
+    from django.db.models.signals import post_save
+    from app import rollups, signals
+    from app.models import ComplaintRollup, MissingMarksComplaint, RegistrationComplaint
+    from app.seeding import seed
+
+    # two complaints per student, one of each kind
+    objects = seed(programmes=10, students=max(1, size // 2), lecturers=20, courses=50, complaints_per_student=2, notifications_per_user=0)
+    group_by = ["programme", "academic_year"]
+
+    complaints = MissingMarksComplaint.objects.count() + RegistrationComplaint.objects.count()
+    grouped = timed(lambda: naive(group_by))
+    rollup = timed(lambda: rollups.analytics(group_by))
+    print(
+        f"{complaints:8} complaints {ComplaintRollup.objects.count():5} groups   "
+        f"GROUP BY {grouped:9.2f} ms   rollup {rollup:6.2f} ms   {grouped / rollup:7.0f}x",
+        flush=True,
+    )
+
+    def create(count):
+        with Timer() as timer:
+            for i in range(count):
+                RegistrationComplaint.objects.create(
+                    student=objects["student"], academic_year=objects["academic_year"],
+                    year_of_study="1", subject=f"benchmark {i}", details="benchmark",
+                )
+        return timer.elapsed / count * 1000
+
+    create(20)
+    with_rollup = create(200)
+    post_save.disconnect(signals.complaint_saved, sender=RegistrationComplaint)
+    without = create(200)
+    print(f"{'':8} complaint save {without:.3f} ms, {with_rollup:.3f} ms counted in the rollup", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,400000")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run(args.single)
+    else:
+        for size in args.sizes.split(","):
+            subprocess.run([sys.executable, __file__, f"--single={size}"], env=os.environ, check=True)
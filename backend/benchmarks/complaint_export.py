@@ -0,0 +1,77 @@
+"""Rows per second and peak Python memory of export_complaints/ streaming
+every complaint as CSV, for a range of table sizes, next to building the
+same rows as one serialized list the way reg_complaints/ answers without a
+page size. Each size runs in its own process against its own database.
+
+    python benchmarks/complaint_export.py --sizes 100,10000,1000000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tracemalloc
+
+from common import setup_django, Timer
+
+# the buffered comparison holds every row at once, past this it is skipped
+BUFFERED_MAX = 200000
+
+
+def measure(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # timed on its own, tracemalloc slows allocation down
+    with Timer() as timer:
+        function()
+    return timer.elapsed, peak
+
+
+def run(size):
+    setup_django()
+
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import AccessToken
+    from app.models import MissingMarksComplaint, RegistrationComplaint
+    from app.seeding import seed
+    from app.serializers import MissingMarksComplaintSerializer, RegistrationComplaintSerializer
+
+    # four complaints per student, half of each kind
+    objects = seed(programmes=10, students=max(1, size // 4), lecturers=20, courses=50, complaints_per_student=4, notifications_per_user=0)
+    client = Client(headers={"Authorization": f"Bearer {AccessToken.for_user(objects['registrar'])}"})
+
+    def stream():
+        response = client.get("/export_complaints/")
+        assert response.status_code == 200, response.status_code
+        for _ in response.streaming_content:
+            pass
+
+    def buffered():
+        for model, serializer in (
+            (MissingMarksComplaint, MissingMarksComplaintSerializer),
+            (RegistrationComplaint, RegistrationComplaintSerializer),
+        ):
+            serializer(serializer.setup_eager_loading(model.objects.all()), many=True).data
+
+    rows = MissingMarksComplaint.objects.count() + RegistrationComplaint.objects.count()
+    elapsed, peak = measure(stream)
+    line = f"{rows:8} rows  streamed {rows / elapsed:9.0f} rows/s {peak / 2**20:8.1f} MiB peak"
+    if rows <= BUFFERED_MAX:
+        elapsed, peak = measure(buffered)
+        line += f"   buffered {rows / elapsed:8.0f} rows/s {peak / 2**20:8.1f} MiB peak"
+    print(line, flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,10000,200000")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run(args.single)
+    else:
+        # a fresh process per size, so one size's memory doesn't carry into the next
+        for size in args.sizes.split(","):
+            subprocess.run([sys.executable, __file__, f"--single={size}"], env=os.environ, check=True)
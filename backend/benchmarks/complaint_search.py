@@ -0,0 +1,95 @@
+"""Latency of search_complaints/ queries, and of their lookup in the
+full-text index alone, for a range of corpus sizes, next to the same
+searches as LIKE '%...%' filters over the complaint, student and course
+columns. Each size runs in its own process against its own database, a
+million complaints takes a while to seed.
+
+    python benchmarks/complaint_search.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from common import setup_django, percentile, Timer
+
+REPEAT = 20
+# the LIKE scans take seconds on the larger corpora, they are timed less often
+LIKE_REPEAT = 3
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        with Timer() as timer:
+            function()
+        samples.append(timer.elapsed * 1000)
+    return percentile(samples, 50)
+
+
+def like(query):
+    """First page of complaints with query in any searched column."""
+    from django.db.models import Q
+    from app.models import CommonComplaintIssue
+
+    matches = Q()
+    for field in (
+        "registrationcomplaint__subject", "registrationcomplaint__details",
+        "missingmarkscomplaint__course__code", "missingmarkscomplaint__course__name",
+        "student__email", "student__registration_number",
+    ):
+        matches |= Q(**{f"{field}__icontains": query})
+    return list(CommonComplaintIssue.objects.filter(matches).values_list("id", flat=True)[:50])
+
+
+def run(size):
+    setup_django()
+
+    from django.test import Client
+    from app import search
+    from app.models import MissingMarksComplaint, RegistrationComplaint
+    from app.seeding import seed
+
+    # two complaints per student, one of each kind
+    students = max(1, size // 2)
+    seed(programmes=10, students=students, lecturers=20, courses=200, complaints_per_student=2, notifications_per_user=0)
+    complaints = MissingMarksComplaint.objects.count() + RegistrationComplaint.objects.count()
+    client = Client()
+
+    queries = {
+        "email": f"seed.student{students // 3}@students.mak.ac.ug",
+        "registration number": f"seed/{students // 7}",
+        "course code": "SEED17",
+        "subject words": f"subject {students // 5}",
+        "prefix": f"seed.student{students // 3}"[:-1] + "*",
+        "every complaint": "seed",
+    }
+    print(f"{complaints} complaints", flush=True)
+    for name, query in queries.items():
+        def endpoint():
+            response = client.get("/search_complaints/", {"q": query})
+            assert response.status_code == 200, response.status_code
+            return response.json()["results"]
+
+        found = len(endpoint())
+        response = timed(endpoint, REPEAT)
+        lookup = timed(lambda: search.search(query, limit=51), REPEAT)
+        scanned = timed(lambda: like(query), LIKE_REPEAT)
+        print(
+            f"    {name:20} {found:3} on page 1   endpoint {response:7.2f} ms   index lookup {lookup:7.2f} ms   "
+            f"LIKE {scanned:9.2f} ms",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run(args.single)
+    else:
+        for size in args.sizes.split(","):
+            subprocess.run([sys.executable, __file__, f"--single={size}"], env=os.environ, check=True)
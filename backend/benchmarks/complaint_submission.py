@@ -0,0 +1,49 @@
+"""Complaint submissions per second through missing_marks and
+registration_issues, plus the queries each submission costs.
+
+    python benchmarks/complaint_submission.py --submissions 1000
+"""
+import argparse
+
+from common import setup_django, Timer
+
+
+def main(submissions):
+    setup_django()
+
+    from django.db import connection, reset_queries
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from app.seeding import seed
+
+    objects = seed(students=50, complaints_per_student=0, notifications_per_user=0)
+    client = Client()
+    payloads = {
+        "missing_marks": {
+            "student": objects["student"].id, "course": objects["course"].id,
+            "academic_year": objects["academic_year"].id, "year_of_study": "2", "category": "exam",
+        },
+        "registration_issues": {
+            "student": objects["student"].id, "academic_year": objects["academic_year"].id,
+            "year_of_study": "2", "subject": "benchmark", "details": "benchmark",
+        },
+    }
+
+    for endpoint, payload in payloads.items():
+        url = f"/{endpoint}/{objects['student'].id}"
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            client.post(url, payload)
+
+        with Timer() as timer:
+            for _ in range(submissions):
+                response = client.post(url, payload)
+                assert response.status_code == 201, response.status_code
+
+        print(f"{endpoint:20} {submissions / timer.elapsed:8.1f} submissions/s  {len(queries)} queries each")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--submissions", type=int, default=1000)
+    main(parser.parse_args().submissions)
@@ -0,0 +1,80 @@
+"""Complaint submissions from many concurrent writers, each thread with its
+own database connection like a threaded WSGI worker. Compares SQLite in its
+default rollback-journal mode with the tuned mode (WAL, busy timeout,
+synchronous=NORMAL, BEGIN IMMEDIATE); with DB_ENGINE=postgres it measures
+the configured Postgres database instead.
+
+    python benchmarks/concurrent_writers.py --writers 16 --submissions 50
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import threading
+
+from common import setup_django, percentile, Timer
+
+
+def run(writers, submissions):
+    setup_django()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from app.seeding import seed
+
+    objects = seed(students=writers, complaints_per_student=0, notifications_per_user=0)
+    payload = {
+        "course": objects["course"].id, "academic_year": objects["academic_year"].id,
+        "year_of_study": "2", "category": "exam",
+    }
+    students = list(type(objects["student"]).objects.filter(role="student").values_list("id", flat=True)[:writers])
+    latencies, failures = [], []
+    # "database is locked" failures are counted, not printed with their traceback
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+    def writer(student):
+        client = Client(raise_request_exception=False)
+        for _ in range(submissions):
+            with Timer() as timer:
+                response = client.post(f"/missing_marks/{student}", {**payload, "student": student})
+            if response.status_code == 201:
+                latencies.append(timer.elapsed)
+            else:
+                failures.append(response.status_code)
+        connection.close()
+
+    threads = [threading.Thread(target=writer, args=(student,)) for student in students]
+    with Timer() as timer:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    options = settings.DATABASES["default"]["OPTIONS"]
+    mode = connection.vendor if connection.vendor != "sqlite" else ("sqlite tuned" if options else "sqlite default")
+    print(
+        f"{mode:15} {len(latencies) / timer.elapsed:7.1f} submissions/s  "
+        f"p50 {percentile(latencies, 50) * 1000:6.1f}ms  p99 {percentile(latencies, 99) * 1000:7.1f}ms  "
+        f"{len(failures)} failed"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--submissions", type=int, default=50)
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single or os.getenv("DB_ENGINE") == "postgres":
+        run(args.writers, args.submissions)
+    else:
+        # the settings are read once per process, so each SQLite mode runs in its own
+        for tuned in ("false", "true"):
+            subprocess.run(
+                [sys.executable, __file__, "--single", f"--writers={args.writers}", f"--submissions={args.submissions}"],
+                env={**os.environ, "SQLITE_TUNED": tuned},
+                check=True,
+            )
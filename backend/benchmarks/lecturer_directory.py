@@ -0,0 +1,36 @@
+"""Response size and query count of the lecturer directory, the old
+UserSerializer(fields='__all__') listing against LecturerSerializer.
+
+    python benchmarks/lecturer_directory.py --lecturers 1000
+"""
+import argparse
+
+from common import setup_django
+
+
+def main(lecturers):
+    setup_django()
+
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.renderers import JSONRenderer
+    from app.models import User
+    from app.seeding import seed
+    from app.serializers import UserSerializer, LecturerSerializer
+
+    seed(students=10, lecturers=lecturers, courses=10, complaints_per_student=0, notifications_per_user=0)
+
+    for label, serializer_class, queryset in [
+        ("UserSerializer __all__", UserSerializer, User.objects.filter(role="lecturer")),
+        ("LecturerSerializer", LecturerSerializer, LecturerSerializer.setup_eager_loading(User.objects.filter(role="lecturer"))),
+    ]:
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            body = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        print(f"{label:24} {len(body) / 1024:8.1f} KiB  {len(queries):5} queries  per {lecturers} lecturers")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lecturers", type=int, default=1000)
+    main(parser.parse_args().lecturers)
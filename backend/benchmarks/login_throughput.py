@@ -0,0 +1,68 @@
+"""Logins per second per core for each password hashing policy, through the
+sync login view, plus the async login view with hashing offloaded to the
+thread pool (which scales with PASSWORD_HASHING_WORKERS).
+
+    python benchmarks/login_throughput.py --logins 50
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+
+from common import setup_django, Timer
+
+
+def main(logins, concurrency):
+    setup_django()
+
+    from django.conf import settings
+    from django.contrib.auth.hashers import make_password
+    from django.test import Client, AsyncRequestFactory
+    from django.test.utils import override_settings
+    from app.async_views import login_async
+    from app.models import User
+
+    client = Client()
+    body = {"email": "benchmark@students.mak.ac.ug", "password": "Benchmark#2024"}
+    user = User.objects.create(email=body["email"], username="benchmark", role="student")
+
+    async def login_storm():
+        factory = AsyncRequestFactory()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                # the view login/ serves when ASYNC_VIEWS is on
+                response = await login_async(factory.post("/login/", json.dumps(body), content_type="application/json"))
+                assert response.status_code == 200, response.status_code
+
+        await asyncio.gather(*(one() for _ in range(logins)))
+
+    for policy, hashers in settings.PASSWORD_HASHER_POLICIES.items():
+        if policy == "argon2" and importlib.util.find_spec("argon2") is None:
+            print(f"{policy:8} skipped, argon2-cffi isn't installed")
+            continue
+
+        with override_settings(PASSWORD_HASHERS=hashers):
+            User.objects.filter(id=user.id).update(password=make_password(body["password"]))
+
+            with Timer() as sync_timer:
+                for _ in range(logins):
+                    assert client.post("/login/", body).status_code == 200
+
+            with Timer() as async_timer:
+                asyncio.run(login_storm())
+
+        print(
+            f"{policy:8} sync {logins / sync_timer.elapsed:7.1f} logins/s/core   "
+            f"async x{concurrency} {logins / async_timer.elapsed:7.1f} logins/s "
+            f"({settings.PASSWORD_HASHING_WORKERS} hashing threads)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    main(args.logins, args.concurrency)
@@ -0,0 +1,49 @@
+"""Cost of MetricsMiddleware per request: the same GETs with and without it,
+on a cached endpoint (where the overhead weighs the most) and on a list that
+runs queries.
+
+    python benchmarks/metrics_overhead.py --requests 2000
+"""
+import argparse
+
+from common import setup_django, Timer
+
+
+def main(requests):
+    setup_django()
+
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import override_settings
+    from app.seeding import seed
+
+    objects = seed(students=200, complaints_per_student=4, notifications_per_user=5)
+    without = [m for m in settings.MIDDLEWARE if m != "app.metrics.MetricsMiddleware"]
+    urls = {
+        "programmes (cached)": "/programmes/",
+        "sent_complaints": f"/sent_complaints/{objects['student'].id}",
+    }
+
+    for name, url in urls.items():
+        timings = {}
+        for label, middleware in (("off", without), ("on", ["app.metrics.MetricsMiddleware"] + without)):
+            with override_settings(MIDDLEWARE=middleware, DEBUG=False):
+                # a new client loads the overridden middleware
+                client = Client()
+                client.get(url)
+                with Timer() as timer:
+                    for _ in range(requests):
+                        client.get(url)
+            timings[label] = timer.elapsed / requests * 1e6
+
+        overhead = timings["on"] - timings["off"]
+        print(
+            f"{name:20} off {timings['off']:7.1f}us  on {timings['on']:7.1f}us  "
+            f"overhead {overhead:5.1f}us ({overhead / timings['off']:.1%})"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    main(parser.parse_args().requests)
@@ -0,0 +1,98 @@
+"""Load test for notifications_stream/: opens thousands of idle SSE streams
+against the ASGI app in-process, reports the memory each one holds and how
+long one publish takes to reach every stream. Every stream is opened as
+the first user in the database, with a token made for them.
+
+    python benchmarks/sse_idle_connections.py --connections 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+from backend.asgi import application  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+from app.broker import get_broker  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+class Connection:
+    def __init__(self):
+        self.disconnected = asyncio.Event()
+        self.requested = False
+        self.opened = asyncio.Event()
+        self.delivered = asyncio.Event()
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] != "http.response.body":
+            return
+        body = message.get("body", b"")
+        if body.startswith(b"retry:"):
+            self.opened.set()
+        elif b"event: notification" in body:
+            self.delivered.set()
+
+
+def scope(channel, token):
+    path = f"/notifications_stream/{channel}"
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+
+
+async def main(connections, channel, token):
+    connections = [Connection() for _ in range(connections)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(application(scope(channel, token), c.receive, c.send)) for c in connections]
+    await asyncio.gather(*(c.opened.wait() for c in connections))
+    opened = time.perf_counter() - started
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    broker = get_broker()
+    print(f"streams open:          {broker.subscriber_count()}")
+    print(f"time to open all:      {opened:.2f}s")
+    print(f"memory per stream:     {held / len(connections) / 1024:.1f} KiB")
+
+    started = time.perf_counter()
+    broker.publish(channel, {"body": "benchmark"})
+    await asyncio.gather(*(c.delivered.wait() for c in connections))
+    print(f"fan-out to all:        {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    for c in connections:
+        c.disconnected.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    print(f"streams after close:   {broker.subscriber_count()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=5000)
+    user = User.objects.order_by("id").first()
+    asyncio.run(main(parser.parse_args().connections, str(user.id), str(AccessToken.for_user(user))))
@@ -6,8 +6,16 @@ CURRENT_DIR=$(pwd)
 # Change directory to /backend
 cd "$CURRENT_DIR/backend" || exit
 
-# Run Django server
-python manage.py runserver &
+# Run Django server, ASGI=true serves the ASGI app with uvicorn and the
+# async views instead (ASYNC_VIEWS in backend/settings.py)
+if [ "$ASGI" = "true" ]; then
+    ASYNC_VIEWS=true python -m uvicorn backend.asgi:application --port 8000 &
+else
+    python manage.py runserver &
+fi
+
+# Deliver queued email (password resets, notification emails) from the outbox
+python manage.py send_queued_mail &
 
 
 # Change directory back to the original